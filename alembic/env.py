@@ -1,3 +1,4 @@
+import os
 from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config, pool
@@ -33,7 +34,7 @@ target_metadata = SQLModel.metadata
 
 
 def get_url():
-    return "sqlite:///./db.sqlite3"
+    return os.environ.get("DATABASE_URL", "sqlite:///./db.sqlite3")
 
 
 def run_migrations_offline():
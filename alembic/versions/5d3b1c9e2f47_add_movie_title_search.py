@@ -0,0 +1,26 @@
+"""add movie title search
+
+Revision ID: 5d3b1c9e2f47
+Revises: 025144069685
+Create Date: 2026-10-19 10:12:41.208311
+
+"""
+from alembic import op
+from api.strawberry_sqlalchemy.full_text_search import (
+    create_search_index,
+    drop_search_index,
+)
+
+# revision identifiers, used by Alembic.
+revision = "5d3b1c9e2f47"
+down_revision = "025144069685"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    create_search_index(op, "movies", "title")
+
+
+def downgrade():
+    drop_search_index(op, "movies", "title")
@@ -0,0 +1,26 @@
+"""add live query change log
+
+Revision ID: 8b41d2f0c7a3
+Revises: 5d3b1c9e2f47
+Create Date: 2026-10-19 18:40:12.514087
+
+"""
+from alembic import op
+from api.strawberry_sqlalchemy.live_queries import (
+    create_change_log,
+    drop_change_log,
+)
+
+# revision identifiers, used by Alembic.
+revision = "8b41d2f0c7a3"
+down_revision = "5d3b1c9e2f47"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    create_change_log(op)
+
+
+def downgrade():
+    drop_change_log(op)
@@ -0,0 +1,180 @@
+import asyncio
+import json
+
+from api.strawberry_sqlalchemy.operation_batching import MAX_BATCH_SIZE, execute_batch
+from api.strawberry_sqlalchemy.response_encoding import (
+    ResponseEncoding,
+    create_json_response,
+)
+from api.strawberry_sqlalchemy.statement_timeout import StatementDeadline
+from starlette import status
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import PlainTextResponse
+from starlette.websockets import WebSocket
+from strawberry.asgi import GraphQL as BaseGraphQL
+from strawberry.asgi.handlers import HTTPHandler as BaseHTTPHandler
+from strawberry.exceptions import MissingQueryError
+from strawberry.http import parse_request_data
+from strawberry.utils.debug import pretty_print_graphql_operation
+
+
+async def wait_for_disconnect(request):
+    # the body has already been read so the next message is the disconnect
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+class HTTPHandler(BaseHTTPHandler):
+    """Executes operations in a worker thread so the event loop can notice a
+    client disconnect while the sync resolvers block on the database. When the
+    client disconnects the running statement is cancelled.
+
+    A POST body holding a list of operations is executed as a batch and
+    answered with a list of results. The results of json requests are encoded
+    and compressed as configured by the response encoding.
+    """
+
+    response_encoding = ResponseEncoding()
+
+    async def get_http_response(
+        self, request, execute, process_result, graphiql, root_value, context
+    ):
+        content_type = request.headers.get("Content-Type", "")
+        if request.method != "POST" or "application/json" not in content_type:
+            return await super().get_http_response(
+                request, execute, process_result, graphiql, root_value, context
+            )
+        try:
+            data = await request.json()
+        except json.JSONDecodeError:
+            return PlainTextResponse(
+                "Unable to parse request body as JSON",
+                status_code=status.HTTP_400_BAD_REQUEST,
+            )
+        if isinstance(data, list):
+            return await self.get_batch_response(
+                request, data, process_result, root_value, context
+            )
+        try:
+            request_data = parse_request_data(data)
+        except MissingQueryError:
+            return PlainTextResponse(
+                "No GraphQL query found in the request",
+                status_code=status.HTTP_400_BAD_REQUEST,
+            )
+
+        result = await execute(
+            request_data.query,
+            variables=request_data.variables,
+            context=context,
+            operation_name=request_data.operation_name,
+            root_value=root_value,
+        )
+        response_data = await process_result(request=request, result=result)
+        return await create_json_response(
+            request, response_data, self.response_encoding
+        )
+
+    async def get_batch_response(
+        self, request, data, process_result, root_value, context
+    ):
+        if not data or len(data) > MAX_BATCH_SIZE:
+            return PlainTextResponse(
+                f"A batch must contain between 1 and {MAX_BATCH_SIZE} operations",
+                status_code=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            operations = [parse_request_data(operation) for operation in data]
+        except (MissingQueryError, TypeError):
+            return PlainTextResponse(
+                "No GraphQL query found in an operation of the batch",
+                status_code=status.HTTP_400_BAD_REQUEST,
+            )
+        if self.debug:
+            for operation in operations:
+                pretty_print_graphql_operation(
+                    operation.operation_name, operation.query, operation.variables
+                )
+
+        results = await self.run_cancellable(
+            context,
+            execute_batch,
+            self.schema,
+            operations,
+            context,
+            root_value=root_value,
+        )
+        response_data = [
+            await process_result(request=request, result=result) for result in results
+        ]
+        return await create_json_response(
+            request, response_data, self.response_encoding
+        )
+
+    async def execute(
+        self, query, variables=None, context=None, operation_name=None, root_value=None
+    ):
+        if self.debug:
+            pretty_print_graphql_operation(operation_name, query, variables)
+
+        return await self.run_cancellable(
+            context,
+            self.schema.execute_sync,
+            query,
+            root_value=root_value,
+            variable_values=variables,
+            operation_name=operation_name,
+            context_value=context,
+        )
+
+    async def run_cancellable(self, context, func, *args, **kwargs):
+        """Run func in a worker thread and cancel its statements if the client
+        disconnects first
+        """
+        deadline = StatementDeadline()
+        context["statement_deadline"] = deadline
+
+        execution = asyncio.ensure_future(run_in_threadpool(func, *args, **kwargs))
+        disconnect = asyncio.ensure_future(wait_for_disconnect(context["request"]))
+
+        await asyncio.wait({execution, disconnect}, return_when=asyncio.FIRST_COMPLETED)
+        if not execution.done():
+            # cancelling a postgres statement opens a connection so we do not
+            # want to block the event loop
+            await run_in_threadpool(deadline.cancel)
+        disconnect.cancel()
+
+        return await execution
+
+
+class GraphQL(BaseGraphQL):
+    """The schema extensions do not run for subscriptions so
+    subscription_context returns the entries the generated subscriptions need
+    in the context of websocket connections, the generation context under
+    `auto_schema` and a `create_session` callable.
+
+    response_encoding sets the encoder and compression of http responses.
+    """
+
+    http_handler_class = HTTPHandler
+
+    def __init__(
+        self, schema, subscription_context=None, response_encoding=None, **kwargs
+    ):
+        super().__init__(schema, **kwargs)
+        self.subscription_context = subscription_context
+        if response_encoding is not None:
+            # the handler is created by the base class for every request
+            self.http_handler_class = type(
+                "HTTPHandler",
+                (self.http_handler_class,),
+                {"response_encoding": response_encoding},
+            )
+
+    async def get_context(self, request, response=None):
+        context = await super().get_context(request, response)
+        if isinstance(request, WebSocket) and self.subscription_context is not None:
+            context.update(self.subscription_context())
+        return context
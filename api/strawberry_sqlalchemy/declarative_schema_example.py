@@ -0,0 +1,63 @@
+import strawberry
+from api.strawberry_sqlalchemy.movie_schema_example import SQLAlchemySession
+from api.strawberry_sqlalchemy.parallel_execution import (
+    create_parallel_execution_context,
+)
+from api.strawberry_sqlalchemy.schema_generation import (
+    create_generation_context,
+    create_mapped_types,
+    create_mutation_root,
+    create_query_root,
+)
+from main.database import Base
+from sqlalchemy import Column, Float, ForeignKey, Integer, String
+from sqlalchemy.orm import relationship
+from strawberry.extensions import Extension
+
+
+class DirectorRecord(Base):
+    __tablename__ = "directors"
+
+    id = Column(Integer, primary_key=True, index=True, nullable=False)
+    name = Column(String, index=True, nullable=False)
+    movies = relationship("MovieRecord", back_populates="director")
+
+
+class MovieRecord(Base):
+    __tablename__ = "movies"
+
+    id = Column(Integer, primary_key=True, index=True, nullable=False)
+    title = Column(String, nullable=False)
+    imdb_id = Column(String, index=True, nullable=False)
+    year = Column(Integer, nullable=False)
+    image_url = Column(String, nullable=False)
+    imdb_rating = Column(Float, nullable=False)
+    imdb_rating_count = Column(String, nullable=False)
+    director_id = Column(Integer, ForeignKey("directors.id"), nullable=True)
+    director = relationship("DirectorRecord", back_populates="movies")
+
+
+# the types are generated from the sqlalchemy mappers so no pydantic models
+# or field lists are needed
+Movie, Director = create_mapped_types(
+    {"Movie": MovieRecord, "Director": DirectorRecord}
+)
+
+auto_types = [Movie, Director]
+auto_schema_context = create_generation_context(auto_types)
+
+
+class AutoSchemaContext(Extension):
+    def on_request_start(self):
+        self.execution_context.context["auto_schema"] = auto_schema_context
+
+
+Query = create_query_root(auto_types)
+Mutation = create_mutation_root(auto_types)
+
+schema = strawberry.Schema(
+    query=Query,
+    mutation=Mutation,
+    extensions=[SQLAlchemySession, AutoSchemaContext],
+    execution_context_class=create_parallel_execution_context(),
+)
@@ -0,0 +1,213 @@
+import dataclasses
+import threading
+import time
+import typing as t
+
+from graphql import OperationType, get_operation_ast
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql import Delete, Insert, Update
+from sqlmodel import Session
+
+# requests with this header read from the primary so they see their own writes
+READ_YOUR_WRITES_HEADER = "x-read-your-writes"
+
+
+@dataclasses.dataclass
+class PoolSettings:
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_timeout: float = 30
+    pool_recycle: int = 1800
+    pool_pre_ping: bool = True
+
+
+def create_pooled_engine(
+    url: str, pool_settings: t.Optional[PoolSettings] = None, **kwargs
+):
+    """Create an engine with a sized connection pool"""
+    pool_settings = PoolSettings() if pool_settings is None else pool_settings
+    if url.startswith("sqlite"):
+        # sqlite file databases default to a pool which ignores the pool size
+        kwargs.setdefault("poolclass", QueuePool)
+        kwargs.setdefault("connect_args", {"check_same_thread": False})
+    return create_engine(
+        url, future=True, **dataclasses.asdict(pool_settings), **kwargs
+    )
+
+
+@dataclasses.dataclass
+class SQLiteSettings:
+    """Tuning of the sqlite profile. cache_size is in pages or in KiB if
+    negative and mmap_size is in bytes.
+    """
+
+    journal_mode: str = "wal"
+    # normal only syncs at checkpoints which is durable in wal mode except
+    # for power loss
+    synchronous: str = "normal"
+    mmap_size: int = 256 * 1024 * 1024
+    cache_size: int = -64 * 1024
+    # the prepared statements each connection keeps
+    cached_statements: int = 512
+    # the compiled statements the engine keeps
+    query_cache_size: int = 1200
+    busy_timeout: float = 5
+    reader_pool_size: int = 16
+    reader_max_overflow: int = 16
+    pool_timeout: float = 30
+
+
+def is_sqlite_file_url(url: str):
+    url = make_url(url)
+    return url.get_backend_name() == "sqlite" and url.database not in {
+        None,
+        "",
+        ":memory:",
+    }
+
+
+def _set_sqlite_pragmas(settings: SQLiteSettings, read_only: bool, dbapi_connection):
+    cursor = dbapi_connection.cursor()
+    try:
+        # the journal mode is stored in the database file so this only
+        # changes it the first time
+        cursor.execute(f"PRAGMA journal_mode = {settings.journal_mode}")
+        cursor.execute(f"PRAGMA synchronous = {settings.synchronous}")
+        cursor.execute(f"PRAGMA mmap_size = {int(settings.mmap_size)}")
+        cursor.execute(f"PRAGMA cache_size = {int(settings.cache_size)}")
+        cursor.execute("PRAGMA temp_store = memory")
+        if read_only:
+            cursor.execute("PRAGMA query_only = 1")
+    finally:
+        cursor.close()
+
+
+def create_sqlite_engine(
+    url: str,
+    sqlite_settings: t.Optional[SQLiteSettings] = None,
+    read_only: bool = False,
+    **kwargs,
+):
+    """Create a tuned engine for a sqlite file database.
+
+    sqlite allows a single writer at a time so the writer engine holds a
+    single connection and writes wait for it in the pool instead of failing
+    with a busy database. In wal mode readers do not block the writer or each
+    other so the read only engine holds a connection for every worker thread
+    and reads run concurrently.
+    """
+    settings = SQLiteSettings() if sqlite_settings is None else sqlite_settings
+    if read_only:
+        pool_size = settings.reader_pool_size
+        max_overflow = settings.reader_max_overflow
+    else:
+        pool_size, max_overflow = 1, 0
+    engine = create_engine(
+        url,
+        future=True,
+        poolclass=QueuePool,
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=settings.pool_timeout,
+        query_cache_size=settings.query_cache_size,
+        connect_args={
+            "check_same_thread": False,
+            "cached_statements": settings.cached_statements,
+            "timeout": settings.busy_timeout,
+        },
+        **kwargs,
+    )
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        _set_sqlite_pragmas(settings, read_only, dbapi_connection)
+
+    return engine
+
+
+class EngineRegistry:
+    """Holds the primary engine and the read replica engines.
+
+    Reads are spread over the healthy replicas in round robin order. A replica
+    which fails to connect or loses its connection is skipped until the
+    cooldown has passed. Reads fall back to the primary when no replica is
+    healthy.
+    """
+
+    def __init__(self, primary, replicas=None, unhealthy_cooldown: float = 30):
+        self.primary = primary
+        self.replicas = list(replicas or [])
+        self.unhealthy_cooldown = unhealthy_cooldown
+        self._unhealthy_until: t.Dict[t.Any, float] = {}
+        self._next_replica = 0
+        self._lock = threading.Lock()
+        for replica in self.replicas:
+            event.listen(replica, "handle_error", self._on_replica_error)
+
+    def _on_replica_error(self, context):
+        if context.is_disconnect or context.connection is None:
+            self.mark_unhealthy(context.engine)
+
+    def mark_unhealthy(self, engine):
+        with self._lock:
+            self._unhealthy_until[engine] = time.monotonic() + self.unhealthy_cooldown
+
+    def is_healthy(self, engine):
+        return self._unhealthy_until.get(engine, 0) <= time.monotonic()
+
+    def get_read_engine(self):
+        with self._lock:
+            for _ in range(len(self.replicas)):
+                replica = self.replicas[self._next_replica]
+                self._next_replica = (self._next_replica + 1) % len(self.replicas)
+                if self.is_healthy(replica):
+                    return replica
+        return self.primary
+
+    def dispose(self):
+        for engine in [self.primary, *self.replicas]:
+            engine.dispose()
+
+
+class RoutingSession(Session):
+    """A session which reads from a replica and writes to the primary.
+
+    The session picks one replica for its lifetime so a request sees a
+    consistent snapshot. Once the session writes, or if use_primary is set,
+    every statement goes to the primary so the request reads its own writes.
+    """
+
+    def __init__(self, registry: EngineRegistry, **kwargs):
+        super().__init__(**kwargs)
+        self.registry = registry
+        self.use_primary = False
+        self._read_engine = None
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        if isinstance(clause, (Insert, Update, Delete)) or self._flushing:
+            self.use_primary = True
+        if self.use_primary:
+            return self.registry.primary
+        if self._read_engine is None:
+            self._read_engine = self.registry.get_read_engine()
+        return self._read_engine
+
+
+def requires_primary(execution_context):
+    """Check if an operation has to run against the primary. Mutations and
+    requests which ask to read their own writes use the primary.
+    """
+    context = execution_context.context or {}
+    request = context.get("request")
+    if request is not None:
+        read_your_writes = request.headers.get(READ_YOUR_WRITES_HEADER, "")
+        if read_your_writes.lower() in {"1", "true"}:
+            return True
+    if execution_context.graphql_document is None:
+        return False
+    operation = get_operation_ast(
+        execution_context.graphql_document, execution_context.operation_name
+    )
+    return operation is not None and operation.operation == OperationType.MUTATION
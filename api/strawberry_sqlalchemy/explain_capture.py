@@ -0,0 +1,323 @@
+import contextlib
+import dataclasses
+import datetime
+import json
+import logging
+import random
+import threading
+import time
+import typing as t
+
+import strawberry
+from graphql import GraphQLError
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from strawberry.extensions import Extension
+from strawberry.types import Info
+
+logger = logging.getLogger(__name__)
+
+# requests with this header set to 1 or true get the plans of their
+# statements in the response extensions if the generation context allows it
+# and the client is an admin
+EXPLAIN_HEADER = "x-explain"
+
+# the context key of the capture of the current operation
+EXPLAIN_CAPTURE = "explain_capture"
+
+# the number of slowest statements kept for every type
+SLOW_STATEMENTS_PER_TYPE = 10
+
+# seconds a slow statement is kept for so the store reflects recent traffic
+SLOW_STATEMENT_WINDOW = 60 * 60
+
+
+@dataclasses.dataclass
+class CapturedStatement:
+    path: str
+    type_name: str
+    sql: str
+    parameters: t.Any
+    plan: t.Any
+    duration: float
+    captured_at: float
+
+
+class SlowStatementStore:
+    """Keeps the slowest sampled statements of every type which were captured
+    within the window.
+    """
+
+    def __init__(
+        self,
+        max_statements_per_type: int = SLOW_STATEMENTS_PER_TYPE,
+        window: float = SLOW_STATEMENT_WINDOW,
+    ):
+        self.max_statements_per_type = max_statements_per_type
+        self.window = window
+        self._statements: t.Dict[str, t.List[CapturedStatement]] = {}
+        self._lock = threading.Lock()
+
+    def _recent(self, statements: t.List[CapturedStatement]):
+        oldest = time.time() - self.window
+        return [s for s in statements if s.captured_at >= oldest]
+
+    def add(self, statement: CapturedStatement):
+        with self._lock:
+            statements = self._recent(self._statements.get(statement.type_name, []))
+            statements.append(statement)
+            statements.sort(key=lambda s: s.duration, reverse=True)
+            del statements[self.max_statements_per_type :]
+            self._statements[statement.type_name] = statements
+
+    def get(self, type_name: t.Optional[str] = None, limit: t.Optional[int] = None):
+        with self._lock:
+            if type_name is None:
+                statements = [s for v in self._statements.values() for s in v]
+            else:
+                statements = list(self._statements.get(type_name, []))
+        statements = self._recent(statements)
+        statements.sort(key=lambda s: s.duration, reverse=True)
+        return statements[:limit]
+
+    def clear(self):
+        with self._lock:
+            self._statements.clear()
+
+
+slow_statements = SlowStatementStore()
+
+
+class StatementCapture:
+    """Collects the statements executed by the generated resolvers of one
+    operation. Root fields resolved in parallel add statements from several
+    threads.
+    """
+
+    def __init__(self, requested: bool):
+        # only requested captures are returned to the client, sampled
+        # captures only feed the slow statement store
+        self.requested = requested
+        self.statements: t.List[CapturedStatement] = []
+        self._lock = threading.Lock()
+
+    def add(self, statement: CapturedStatement):
+        with self._lock:
+            self.statements.append(statement)
+        slow_statements.add(statement)
+
+
+def get_field_path(info):
+    # list indices are left out so every row of a list shares the path
+    path, keys = info.path, []
+    while path is not None:
+        if isinstance(path.key, str):
+            keys.append(path.key)
+        path = path.prev
+    return ".".join(reversed(keys))
+
+
+@contextlib.contextmanager
+def capture_statements(info, type_, connection):
+    """Capture the statements executed on the connection inside the block if
+    the operation is captured
+    """
+    capture = info.context.get(EXPLAIN_CAPTURE)
+    if capture is None:
+        yield
+        return
+    connection.info[EXPLAIN_CAPTURE] = (capture, get_field_path(info), type_.__name__)
+    try:
+        yield
+    finally:
+        connection.info.pop(EXPLAIN_CAPTURE, None)
+
+
+def _jsonable(value):
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in value.items()}
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def _explain(conn, statement, parameters):
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        explain = f"EXPLAIN QUERY PLAN {statement}"
+    elif dialect == "postgresql":
+        explain = f"EXPLAIN (FORMAT JSON) {statement}"
+    else:
+        explain = f"EXPLAIN {statement}"
+
+    # a separate cursor leaves the rows of the explained statement untouched
+    cursor = conn.connection.cursor()
+    try:
+        if dialect == "postgresql":
+            # a failing explain would abort the transaction of the statement
+            cursor.execute("SAVEPOINT explain_statement")
+        try:
+            cursor.execute(explain, parameters)
+            rows = cursor.fetchall()
+        except Exception:
+            if dialect == "postgresql":
+                cursor.execute("ROLLBACK TO SAVEPOINT explain_statement")
+            raise
+        if dialect == "postgresql":
+            cursor.execute("RELEASE SAVEPOINT explain_statement")
+    finally:
+        cursor.close()
+
+    if dialect == "sqlite":
+        # the rows are id, parent id, unused and the step of the plan
+        return [row[3] for row in rows]
+    if dialect == "postgresql":
+        plan = rows[0][0]
+        return json.loads(plan) if isinstance(plan, str) else plan
+    return _jsonable([list(row) for row in rows])
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    if EXPLAIN_CAPTURE in conn.info:
+        conn.info["explain_started"] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _capture_statement(conn, cursor, statement, parameters, context, executemany):
+    captured = conn.info.get(EXPLAIN_CAPTURE)
+    started = conn.info.pop("explain_started", None)
+    if captured is None or started is None:
+        return
+    duration = time.perf_counter() - started
+    capture, path, type_name = captured
+
+    plan = None
+    writes = context is not None and (
+        context.isinsert or context.isupdate or context.isdelete
+    )
+    # TODO: writes are timed but not explained since explaining a write
+    # without executing it is not supported by every database
+    if not executemany and not writes:
+        # the statement was already executed so a failing explain only
+        # leaves the plan out
+        try:
+            plan = _explain(conn, statement, parameters)
+        except Exception:
+            logger.warning("Unable to explain a statement of %s", path, exc_info=True)
+
+    capture.add(
+        CapturedStatement(
+            path=path,
+            type_name=type_name,
+            sql=statement,
+            parameters=_jsonable(parameters),
+            plan=plan,
+            duration=duration,
+            captured_at=time.time(),
+        )
+    )
+
+
+class ExplainCapture(Extension):
+    """Explain the statements of requested or sampled operations.
+
+    Operations are captured if the client sends the explain header, the
+    generation context allows explain requests and the client is an admin,
+    or with the probability of the explain sample rate. Every captured
+    statement is offered to the slow statement store and requested operations
+    get the compiled sql, plan and duration of their statements in the
+    response extensions, grouped by the path of the field which executed
+    them.
+    """
+
+    def on_request_start(self):
+        context = self.execution_context.context
+        schema_context = context["auto_schema"]
+        request = context.get("request")
+        requested = (
+            schema_context["explain_requests"]
+            and request is not None
+            and request.headers.get(EXPLAIN_HEADER, "").lower() in {"1", "true"}
+            and is_admin(context)
+        )
+        sampled = random.random() < schema_context["explain_sample_rate"]
+        context[EXPLAIN_CAPTURE] = (
+            StatementCapture(requested) if requested or sampled else None
+        )
+
+    def get_results(self):
+        capture = self.execution_context.context.get(EXPLAIN_CAPTURE)
+        if capture is None or not capture.requested:
+            return {}
+        statements_by_path: t.Dict[str, t.List[dict]] = {}
+        for statement in capture.statements:
+            statements_by_path.setdefault(statement.path, []).append(
+                {
+                    "type": statement.type_name,
+                    "sql": statement.sql,
+                    "parameters": statement.parameters,
+                    "plan": statement.plan,
+                    "durationMs": statement.duration * 1000,
+                }
+            )
+        return {"explain": statements_by_path}
+
+
+@strawberry.type
+class SlowStatement:
+    path: str
+    type_name: str
+    sql: str
+    # the parameters and plan are json
+    parameters: str
+    plan: t.Optional[str]
+    duration_ms: float
+    captured_at: datetime.datetime
+
+
+def is_admin(context) -> bool:
+    """Check if the client of the request may see the sql, parameters and
+    plans of statements. Nobody is an admin unless the generation context has
+    an admin check.
+    """
+    check = context["auto_schema"].get("is_admin")
+    return check is not None and bool(check(context))
+
+
+def slow_statements_resolver(
+    self,
+    info: Info,
+    type_name: t.Optional[str] = None,
+    limit: t.Optional[int] = None,
+) -> t.List[SlowStatement]:
+    if not is_admin(info.context):
+        raise GraphQLError("The slow statements are only available to admins.")
+    return [
+        SlowStatement(
+            path=s.path,
+            type_name=s.type_name,
+            sql=s.sql,
+            parameters=json.dumps(s.parameters),
+            plan=None if s.plan is None else json.dumps(s.plan),
+            duration_ms=s.duration * 1000,
+            captured_at=datetime.datetime.fromtimestamp(
+                s.captured_at, datetime.timezone.utc
+            ),
+        )
+        for s in slow_statements.get(type_name, limit)
+    ]
+
+
+def create_slow_statements_query_field():
+    """Create the admin field listing the slowest sampled statements. The
+    statements contain sql and parameters so the field only resolves for
+    clients which pass the admin check of the generation context.
+    """
+    return (
+        "slow_statements",
+        t.List[SlowStatement],
+        dataclasses.field(default=strawberry.field(slow_statements_resolver)),
+    )
@@ -0,0 +1,287 @@
+import re
+
+from sqlalchemy import Boolean, Float, String, case, literal, literal_column
+from sqlalchemy import column as sql_column
+from sqlalchemy import table as sql_table
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import class_mapper
+from sqlalchemy.sql.functions import FunctionElement
+
+# the text search configuration used to build and query postgres tsvectors.
+# the expression index is only used if the query uses the same configuration
+SEARCH_CONFIG = "english"
+
+# a quoted phrase, which may be missing its closing quote, or a single word.
+# either can be excluded with a leading minus
+SEARCH_TERM = re.compile(r'(-?)"([^"]*)"?|(-?)([^\s"]+)')
+
+
+def make_searchable(model, *field_names: str):
+    """Mark string fields of a model as searchable. Searchable fields get a
+    `search` operator in the generated filters and a relevance ordering in the
+    generated order by input. The search index has to be created with
+    create_search_index in a migration. Fields have to be made searchable
+    before the types of the model are generated.
+    """
+    from api.strawberry_sqlalchemy.schema_generation import (
+        check_types_not_generated,
+    )
+
+    check_types_not_generated(model)
+    for field_name in field_names:
+        model.__table__.columns[field_name].info["searchable"] = True
+
+
+def is_searchable(model, field_name: str):
+    if model is None or field_name not in model.__table__.columns:
+        return False
+    return model.__table__.columns[field_name].info.get("searchable", False)
+
+
+def get_search_index_name(table_name: str, column_name: str):
+    return f"{table_name}_{column_name}_search"
+
+
+def get_search_primary_key(table):
+    primary_key = list(table.primary_key)
+    if len(primary_key) != 1:
+        raise ValueError(
+            "Full text search requires a table with a single integer primary key."
+        )
+    return primary_key[0]
+
+
+class SearchMatch(FunctionElement):
+    """Match a full text search query against a searchable column"""
+
+    type = Boolean()
+    name = "search_match"
+    inherit_cache = True
+    # the match compiles to a predicate so databases without a native boolean
+    # type must not compare it to 1
+    _is_implicitly_boolean = True
+
+
+class SearchRank(FunctionElement):
+    """The relevance of a searchable column to a full text search query.
+    Higher values are more relevant.
+    """
+
+    type = Float()
+    name = "search_rank"
+    inherit_cache = True
+
+
+def to_fts5_query(value: str):
+    """Convert a web search style query into an fts5 query.
+
+    Like websearch_to_tsquery on postgres, words and quoted phrases must all
+    match, `or` between two terms matches either and a leading `-` excludes a
+    term. Every term is written as an fts5 string so the syntax characters of
+    the text, such as the hyphen in Spider-Man, are matched literally.
+    """
+    groups, excluded, pending_or = [[]], [], False
+    for match in SEARCH_TERM.finditer(value):
+        negated = match.group(1) or match.group(3)
+        quoted = match.group(2) is not None
+        text = match.group(2) if quoted else match.group(4)
+        if not quoted and not negated and text.lower() == "or":
+            pending_or = bool(groups[-1])
+            continue
+        # terms without words are ignored like punctuation on postgres
+        if not re.search(r"\w", text):
+            continue
+        phrase = '"%s"' % text.replace('"', '""')
+        if negated:
+            excluded.append(phrase)
+        elif pending_or:
+            groups.append([phrase])
+            pending_or = False
+        else:
+            groups[-1].append(phrase)
+
+    matched = " OR ".join("(%s)" % " AND ".join(g) for g in groups if g)
+    if not matched:
+        # an empty phrase matches no rows
+        return '""'
+    return " NOT ".join(["(%s)" % matched, *excluded])
+
+
+def search_match(column, value):
+    return SearchMatch(
+        column, literal(value, String()), literal(to_fts5_query(value), String())
+    )
+
+
+def search_rank(column, value):
+    return SearchRank(
+        column, literal(value, String()), literal(to_fts5_query(value), String())
+    )
+
+
+def join_search_rank(query, column, value, dialect_name):
+    """Join the search index of a searchable column to a select. Returns the
+    select and the relevance of its rows.
+
+    On sqlite the fts5 table is joined once and ranked by its bm25 rank column
+    so the match is not repeated for every row. Other databases rank the rows
+    with search_rank.
+    """
+    if dialect_name != "sqlite":
+        return query, search_rank(column, value)
+    table_column = column.property.columns[0]
+    index = sql_table(
+        get_search_index_name(table_column.table.name, table_column.name),
+        sql_column("rowid"),
+        sql_column("rank"),
+    )
+    primary_key = get_search_primary_key(table_column.table)
+    query = query.join(index, index.c.rowid == primary_key).where(
+        literal_column(index.name).op("MATCH")(literal(to_fts5_query(value), String()))
+    )
+    # bm25 assigns better matches numerically lower values
+    return query, -index.c.rank
+
+
+def _get_search_index(element, compiler):
+    # sqlite matches the fts5 query instead of the text of the client
+    column, _, query = list(element.clauses)
+    table = column.table
+    # aliased tables proxy the original table which owns the index
+    table_name = getattr(table, "element", table).name
+    index = compiler.preparer.quote(get_search_index_name(table_name, column.name))
+    return column, query, table, index
+
+
+@compiles(SearchMatch)
+def _compile_search_match(element, compiler, **kw):
+    # databases without full text search fall back to a LIKE scan
+    column, query, _ = list(element.clauses)
+    return compiler.process(column.contains(query), **kw)
+
+
+@compiles(SearchRank)
+def _compile_search_rank(element, compiler, **kw):
+    column, query, _ = list(element.clauses)
+    return compiler.process(case((column.contains(query), 1.0), else_=0.0), **kw)
+
+
+@compiles(SearchMatch, "sqlite")
+def _compile_sqlite_search_match(element, compiler, **kw):
+    column, query, table, index = _get_search_index(element, compiler)
+    primary_key = get_search_primary_key(table)
+    return "%s IN (SELECT rowid FROM %s WHERE %s MATCH %s)" % (
+        compiler.process(primary_key, **kw),
+        index,
+        index,
+        compiler.process(query, **kw),
+    )
+
+
+@compiles(SearchRank, "sqlite")
+def _compile_sqlite_search_rank(element, compiler, **kw):
+    # bm25 assigns better matches numerically lower values
+    column, query, table, index = _get_search_index(element, compiler)
+    primary_key = get_search_primary_key(table)
+    return "(SELECT -bm25(%s) FROM %s WHERE %s MATCH %s AND %s.rowid = %s)" % (
+        index,
+        index,
+        index,
+        compiler.process(query, **kw),
+        index,
+        compiler.process(primary_key, **kw),
+    )
+
+
+@compiles(SearchMatch, "postgresql")
+def _compile_postgresql_search_match(element, compiler, **kw):
+    column, query, _ = list(element.clauses)
+    return "to_tsvector('%s', %s) @@ websearch_to_tsquery('%s', %s)" % (
+        SEARCH_CONFIG,
+        compiler.process(column, **kw),
+        SEARCH_CONFIG,
+        compiler.process(query, **kw),
+    )
+
+
+@compiles(SearchRank, "postgresql")
+def _compile_postgresql_search_rank(element, compiler, **kw):
+    column, query, _ = list(element.clauses)
+    return "ts_rank(to_tsvector('%s', %s), websearch_to_tsquery('%s', %s))" % (
+        SEARCH_CONFIG,
+        compiler.process(column, **kw),
+        SEARCH_CONFIG,
+        compiler.process(query, **kw),
+    )
+
+
+def create_search_index(op, table_name: str, column_name: str, primary_key="id"):
+    """Create the full text search index for a column in a migration.
+
+    On sqlite this creates an fts5 external content table and the triggers
+    which keep it in sync with the table. On postgres this creates a GIN index
+    over the tsvector of the column.
+    """
+    index = get_search_index_name(table_name, column_name)
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        op.execute(
+            f"CREATE VIRTUAL TABLE {index} USING fts5("
+            + f"{column_name}, content='{table_name}', content_rowid='{primary_key}')"
+        )
+        op.execute(
+            f"CREATE TRIGGER {index}_insert AFTER INSERT ON {table_name} BEGIN "
+            + f"INSERT INTO {index}(rowid, {column_name}) "
+            + f"VALUES (new.{primary_key}, new.{column_name}); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER {index}_delete AFTER DELETE ON {table_name} BEGIN "
+            + f"INSERT INTO {index}({index}, rowid, {column_name}) "
+            + f"VALUES ('delete', old.{primary_key}, old.{column_name}); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER {index}_update AFTER UPDATE ON {table_name} BEGIN "
+            + f"INSERT INTO {index}({index}, rowid, {column_name}) "
+            + f"VALUES ('delete', old.{primary_key}, old.{column_name}); "
+            + f"INSERT INTO {index}(rowid, {column_name}) "
+            + f"VALUES (new.{primary_key}, new.{column_name}); END"
+        )
+        rebuild_search_index(op, table_name, column_name)
+    elif dialect == "postgresql":
+        op.execute(
+            f"CREATE INDEX {index} ON {table_name} "
+            + f"USING GIN (to_tsvector('{SEARCH_CONFIG}', {column_name}))"
+        )
+    else:
+        raise NotImplementedError(
+            f"Full text search indexes are not implemented for {dialect}."
+        )
+
+
+def rebuild_search_index(op, table_name: str, column_name: str):
+    """Repopulate the full text search index from the table. Postgres indexes
+    are maintained by the database so this only applies to sqlite.
+    """
+    index = get_search_index_name(table_name, column_name)
+    if op.get_bind().dialect.name == "sqlite":
+        op.execute(f"INSERT INTO {index}({index}) VALUES ('rebuild')")
+
+
+def drop_search_index(op, table_name: str, column_name: str):
+    index = get_search_index_name(table_name, column_name)
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        for trigger in ["insert", "delete", "update"]:
+            op.execute(f"DROP TRIGGER IF EXISTS {index}_{trigger}")
+        op.execute(f"DROP TABLE IF EXISTS {index}")
+    elif dialect == "postgresql":
+        op.execute(f"DROP INDEX IF EXISTS {index}")
+
+
+def get_searchable_columns(model):
+    mapper = class_mapper(model)
+    return [
+        mapper.get_property_by_column(column).key
+        for column in model.__table__.columns
+        if column.info.get("searchable", False)
+    ]
@@ -0,0 +1,626 @@
+import asyncio
+import bisect
+import contextlib
+import dataclasses
+import functools
+import json
+import logging
+import threading
+import time
+import typing as t
+import uuid
+
+import sqlalchemy as sa
+from api.strawberry_sqlalchemy.mutation_generation import (
+    CHANGED_PRIMARY_KEYS,
+    get_primary_key_columns,
+    primary_key_in,
+)
+from api.strawberry_sqlalchemy.query_generation import (
+    do_derived_fields,
+    do_limit_offset,
+    do_order_by,
+    do_row_policies,
+    do_where,
+    get_model_for_type,
+    get_selected_scalar_non_scalar_field_columns,
+)
+from api.strawberry_sqlalchemy.relationship_loading import (
+    get_chunk_size,
+    get_chunks,
+    load_relationships,
+)
+from api.strawberry_sqlalchemy.sharding import (
+    create_row_comparator,
+    get_order_by_fields,
+    get_shard_config,
+)
+from api.strawberry_sqlalchemy.statement_timeout import (
+    StatementDeadline,
+    statement_timeout,
+)
+from graphql import GraphQLError
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_mapper
+from sqlmodel import select
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+# the table processes write their committed changes to
+CHANGE_LOG_TABLE = "live_query_changes"
+
+# seconds between two reads of the change log
+CHANGE_LOG_POLL_INTERVAL = 1.0
+
+# seconds a change is kept in the change log. it only has to outlive a few
+# reads of the pollers of the other processes
+CHANGE_LOG_RETENTION = 60.0
+
+# the origin of the changes this process logs. its own changes are published
+# when they commit so its pollers skip them
+CHANGE_LOG_ORIGIN = uuid.uuid4().hex
+
+# the session info key of the changes of the current transaction
+SESSION_CHANGES = "live_query_changes"
+
+
+def _create_change_log_columns():
+    return [
+        sa.Column("id", sa.Integer, primary_key=True),
+        sa.Column("table_name", sa.String, nullable=False),
+        # the json list of the primary key, null if the changed rows are unknown
+        sa.Column("primary_key", sa.String, nullable=True),
+        sa.Column("origin", sa.String, nullable=False),
+        # the unix time the change was logged at
+        sa.Column("created_at", sa.Float, nullable=False),
+    ]
+
+
+change_log = sa.Table(CHANGE_LOG_TABLE, sa.MetaData(), *_create_change_log_columns())
+
+
+def create_change_log(op):
+    """Create the change log table in a migration"""
+    op.create_table(CHANGE_LOG_TABLE, *_create_change_log_columns())
+
+
+def drop_change_log(op):
+    op.drop_table(CHANGE_LOG_TABLE)
+
+
+def log_changes(connection, table_name: str, primary_keys=None):
+    """Write changes to the change log so live queries in other processes see
+    them. primary_keys is None if the changed rows are unknown.
+    """
+    logged = {"origin": CHANGE_LOG_ORIGIN, "created_at": time.time()}
+    if primary_keys is None:
+        rows = [{**logged, "table_name": table_name, "primary_key": None}]
+    else:
+        rows = [
+            {**logged, "table_name": table_name, "primary_key": json.dumps(list(pk))}
+            for pk in primary_keys
+        ]
+    if rows:
+        connection.execute(change_log.insert(), rows)
+
+
+def prune_change_log(connection, retention: float = CHANGE_LOG_RETENTION):
+    """Delete the changes older than the retention. The newest change is kept
+    so the ids of later changes keep growing.
+    """
+    newest = sa.select(sa.func.max(change_log.c.id)).scalar_subquery()
+    connection.execute(
+        change_log.delete().where(
+            change_log.c.created_at < time.time() - retention,
+            change_log.c.id < newest,
+        )
+    )
+
+
+def merge_changes(changes, other):
+    """Merge changes into changes. Changes map a table name to the set of
+    changed primary keys or to None if the changed rows are unknown.
+    """
+    for table_name, primary_keys in other.items():
+        if primary_keys is None or (
+            table_name in changes and changes[table_name] is None
+        ):
+            changes[table_name] = None
+        else:
+            changes.setdefault(table_name, set()).update(primary_keys)
+    return changes
+
+
+class ChangeFeed:
+    """Publishes committed changes to the live queries of this process.
+    Changes are read from the commits of sessions in this process and from the
+    change logs of other processes.
+    """
+
+    def __init__(self):
+        # the event loop and queue of every subscription
+        self._subscribers: t.Set[t.Tuple[t.Any, asyncio.Queue]] = set()
+        self._lock = threading.Lock()
+        # the engine the change log of every engine is read through, its poll
+        # interval and retention
+        self._change_logs: t.Dict[sa.engine.Engine, t.Tuple[t.Any, float, float]] = {}
+        self._pollers: t.Dict[sa.engine.Engine, threading.Thread] = {}
+        self._pruned_at: t.Dict[sa.engine.Engine, float] = {}
+
+    @property
+    def has_subscribers(self):
+        return bool(self._subscribers)
+
+    @property
+    def has_change_logs(self):
+        return bool(self._change_logs)
+
+    def add_change_log(
+        self,
+        engine,
+        read_engine=None,
+        interval: float = CHANGE_LOG_POLL_INTERVAL,
+        retention: float = CHANGE_LOG_RETENTION,
+    ):
+        """Poll the change log of an engine while there are subscribers. The
+        log is read through read_engine, by default the engine itself, so the
+        polls can stay off the connections which write. The sessions whose
+        changes are written to the log are added with log_sessions. Changes
+        older than the retention are deleted by the processes which write to
+        the log.
+        """
+        read_engine = engine if read_engine is None else read_engine
+        with self._lock:
+            self._change_logs[engine] = (read_engine, interval, retention)
+            if self._subscribers:
+                self._start_pollers()
+
+    def log_sessions(self, session_factory):
+        """Return a session factory whose sessions write their changes to the
+        change log of the engine they write to. The changes are written in
+        the transaction which makes them so they are only logged if it
+        commits.
+        """
+
+        def create_session(*args, **kwargs):
+            session = session_factory(*args, **kwargs)
+            # listened to on every session since sqlalchemy 1.4 drops the
+            # listeners of Session from a session class which gets its own
+            event.listen(session, "after_flush", self._log_flushed_changes)
+            event.listen(session, "do_orm_execute", self._log_statement_changes)
+            return session
+
+        return create_session
+
+    def _log_flushed_changes(self, session, flush_context):
+        if self.has_change_logs:
+            self.log_changes(session, get_flushed_changes(session))
+
+    def _log_statement_changes(self, orm_execute_state):
+        if self.has_change_logs:
+            self.log_changes(
+                orm_execute_state.session, get_statement_changes(orm_execute_state)
+            )
+
+    def log_changes(self, session, changes):
+        """Write changes of the transaction of a session to the change log of
+        the engine the session writes to
+        """
+        if not changes:
+            return
+        bind = session.get_bind(clause=change_log.insert())
+        if bind not in self._change_logs:
+            return
+        _, _, retention = self._change_logs[bind]
+        connection = session.connection(bind_arguments={"bind": bind})
+        for table_name, primary_keys in changes.items():
+            log_changes(connection, table_name, primary_keys)
+        now = time.time()
+        if now - self._pruned_at.get(bind, 0) >= retention:
+            self._pruned_at[bind] = now
+            prune_change_log(connection, retention)
+
+    @contextlib.asynccontextmanager
+    async def subscribe(self):
+        """Yield a queue which receives the changes committed while the
+        subscription is open
+        """
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers.add(subscriber)
+            self._start_pollers()
+        try:
+            yield subscriber[1]
+        finally:
+            with self._lock:
+                self._subscribers.discard(subscriber)
+
+    def publish(self, changes):
+        # changes are published from the threads which commit so they are
+        # handed to the event loop of every subscriber
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, changes)
+
+    def _start_pollers(self):
+        for engine, (read_engine, interval, _) in self._change_logs.items():
+            if engine in self._pollers:
+                continue
+            poller = threading.Thread(
+                target=self._poll_change_log,
+                args=(engine, read_engine, interval),
+                name="change_log",
+                daemon=True,
+            )
+            self._pollers[engine] = poller
+            poller.start()
+
+    def _poll_change_log(self, engine, read_engine, interval):
+        try:
+            with read_engine.connect() as connection:
+                last_id = connection.execute(sa.func.max(change_log.c.id)).scalar() or 0
+            while True:
+                time.sleep(interval)
+                with self._lock:
+                    # the poller stops with the last subscription and the next
+                    # subscription starts a new one
+                    if not self._subscribers:
+                        del self._pollers[engine]
+                        return
+                last_id = self._read_change_log(read_engine, last_id)
+        except Exception:
+            with self._lock:
+                self._pollers.pop(engine, None)
+            logger.exception("Stopped polling the change log")
+
+    def _read_change_log(self, engine, last_id):
+        with engine.connect() as connection:
+            rows = connection.execute(
+                change_log.select()
+                .where(change_log.c.id > last_id)
+                .order_by(change_log.c.id)
+            ).all()
+        if not rows:
+            return last_id
+        changes: t.Dict[str, t.Optional[t.Set[tuple]]] = {}
+        for row in rows:
+            if row.origin == CHANGE_LOG_ORIGIN:
+                continue
+            primary_keys = (
+                None
+                if row.primary_key is None
+                else {tuple(json.loads(row.primary_key))}
+            )
+            merge_changes(changes, {row.table_name: primary_keys})
+        if changes:
+            self.publish(changes)
+        return rows[-1].id
+
+
+change_feed = ChangeFeed()
+
+
+def get_flushed_changes(session):
+    """Return the changes of the objects a session flushes"""
+    changes: t.Dict[str, t.Optional[t.Set[tuple]]] = {}
+    for obj in [*session.new, *session.dirty, *session.deleted]:
+        mapper = object_mapper(obj)
+        merge_changes(
+            changes,
+            {mapper.local_table.name: {tuple(mapper.primary_key_from_instance(obj))}},
+        )
+    return changes
+
+
+def get_statement_changes(orm_execute_state):
+    """Return the changes of an insert, update or delete statement"""
+    state = orm_execute_state
+    if not (state.is_insert or state.is_update or state.is_delete):
+        return {}
+    # TODO: writes executed as text are not detected
+    primary_keys = state.execution_options.get(CHANGED_PRIMARY_KEYS)
+    if primary_keys is not None:
+        primary_keys = {tuple(pk) for pk in primary_keys}
+    return {state.statement.table.name: primary_keys}
+
+
+def record_changes(session, table_name: str, primary_keys=None):
+    """Record changes of the current transaction of a session. They are
+    published when the transaction commits.
+    """
+    # changes are only tracked while a live query listens
+    if not change_feed.has_subscribers:
+        return
+    if primary_keys is not None:
+        primary_keys = {tuple(pk) for pk in primary_keys}
+    changes = session.info.setdefault(SESSION_CHANGES, {})
+    merge_changes(changes, {table_name: primary_keys})
+
+
+@event.listens_for(Session, "after_flush")
+def _record_flushed_changes(session, flush_context):
+    if not change_feed.has_subscribers:
+        return
+    for table_name, primary_keys in get_flushed_changes(session).items():
+        record_changes(session, table_name, primary_keys)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _record_statement_changes(orm_execute_state):
+    if not change_feed.has_subscribers:
+        return
+    for table_name, primary_keys in get_statement_changes(orm_execute_state).items():
+        record_changes(orm_execute_state.session, table_name, primary_keys)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed_changes(session):
+    changes = session.info.pop(SESSION_CHANGES, None)
+    if changes:
+        change_feed.publish(changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back_changes(session):
+    session.info.pop(SESSION_CHANGES, None)
+
+
+def get_longest_increasing_subsequence(values):
+    """Return the indices of a longest strictly increasing subsequence"""
+    # tails[k] is the index of the smallest value which ends an increasing
+    # subsequence of length k + 1
+    tails: t.List[int] = []
+    tail_values: t.List[t.Any] = []
+    previous: t.List[t.Optional[int]] = [None] * len(values)
+    for i, value in enumerate(values):
+        k = bisect.bisect_left(tail_values, value)
+        previous[i] = tails[k - 1] if k else None
+        if k == len(tails):
+            tails.append(i)
+            tail_values.append(value)
+        else:
+            tails[k] = i
+            tail_values[k] = value
+    indices = []
+    i = tails[-1] if tails else None
+    while i is not None:
+        indices.append(i)
+        i = previous[i]
+    return indices[::-1]
+
+
+def diff_rows(old, new):
+    """Return the json patch operations which turn the old rows into the new
+    rows. Rows are (primary key, snapshot, row) tuples and a row is replaced
+    if its snapshot changed.
+
+    The rows which are kept in a longest run already in the new order stay
+    where they are. Every other kept row is moved once, which is the least
+    number of moves.
+    """
+    operations = []
+    new_indices = {key: i for i, (key, _, _) in enumerate(new)}
+    current = list(old)
+    for i in reversed(range(len(current))):
+        if current[i][0] not in new_indices:
+            operations.append(("remove", f"/{i}", None, None))
+            del current[i]
+    old_entries = {entry[0]: entry for entry in current}
+    keys = [key for key, _, _ in current]
+    in_place = {
+        keys[i]
+        for i in get_longest_increasing_subsequence([new_indices[k] for k in keys])
+    }
+    # the rows are placed in the new order so the row before each row is
+    # already in place
+    for i, (key, _, row) in enumerate(new):
+        if key in in_place:
+            continue
+        j = keys.index(key) if key in old_entries else None
+        if j is not None:
+            keys.pop(j)
+        to = keys.index(new[i - 1][0]) + 1 if i else 0
+        keys.insert(to, key)
+        if j is None:
+            operations.append(("add", f"/{to}", None, row))
+        elif j != to:
+            operations.append(("move", f"/{to}", f"/{j}", None))
+    for i, (key, snapshot, row) in enumerate(new):
+        if key in old_entries and old_entries[key][1] != snapshot:
+            operations.append(("replace", f"/{i}", None, row))
+    return operations
+
+
+def get_selected_value_fields(info):
+    """Return the selections of the rows in the operations of a live patch"""
+    for operations in info.selected_fields[0].selections:
+        if operations.name == "operations":
+            for value in operations.selections:
+                if value.name == "value":
+                    return list(value.selections)
+    return []
+
+
+class LiveQuery:
+    """The state of an all type query which is kept up to date.
+
+    A change of known rows only loads the changed rows and merges them into
+    the result in order. A change of unknown rows, or a change which may move
+    rows in or out of a limited result, evaluates the whole query again.
+    """
+
+    def __init__(self, info, type_, where, limit, offset, order_by):
+        self.info = info
+        self.type_ = type_
+        self.model = model = get_model_for_type(info, type_)
+        self.table_name = model.__table__.name
+        self.windowed = limit is not None or offset is not None
+        self.primary_key_columns = get_primary_key_columns(model)
+        mapper = sa.inspect(model)
+        self.primary_key_attributes = [
+            mapper.get_property_by_column(c).key for c in self.primary_key_columns
+        ]
+
+        (
+            self.scalar_field_columns,
+            self.non_scalar_field_columns,
+        ) = get_selected_scalar_non_scalar_field_columns(
+            info, type_, get_selected_value_fields(info)
+        )
+        order_by_fields = get_order_by_fields(order_by)
+
+        query = select(model)
+        query = do_where(info, type_, query, where)
+        query = do_row_policies(info, query)
+        # the fields used to merge changed rows in order have to be loaded
+        query = do_derived_fields(
+            info,
+            query,
+            [
+                *self.scalar_field_columns,
+                *[(None, getattr(model, name)) for name, _ in order_by_fields],
+            ],
+        )
+        self.query = query
+        # the primary key makes the order of the rows total
+        self.ordered_query = do_limit_offset(
+            do_order_by(info, type_, query, order_by, where).order_by(
+                *self.primary_key_columns
+            ),
+            limit,
+            offset,
+        )
+        self.order_by_fields = order_by_fields
+
+    def get_entry(self, row):
+        key = tuple(getattr(row, a) for a in self.primary_key_attributes)
+        snapshot = tuple(getattr(row, c.key) for _, c in self.scalar_field_columns)
+        return key, snapshot, row
+
+    @contextlib.contextmanager
+    def evaluation(self):
+        """Create the info of an evaluation. Every evaluation has its own
+        session and deadline since the subscription outlives both.
+        """
+        context = self.info.context
+        db = context["create_session"]()
+        try:
+            raw_info = self.info._raw_info._replace(
+                context=dict(context, db=db, statement_deadline=StatementDeadline())
+            )
+            yield dataclasses.replace(self.info, _raw_info=raw_info), db
+        finally:
+            db.close()
+
+    def load(self, info, db, queries):
+        rows = []
+        with statement_timeout(info, self.type_, db):
+            for query in queries:
+                rows.extend(db.exec(query).all())
+        load_relationships(info, db, self.type_, rows, self.non_scalar_field_columns)
+        return [self.get_entry(row) for row in rows]
+
+    def evaluate(self):
+        with self.evaluation() as (info, db):
+            return self.load(info, db, [self.ordered_query])
+
+    def reevaluate(self, entries, primary_keys):
+        """Return the rows of the query after the rows with the primary keys
+        changed. None means unknown rows changed.
+        """
+        if primary_keys is None:
+            return self.evaluate()
+
+        with self.evaluation() as (info, db):
+            dialect = db.get_bind().dialect
+            chunk_size = get_chunk_size(info, dialect, len(self.primary_key_columns))
+            changed = self.load(
+                info,
+                db,
+                [
+                    self.query.where(primary_key_in(self.model, chunk))
+                    for chunk in get_chunks(list(primary_keys), chunk_size)
+                ],
+            )
+
+        entries_by_key = {entry[0]: entry for entry in entries}
+        if self.windowed:
+            if changed or any(pk in entries_by_key for pk in primary_keys):
+                return self.evaluate()
+            return entries
+
+        for primary_key in primary_keys:
+            entries_by_key.pop(primary_key, None)
+        for entry in changed:
+            entries_by_key[entry[0]] = entry
+        compare_rows = create_row_comparator(self.order_by_fields, dialect)
+
+        def compare(a, b):
+            return compare_rows(a[2], b[2]) or (a[0] > b[0]) - (a[0] < b[0])
+
+        return sorted(entries_by_key.values(), key=functools.cmp_to_key(compare))
+
+
+def create_live_type_resolver(
+    type_: type, live_patch: type, live_patch_operation: type
+):
+    """create a subscription resolver which sends the changes of an all type
+    query as json patch operations. The first patch adds the current rows.
+    """
+    from api.strawberry_sqlalchemy.schema_generation import (
+        create_non_scalar_comparison_expression,
+        create_non_scalar_order_by_expression,
+    )
+
+    def create_patch(revision, operations):
+        return live_patch(
+            revision=revision,
+            operations=[
+                live_patch_operation(op=op, path=path, from_=from_, value=value)
+                for op, path, from_, value in operations
+            ],
+        )
+
+    async def live_type_resolver(
+        self,
+        info,
+        where: t.Optional[create_non_scalar_comparison_expression(type_)] = None,
+        limit: t.Optional[int] = None,
+        offset: t.Optional[int] = None,
+        orderBy: t.Optional[create_non_scalar_order_by_expression(type_)] = None,
+    ) -> t.AsyncGenerator[live_patch, None]:
+        if get_shard_config(info, type_) is not None:
+            # TODO: subscribe to the change feeds of every shard
+            raise GraphQLError(
+                f"Live queries of the sharded type {type_.__name__} are not "
+                + "supported."
+            )
+        live_query = LiveQuery(info, type_, where, limit, offset, orderBy)
+
+        # subscribe before the first evaluation so no commit is missed
+        async with change_feed.subscribe() as queue:
+            revision = 0
+            entries = await run_in_threadpool(live_query.evaluate)
+            yield create_patch(revision, diff_rows([], entries))
+
+            while True:
+                changes = merge_changes({}, await queue.get())
+                while not queue.empty():
+                    merge_changes(changes, queue.get_nowait())
+                # TODO: changes of relationships and derived fields are not
+                # detected
+                if live_query.table_name not in changes:
+                    continue
+
+                new_entries = await run_in_threadpool(
+                    live_query.reevaluate, entries, changes[live_query.table_name]
+                )
+                operations = diff_rows(entries, new_entries)
+                entries = new_entries
+                if operations:
+                    revision += 1
+                    yield create_patch(revision, operations)
+
+    return live_type_resolver
@@ -1,26 +1,102 @@
+import hmac
+import os
 import typing as t
 
 import strawberry
+from api.strawberry_sqlalchemy.engine_registry import RoutingSession, requires_primary
+from api.strawberry_sqlalchemy.explain_capture import ExplainCapture
+from api.strawberry_sqlalchemy.full_text_search import make_searchable
+from api.strawberry_sqlalchemy.live_queries import change_feed
+from api.strawberry_sqlalchemy.operation_batching import (
+    enable_statement_cache,
+    is_batched,
+)
+from api.strawberry_sqlalchemy.parallel_execution import (
+    create_parallel_execution_context,
+)
 from api.strawberry_sqlalchemy.schema_generation import (
+    add_derived_field,
     create_array_relationship_resolver,
     create_generation_context,
+    create_mutation_root,
     create_query_root,
+    create_subscription_root,
+)
+from api.strawberry_sqlalchemy.schema_snapshot import (
+    load_schema_snapshot,
+    save_schema_snapshot,
 )
-from main.database import engine
-from sqlmodel import Session
+from main.database import engines
+from sqlalchemy import func
+from sqlalchemy.orm import sessionmaker
+from sqlmodel import select
 from strawberry.extensions import Extension
 
 from .movie_model_example import DirectorModel, MovieModel
 
+# the generated types are rebuilt from this json snapshot while the models are
+# unchanged. the snapshot is off unless a path is set
+SCHEMA_SNAPSHOT_PATH = os.environ.get("SCHEMA_SNAPSHOT_PATH", "")
+
+# the sessions of the example. the changes they commit are written to the
+# change log, see add_change_log below
+SessionLocal = change_feed.log_sessions(
+    sessionmaker(
+        class_=RoutingSession,
+        registry=engines,
+        autocommit=False,
+        autoflush=False,
+        future=True,
+    )
+)
+
+# clients sending this token as a bearer token are admins which can ask for
+# the plans of their statements and list the slow statements. nobody is an
+# admin while it is unset
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+
 
 class SQLAlchemySession(Extension):
     def on_request_start(self):
-        self.execution_context.context["db"] = Session(
-            autocommit=False, autoflush=False, bind=engine, future=True
-        )
+        context = self.execution_context.context
+        if is_batched(context):
+            # the operations of a batch share one session and its connection
+            # so they are not resolved in parallel
+            if "db" not in context:
+                context["db"] = enable_statement_cache(self.create_session())
+            return
+        context["db"] = self.create_session()
+        # root fields resolved in parallel each get their own session
+        context["create_session"] = self.create_session
+
+    def on_validation_start(self):
+        # the operation is parsed at this point so we know if it writes
+        if requires_primary(self.execution_context):
+            self.execution_context.context["db"].use_primary = True
+
+    def create_session(self):
+        db = SessionLocal()
+        db.use_primary = requires_primary(self.execution_context)
+        return db
 
     def on_request_end(self):
-        self.execution_context.context["db"].close()
+        # the batch closes its session once every operation has executed
+        if not is_batched(self.execution_context.context):
+            self.execution_context.context["db"].close()
+
+
+make_searchable(MovieModel, "title")
+
+add_derived_field(
+    DirectorModel,
+    "movies_count",
+    select(func.count(MovieModel.id))
+    .where(MovieModel.director_id == DirectorModel.id)
+    .scalar_subquery(),
+)
+
+if SCHEMA_SNAPSHOT_PATH:
+    load_schema_snapshot(SCHEMA_SNAPSHOT_PATH, DirectorModel.metadata)
 
 
 @strawberry.experimental.pydantic.type(
@@ -45,14 +121,26 @@ class Movie:
     fields=["id", "name", "movies"],
 )
 class Director:
+    movies_count: int
     movies: t.List[Movie] = strawberry.field(
         resolver=create_array_relationship_resolver(Movie)
     )
 
 
+def is_admin(context):
+    request = context.get("request")
+    if not ADMIN_TOKEN or request is None:
+        return False
+    return hmac.compare_digest(
+        request.headers.get("authorization", ""), f"Bearer {ADMIN_TOKEN}"
+    )
+
+
 # TODO: would be nice to make this simpler
 auto_types = [Movie, Director]
-auto_schema_context = create_generation_context(auto_types)
+auto_schema_context = create_generation_context(
+    auto_types, explain_sample_rate=0.01, explain_requests=True, is_admin=is_admin
+)
 
 
 class AutoSchemaContext(Extension):
@@ -60,8 +148,37 @@ class AutoSchemaContext(Extension):
         self.execution_context.context["auto_schema"] = auto_schema_context
 
 
-Query = create_query_root(auto_types)
+Query = create_query_root(auto_types, slow_statements_query=True)
+Mutation = create_mutation_root(auto_types)
+Subscription = create_subscription_root(auto_types)
+# the changes committed by every process are logged so live queries see the
+# writes of other workers. the log is read from a replica, or the readers of
+# a sqlite file, so the polls do not wait for the writer connection
+change_feed.add_change_log(engines.primary, engines.get_read_engine())
+
+
+def create_live_query_session():
+    # live queries are evaluated after a commit so they read from the primary
+    # which has seen the commit
+    db = SessionLocal()
+    db.use_primary = True
+    return db
+
+
+def get_subscription_context():
+    return {
+        "auto_schema": auto_schema_context,
+        "create_session": create_live_query_session,
+    }
+
 
 schema = strawberry.Schema(
-    query=Query, extensions=[SQLAlchemySession, AutoSchemaContext]
+    query=Query,
+    mutation=Mutation,
+    subscription=Subscription,
+    extensions=[SQLAlchemySession, AutoSchemaContext, ExplainCapture],
+    execution_context_class=create_parallel_execution_context(),
 )
+# saved once the schema resolved the filters of the lazy relationships
+if SCHEMA_SNAPSHOT_PATH:
+    save_schema_snapshot(SCHEMA_SNAPSHOT_PATH, DirectorModel.metadata)
@@ -0,0 +1,335 @@
+import typing as t
+
+from api.strawberry_sqlalchemy.query_generation import (
+    do_derived_fields,
+    do_row_policies,
+    do_row_policy_where,
+    do_where,
+    get_derived_expression,
+    get_model_for_type,
+    get_selected_scalar_non_scalar_field_columns,
+    get_where_criteria,
+)
+from api.strawberry_sqlalchemy.relationship_loading import load_relationships
+from api.strawberry_sqlalchemy.sharding import get_shard_config
+from api.strawberry_sqlalchemy.statement_timeout import statement_timeout
+from graphql import GraphQLError
+from sqlalchemy import delete, insert
+from sqlalchemy import select as core_select
+from sqlalchemy import tuple_, update
+from sqlalchemy.orm import class_mapper
+from sqlmodel import select
+
+# execution option of insert, update and delete statements which lists the
+# primary keys of the rows they change. live queries treat statements without
+# it as changing unknown rows of their table
+CHANGED_PRIMARY_KEYS = "changed_primary_keys"
+
+
+def get_input_values(input_):
+    """Convert a generated mutation input into a mapping from column names to
+    values. Fields which are None are treated as not provided.
+    """
+    if input_ is None:
+        return {}
+    return {k: v for k, v in input_.__dict__.items() if v is not None}
+
+
+def get_primary_key_columns(model):
+    return list(class_mapper(model).primary_key)
+
+
+def primary_key_in(model, primary_keys):
+    """Create a where clause matching the rows with the given primary keys"""
+    primary_key_columns = get_primary_key_columns(model)
+    if len(primary_key_columns) == 1:
+        return primary_key_columns[0].in_([pk[0] for pk in primary_keys])
+    return tuple_(*primary_key_columns).in_([tuple(pk) for pk in primary_keys])
+
+
+def supports_returning(db):
+    """Check if the database supports RETURNING on insert, update and delete"""
+    return getattr(db.get_bind().dialect, "full_returning", False)
+
+
+def get_selected_returning_field(info):
+    """Return the `returning` selection of a mutation response if requested"""
+    for selection in info.selected_fields[0].selections:
+        if selection.name == "returning":
+            return selection
+    return None
+
+
+def load_returning_rows(info, type_, query, returning_field):
+    """Load the rows selected by `returning` as orm objects. Relationships in
+    the selection set are eager loaded the same way as the all type resolver.
+    """
+    db = info.context["db"]
+    selected_fields = [s for s in returning_field.selections]
+    (
+        scalar_field_columns,
+        non_scalar_field_columns,
+    ) = get_selected_scalar_non_scalar_field_columns(info, type_, selected_fields)
+    query = do_derived_fields(info, query, scalar_field_columns)
+    query = do_row_policies(info, query)
+    with statement_timeout(info, type_):
+        rows = db.exec(query).all()
+    load_relationships(info, db, type_, rows, non_scalar_field_columns)
+    return rows
+
+
+def check_not_sharded(info, type_):
+    # TODO: route inserts by the shard key and fan out updates and deletes
+    if get_shard_config(info, type_) is not None:
+        raise GraphQLError(
+            f"Mutations of the sharded type {type_.__name__} are not supported."
+        )
+
+
+def check_where(info, type_, where, all_rows):
+    """Refuse to update or delete every row of a table unless the caller asks
+    for it. A where clause whose filters are all empty matches every row.
+    """
+    if not all_rows and not get_where_criteria(info, type_, where):
+        raise ValueError(
+            "The where clause does not filter any rows. Pass allRows: true to "
+            + "change every row."
+        )
+
+
+def get_returning_columns(info, type_, returning_field):
+    """Return the columns to put in a RETURNING clause for the `returning`
+    selection. Returns None if the selection contains relationships or derived
+    fields, in which case the rows have to be loaded with a separate select.
+    """
+    model = get_model_for_type(info, type_)
+    selected_fields = [s for s in returning_field.selections]
+    (
+        scalar_field_columns,
+        non_scalar_field_columns,
+    ) = get_selected_scalar_non_scalar_field_columns(info, type_, selected_fields)
+    if non_scalar_field_columns or any(
+        get_derived_expression(column) is not None for _, column in scalar_field_columns
+    ):
+        return None
+    columns = [column for _, column in scalar_field_columns]
+    for pk_column in get_primary_key_columns(model):
+        if all(c.key != pk_column.key for c in columns):
+            columns.append(getattr(model, pk_column.key))
+    return columns
+
+
+def create_insert_type_resolver(type_: type, mutation_response: type):
+    """create a resolver which inserts many instances of a type in a single
+    INSERT statement per distinct set of provided columns.
+    """
+    from api.strawberry_sqlalchemy.schema_generation import create_insert_input
+
+    def insert_type_resolver(
+        self,
+        info,
+        objects: t.List[create_insert_input(type_)],
+    ) -> mutation_response:
+        check_not_sharded(info, type_)
+        model = get_model_for_type(info, type_)
+        db = info.context["db"]
+        returning_field = get_selected_returning_field(info)
+        pk_keys = [c.key for c in get_primary_key_columns(model)]
+
+        # a multi row VALUES clause needs every row to provide the same columns
+        # so we group the rows by the columns they provide
+        rows_by_columns: t.Dict[t.Tuple[str, ...], t.List[dict]] = {}
+        for object_ in objects:
+            values = get_input_values(object_)
+            rows_by_columns.setdefault(tuple(sorted(values)), []).append(values)
+
+        use_returning = returning_field is not None and supports_returning(db)
+        returning_columns = (
+            get_returning_columns(info, type_, returning_field)
+            if use_returning
+            else None
+        )
+        statement_returning = returning_columns or [getattr(model, k) for k in pk_keys]
+
+        affected_rows = 0
+        returned_rows = []
+        primary_keys = []
+        with statement_timeout(info, type_):
+            for rows in rows_by_columns.values():
+                provides_primary_keys = all(k in row for row in rows for k in pk_keys)
+                if returning_field is not None and not (
+                    use_returning or provides_primary_keys
+                ):
+                    # without RETURNING the generated primary keys are only known
+                    # for inserts of a single row
+                    for row in rows:
+                        result = db.execute(insert(model).values(row))
+                        primary_keys.append(tuple(result.inserted_primary_key))
+                    affected_rows += len(rows)
+                    continue
+
+                statement = insert(model).values(rows)
+                if provides_primary_keys:
+                    # live queries only load the inserted rows
+                    row_primary_keys = [tuple(row[k] for k in pk_keys) for row in rows]
+                    primary_keys.extend(row_primary_keys)
+                    statement = statement.execution_options(
+                        changed_primary_keys=row_primary_keys
+                    )
+                if use_returning:
+                    statement = statement.returning(*statement_returning)
+                    returned_rows.extend(db.execute(statement).all())
+                    affected_rows += len(rows)
+                else:
+                    affected_rows += db.execute(statement).rowcount
+        db.commit()
+
+        if returning_field is None:
+            return mutation_response(affected_rows=affected_rows)
+
+        if returning_columns is not None:
+            return mutation_response(
+                affected_rows=affected_rows, returning=returned_rows
+            )
+
+        if use_returning:
+            primary_keys = [
+                tuple(getattr(r, k) for k in pk_keys) for r in returned_rows
+            ]
+
+        rows = []
+        if primary_keys:
+            query = select(model).where(primary_key_in(model, primary_keys))
+            rows = load_returning_rows(info, type_, query, returning_field)
+        return mutation_response(affected_rows=affected_rows, returning=rows)
+
+    return insert_type_resolver
+
+
+def create_update_type_resolver(type_: type, mutation_response: type):
+    """create a resolver which updates every instance of a type matching a
+    where clause in a single UPDATE statement.
+    """
+    from api.strawberry_sqlalchemy.schema_generation import (
+        create_inc_input,
+        create_non_scalar_comparison_expression,
+        create_set_input,
+    )
+
+    def update_type_resolver(
+        self,
+        info,
+        where: create_non_scalar_comparison_expression(type_),
+        set_: t.Optional[create_set_input(type_)] = None,
+        inc_: t.Optional[create_inc_input(type_)] = None,
+        all_rows: bool = False,
+    ) -> mutation_response:
+        check_not_sharded(info, type_)
+        check_where(info, type_, where, all_rows)
+        model = get_model_for_type(info, type_)
+        db = info.context["db"]
+        returning_field = get_selected_returning_field(info)
+
+        values = get_input_values(set_)
+        for name, value in get_input_values(inc_).items():
+            if name in values:
+                raise ValueError(f"Cannot both set and increment the column {name}")
+            values[name] = getattr(model, name) + value
+        if not values:
+            return mutation_response(affected_rows=0)
+
+        statement = do_where(info, type_, update(model), where)
+        statement = do_row_policy_where(info, type_, statement)
+        # the update is executed as a single set based statement so we do not
+        # want the session to find and synchronize matching objects in python
+        statement = statement.values(values).execution_options(
+            synchronize_session=False
+        )
+
+        if returning_field is None:
+            with statement_timeout(info, type_):
+                result = db.execute(statement)
+            db.commit()
+            return mutation_response(affected_rows=result.rowcount)
+
+        returning_columns = get_returning_columns(info, type_, returning_field)
+        if supports_returning(db) and returning_columns is not None:
+            with statement_timeout(info, type_):
+                rows = db.execute(statement.returning(*returning_columns)).all()
+            db.commit()
+            return mutation_response(affected_rows=len(rows), returning=rows)
+
+        # the update may change the columns used in the where clause so we
+        # capture the primary keys of the matching rows before updating
+        primary_key_query = do_where(
+            info, type_, core_select(*get_primary_key_columns(model)), where
+        )
+        primary_key_query = do_row_policy_where(info, type_, primary_key_query)
+        with statement_timeout(info, type_):
+            primary_keys = db.execute(primary_key_query).all()
+            result = db.execute(
+                statement.execution_options(changed_primary_keys=primary_keys)
+            )
+        db.commit()
+
+        rows = []
+        if primary_keys:
+            query = select(model).where(primary_key_in(model, primary_keys))
+            rows = load_returning_rows(info, type_, query, returning_field)
+        return mutation_response(affected_rows=result.rowcount, returning=rows)
+
+    return update_type_resolver
+
+
+def create_delete_type_resolver(type_: type, mutation_response: type):
+    """create a resolver which deletes every instance of a type matching a
+    where clause in a single DELETE statement.
+    """
+    from api.strawberry_sqlalchemy.schema_generation import (
+        create_non_scalar_comparison_expression,
+    )
+
+    def delete_type_resolver(
+        self,
+        info,
+        where: create_non_scalar_comparison_expression(type_),
+        all_rows: bool = False,
+    ) -> mutation_response:
+        check_not_sharded(info, type_)
+        check_where(info, type_, where, all_rows)
+        model = get_model_for_type(info, type_)
+        db = info.context["db"]
+        returning_field = get_selected_returning_field(info)
+
+        statement = do_where(info, type_, delete(model), where)
+        statement = do_row_policy_where(info, type_, statement)
+        statement = statement.execution_options(synchronize_session=False)
+
+        if returning_field is None:
+            with statement_timeout(info, type_):
+                result = db.execute(statement)
+            db.commit()
+            return mutation_response(affected_rows=result.rowcount)
+
+        returning_columns = get_returning_columns(info, type_, returning_field)
+        if supports_returning(db) and returning_columns is not None:
+            with statement_timeout(info, type_):
+                rows = db.execute(statement.returning(*returning_columns)).all()
+            db.commit()
+            return mutation_response(affected_rows=len(rows), returning=rows)
+
+        # the rows no longer exist after the delete so we load them first and
+        # detach them from the session so committing does not expire them
+        query = do_where(info, type_, select(model), where)
+        rows = load_returning_rows(info, type_, query, returning_field)
+        pk_keys = [c.key for c in get_primary_key_columns(model)]
+        primary_keys = [tuple(getattr(r, k) for k in pk_keys) for r in rows]
+        with statement_timeout(info, type_):
+            result = db.execute(
+                statement.execution_options(changed_primary_keys=primary_keys)
+            )
+        db.expunge_all()
+        db.commit()
+        return mutation_response(affected_rows=result.rowcount, returning=rows)
+
+    return delete_type_resolver
@@ -0,0 +1,68 @@
+import json
+
+from sqlalchemy import event
+
+# the maximum number of operations in a single batch request
+MAX_BATCH_SIZE = 50
+
+# set in the context of operations executed as part of a batch
+OPERATION_BATCH = "operation_batch"
+
+
+def is_batched(context):
+    return isinstance(context, dict) and context.get(OPERATION_BATCH, False)
+
+
+def get_statement_cache_key(orm_execute_state):
+    bind = orm_execute_state.session.get_bind()
+    compiled = orm_execute_state.statement.compile(bind)
+    parameters = dict(compiled.params, **(orm_execute_state.parameters or {}))
+    return (str(compiled), json.dumps(parameters, sort_keys=True, default=str))
+
+
+def enable_statement_cache(session):
+    """Cache the results of the selects executed by a session so identical
+    statements of the operations in a batch only run once. Any write clears
+    the cache so later operations read their own writes.
+    """
+    results = {}
+
+    @event.listens_for(session, "do_orm_execute")
+    def _do_orm_execute(orm_execute_state):
+        if not orm_execute_state.is_select:
+            results.clear()
+            return None
+        key = get_statement_cache_key(orm_execute_state)
+        if key not in results:
+            results[key] = orm_execute_state.invoke_statement().freeze()
+        # a frozen result creates a new result every time it is called
+        return results[key]()
+
+    return session
+
+
+def execute_batch(schema, operations, context, root_value=None):
+    """Execute the operations of a batch one after another. The operations
+    share the context and so share the session, its connection and its
+    statement cache.
+    """
+    context[OPERATION_BATCH] = True
+    results = []
+    try:
+        for operation in operations:
+            result = schema.execute_sync(
+                operation.query,
+                root_value=root_value,
+                variable_values=operation.variables,
+                operation_name=operation.operation_name,
+                context_value=context,
+            )
+            if result.errors and "db" in context:
+                # a failed statement leaves the transaction unusable for the
+                # following operations
+                context["db"].rollback()
+            results.append(result)
+    finally:
+        if "db" in context:
+            context["db"].close()
+    return results
@@ -0,0 +1,110 @@
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
+
+from api.strawberry_sqlalchemy.statement_timeout import StatementDeadline
+from graphql import ExecutionContext, GraphQLError, Undefined
+from graphql.pyutils import Path
+
+# the number of root fields of all operations which are resolved at the same
+# time. each root field holds a pooled connection while it runs so this should
+# not exceed the size of the connection pool
+MAX_ROOT_FIELD_WORKERS = 4
+
+
+def get_root_field_name(path):
+    while path.prev is not None:
+        path = path.prev
+    return path.key
+
+
+class ParallelExecutionContext(ExecutionContext):
+    """Resolves the root fields of a query in parallel on a bounded thread pool.
+
+    Root fields of a query cannot depend on each other so each one is resolved
+    with its own session created by the `create_session` callable in the
+    context. The latency of an operation is close to the latency of its slowest
+    root field instead of the sum of all of them. Mutations are still executed
+    serially as required by the spec.
+    """
+
+    executor: t.Optional[ThreadPoolExecutor] = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.root_field_contexts: t.Dict[str, dict] = {}
+
+    def build_resolve_info(self, field_def, field_nodes, parent_type, path):
+        info = super().build_resolve_info(field_def, field_nodes, parent_type, path)
+        context = self.root_field_contexts.get(get_root_field_name(path))
+        if context is not None:
+            info = info._replace(context=context)
+        return info
+
+    def execute_fields(self, parent_type, source_value, path, fields):
+        if (
+            path is not None
+            or len(fields) < 2
+            or self.executor is None
+            or not isinstance(self.context_value, dict)
+            or "create_session" not in self.context_value
+        ):
+            return super().execute_fields(parent_type, source_value, path, fields)
+
+        # the deadline is shared so cancelling the operation cancels every field
+        self.context_value.setdefault("statement_deadline", StatementDeadline())
+
+        futures = {
+            response_name: self.executor.submit(
+                self.resolve_root_field,
+                parent_type,
+                source_value,
+                response_name,
+                field_nodes,
+            )
+            for response_name, field_nodes in fields.items()
+        }
+        results = {}
+        error = None
+        # wait for every field even if one fails so no session outlives the
+        # operation
+        for response_name, future in futures.items():
+            try:
+                result = future.result()
+            except GraphQLError as e:
+                error = error or e
+                continue
+            if result is not Undefined:
+                results[response_name] = result
+        if error is not None:
+            raise error
+        # TODO: support async resolvers, results are assumed to be complete
+        return results
+
+    def resolve_root_field(self, parent_type, source_value, response_name, nodes):
+        db = self.context_value["create_session"]()
+        self.root_field_contexts[response_name] = dict(self.context_value, db=db)
+        try:
+            return self.resolve_field(
+                parent_type,
+                source_value,
+                nodes,
+                Path(None, response_name, parent_type.name),
+            )
+        finally:
+            db.close()
+
+
+def create_parallel_execution_context(max_workers: int = MAX_ROOT_FIELD_WORKERS):
+    """Create an execution context class which resolves root fields on a
+    thread pool with max_workers threads. Pass it to the schema as the
+    execution_context_class.
+    """
+    return type(
+        "ParallelExecutionContext",
+        (ParallelExecutionContext,),
+        {
+            "executor": ThreadPoolExecutor(
+                max_workers=max_workers, thread_name_prefix="root_field"
+            )
+        },
+    )
@@ -1,6 +1,20 @@
 import typing as t
 
-from sqlalchemy.orm import RelationshipProperty, selectinload
+from api.strawberry_sqlalchemy.full_text_search import (
+    get_searchable_columns,
+    join_search_rank,
+    search_match,
+)
+from api.strawberry_sqlalchemy.statement_timeout import statement_timeout
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import (
+    ColumnProperty,
+    RelationshipProperty,
+    with_expression,
+    with_loader_criteria,
+)
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.visitors import replacement_traverse
 from sqlmodel import select
 
 
@@ -30,6 +44,26 @@ def get_type_for_column(info, column):
     return schema_context["mapper_to_type"][get_mapper_for_column(info, column)]
 
 
+def is_relationship_column(column):
+    # derived fields such as hybrid properties are sql expressions which do not
+    # have a mapped property so we cannot access column.property directly
+    return isinstance(getattr(column, "property", None), RelationshipProperty)
+
+
+def get_derived_expression(column):
+    """Return the sql expression of a field added with add_derived_field"""
+    column_property = getattr(column, "property", None)
+    if not isinstance(column_property, ColumnProperty):
+        return None
+    return column_property.info.get("derived_expression")
+
+
+def get_column_expression(column):
+    """Return the sql expression used to filter and sort on a column"""
+    derived_expression = get_derived_expression(column)
+    return column if derived_expression is None else derived_expression
+
+
 def get_graphql_python_name_map_for_type(info, type_):
     """Create a mapping from graphql field names to python attribute names"""
 
@@ -61,55 +95,90 @@ def get_selected_scalar_non_scalar_field_columns(
     )
 
     scalar_field_columns = [
-        fc
-        for fc in selected_field_columns
-        if not isinstance(fc[1].property, RelationshipProperty)
+        fc for fc in selected_field_columns if not is_relationship_column(fc[1])
     ]
 
     non_scalar_field_columns = [
-        c
-        for c in selected_field_columns
-        if isinstance(c[1].property, RelationshipProperty)
+        c for c in selected_field_columns if is_relationship_column(c[1])
     ]
 
     return scalar_field_columns, non_scalar_field_columns
 
 
-def do_nested_select(info, type_, query, selected_field, column, parent_model):
-    selected_fields = [s for s in selected_field.selections]
+def do_derived_fields(info, query, scalar_field_columns):
+    """Add the selected derived fields to the select projection. Derived
+    fields are only computed when they are selected.
+    """
+    for _, column in scalar_field_columns:
+        expression = get_derived_expression(column)
+        if expression is not None:
+            expression = do_row_policy_expression(info, expression)
+            query = query.options(with_expression(column, expression))
+    return query
 
-    model = get_model_for_type(info, type_)
-    (
-        scalar_field_columns,
-        non_scalar_field_columns,
-    ) = get_selected_scalar_non_scalar_field_columns(
-        info, type_, selected_fields, model
-    )
 
-    # TODO: selectinload is good for one to many relationships because it does
-    # not create cartesian product issues.
-    # https://docs.sqlalchemy.org/en/14/orm/loading_relationships.html#what-kind-of-loading-to-use
-    # however we probably want joined loading for many to one relationships
-    # and we can set innerjoin to true if the relationship is nonnullable
-    # https://docs.sqlalchemy.org/en/14/orm/loading_relationships.html#joined-eager-loading
-    # one issue with selectinload is it will not work with nested relationships
-    # that have compositie primary keys. this shows up on sql server
-    # https://docs.sqlalchemy.org/en/14/orm/loading_relationships.html#select-in-loading
-    subquery = selectinload(column)
-    query = query.options(subquery)
-
-    # TODO: this nested select is untested and probably doesn't work we want to
-    # use chained loading to specify futher levels
-    # https://docs.sqlalchemy.org/en/14/orm/loading_relationships.html#relationship-loading-with-loader-options
-    if non_scalar_field_columns:
-        for field_column in non_scalar_field_columns:
-            field, column = field_column
-            column_type = get_type_for_column(info, column)
-            do_nested_select(info, column_type, subquery, field, column, model)
+def get_row_policy_criteria(info, type_):
+    """Evaluate the row policies of a type against the request context"""
+    schema_context = get_schema_context(info)
+    row_policies = schema_context["type_to_row_policies"].get(type_, [])
+    criteria = [policy(info.context) for policy in row_policies]
+    return [c for c in criteria if c is not None]
+
 
+def get_model_row_policy_criteria(info):
+    """Evaluate the row policies of every type. Returns a list of models and
+    the criteria which restrict them.
+    """
+    schema_context = get_schema_context(info)
+    model_criteria = []
+    for type_ in schema_context["type_to_row_policies"]:
+        criteria = get_row_policy_criteria(info, type_)
+        if criteria:
+            model = get_model_for_type(info, type_)
+            model_criteria.append((model, and_(*criteria)))
+    return model_criteria
+
+
+def do_row_policies(info, query):
+    """Restrict every model with row policies in a select. The policies are
+    added as loader criteria so they also apply to relationship loads and to
+    subqueries over the model in the where and order by clauses.
+    """
+    for model, criteria in get_model_row_policy_criteria(info):
+        query = query.options(
+            with_loader_criteria(model, criteria, include_aliases=True)
+        )
     return query
 
 
+def do_row_policy_expression(info, expression):
+    """Restrict the selects inside a derived field expression. Loader criteria
+    do not reach expressions which are loaded as attributes so we add the
+    criteria to the where clause of the selects directly.
+    """
+    model_criteria = get_model_row_policy_criteria(info)
+    if not model_criteria:
+        return expression
+
+    def restrict_select(element):
+        if isinstance(element, Select):
+            froms = set(element.get_final_froms())
+            criteria = [c for model, c in model_criteria if model.__table__ in froms]
+            if criteria:
+                return element.where(*criteria)
+        return None
+
+    return replacement_traverse(expression, {}, restrict_select)
+
+
+def do_row_policy_where(info, type_, statement):
+    """Restrict an update or delete statement using the row policies"""
+    criteria = get_row_policy_criteria(info, type_)
+    if criteria:
+        statement = statement.where(and_(*criteria))
+    return statement
+
+
 def eq_filter(column, value):
     return column == value
 
@@ -138,6 +207,28 @@ def contains_filter(column, value):
     return column.contains(value)
 
 
+def not_contains_filter(column, value):
+    return ~column.contains(value)
+
+
+def is_null_filter(column, value):
+    if value:
+        return column.is_(None)
+    return column.isnot(None)
+
+
+def in_filter(column, value):
+    return column.in_(value)
+
+
+def not_in_filter(column, value):
+    return column.not_in(value)
+
+
+def search_filter(column, value):
+    return search_match(column, value)
+
+
 # TODO: write more filters
 filter_map = {
     "eq": eq_filter,
@@ -147,57 +238,168 @@ filter_map = {
     "gt": gt_filter,
     "gte": gte_filter,
     "contains": contains_filter,
+    "not_contains": not_contains_filter,
+    "is_null": is_null_filter,
+    "in_": in_filter,
+    "not_in": not_in_filter,
+    "search": search_filter,
 }
 
 
-def do_filter(info, type_, query, column, filter):
+def get_filter_criteria(info, type_, column, filter_):
+    """Compile the filter of a single field into sql predicates"""
     from api.strawberry_sqlalchemy.schema_generation import (
         NonScalarComparison,
         ScalarComparison,
     )
 
-    scalar = isinstance(filter, ScalarComparison)
-    non_scalar = isinstance(filter, NonScalarComparison)
-    if scalar:
-        for filter_key in filter.__dict__.keys():
-            value = getattr(filter, filter_key)
-            if value is not None:
-                filter_func = filter_map[filter_key]
-                query = query.where(filter_func(column, value))
-    elif non_scalar:
-        # TODO: implement non scalar filter processing
-        raise NotImplementedError("Non scalar filters are not yet implemented.")
+    if isinstance(filter_, ScalarComparison):
+        return [
+            filter_map[filter_key](column, value)
+            for filter_key, value in filter_.__dict__.items()
+            if value is not None
+        ]
+    if isinstance(filter_, NonScalarComparison):
+        related_type = get_type_for_column(info, column)
+        criteria = get_where_criteria(info, related_type, filter_)
+        if not criteria:
+            return []
+        # the related rows hidden by a policy must not match either. selects
+        # also restrict them with loader criteria but updates and deletes do not
+        criteria.extend(get_row_policy_criteria(info, related_type))
+        # a relationship matches if any of its related rows match
+        if column.property.uselist:
+            return [column.any(and_(*criteria))]
+        return [column.has(and_(*criteria))]
+    return []
+
+
+def get_where_criteria(info, type_, where_clause):
+    """Compile a where clause into a list of sql predicates which all have to
+    hold. A where clause without any filters compiles to an empty list.
+    """
+    if where_clause is None:
+        return []
 
-    return query
+    model = get_model_for_type(info, type_)
+    # the fields of the where clause are named after the python names
+    python_names = set(get_graphql_python_name_map_for_type(info, type_).values())
+
+    criteria = []
+    for name, filter_ in where_clause.__dict__.items():
+        if filter_ is None:
+            continue
+        if name == "and_":
+            for item in filter_:
+                criteria.extend(get_where_criteria(info, type_, item))
+        elif name == "or_":
+            alternatives = [get_where_criteria(info, type_, item) for item in filter_]
+            # an alternative without filters matches every row
+            if alternatives and all(alternatives):
+                criteria.append(or_(*[and_(*a) for a in alternatives]))
+        elif name in python_names:
+            column = get_column_expression(getattr(model, name))
+            criteria.extend(get_filter_criteria(info, type_, column, filter_))
+    return criteria
 
 
 def do_where(info, type_, query, where_clause):
+    criteria = get_where_criteria(info, type_, where_clause)
+    if criteria:
+        query = query.where(*criteria)
+    return query
+
+
+def asc_order(column):
+    return column.asc()
+
+
+def asc_nulls_first_order(column):
+    return column.asc().nulls_first()
+
+
+def asc_nulls_last_order(column):
+    return column.asc().nulls_last()
+
+
+def desc_order(column):
+    return column.desc()
+
+
+def desc_nulls_first_order(column):
+    return column.desc().nulls_first()
+
+
+def desc_nulls_last_order(column):
+    return column.desc().nulls_last()
+
+
+order_by_map = {
+    "asc": asc_order,
+    "asc_nulls_first": asc_nulls_first_order,
+    "asc_nulls_last": asc_nulls_last_order,
+    "desc": desc_order,
+    "desc_nulls_first": desc_nulls_first_order,
+    "desc_nulls_last": desc_nulls_last_order,
+}
+
+
+def do_search_relevance(info, type_, query, where_clause):
+    """Sum the relevance of every search filter in the where clause. Returns
+    the query joined to the search indexes it ranks with and the relevance.
+    """
+    model = get_model_for_type(info, type_)
+    dialect_name = info.context["db"].get_bind().dialect.name
+    ranks = []
+    for name in get_searchable_columns(model):
+        filter_ = getattr(where_clause, name, None)
+        value = getattr(filter_, "search", None)
+        if value is not None:
+            query, rank = join_search_rank(
+                query, getattr(model, name), value, dialect_name
+            )
+            ranks.append(rank)
+    if not ranks:
+        raise ValueError(
+            "Ordering by search relevance requires a search filter in the where "
+            + "clause."
+        )
+    return query, sum(ranks[1:], ranks[0])
+
+
+def do_order_by(info, type_, query, order_by, where_clause=None):
     from api.strawberry_sqlalchemy.schema_generation import (
-        NonScalarComparison,
-        ScalarComparison,
+        SEARCH_RELEVANCE_ORDER_BY,
     )
 
-    if where_clause is None:
+    if order_by is None:
         return query
 
-    isinstance(where_clause, ScalarComparison)
-    non_scalar = isinstance(where_clause, NonScalarComparison)
-
     model = get_model_for_type(info, type_)
-    name_map = get_graphql_python_name_map_for_type(info, type_)
 
-    if non_scalar:
-        for name in where_clause.__dict__.keys():
-            filter_ = getattr(where_clause, name)
-            if filter_ is not None:
-                column = (
-                    None if name not in name_map else getattr(model, name_map[name])
-                )
-                query = do_filter(info, type_, query, column, filter_)
+    # TODO: the order by input is a single object so the priority of the
+    # columns is the order in which the fields are declared on the type
+    for name in order_by.__dict__.keys():
+        direction = getattr(order_by, name)
+        if direction is not None:
+            if name == SEARCH_RELEVANCE_ORDER_BY:
+                query, column = do_search_relevance(info, type_, query, where_clause)
+            else:
+                column = getattr(model, name)
+            column = get_column_expression(column)
+            query = query.order_by(order_by_map[direction.value](column))
 
     return query
 
 
+def do_limit_offset(query, limit, offset):
+    if limit is not None:
+        query = query.limit(limit)
+    if offset is not None:
+        query = query.offset(offset)
+    return query
+
+
 def create_all_type_resolver(type_: type):
     """create a resolver for all instances of a type. Supports various filters"""
     from api.strawberry_sqlalchemy.schema_generation import (
@@ -205,6 +407,8 @@ def create_all_type_resolver(type_: type):
         create_non_scalar_order_by_expression,
         create_non_scalar_select_columns_enum,
     )
+    from api.strawberry_sqlalchemy.relationship_loading import load_relationships
+    from api.strawberry_sqlalchemy.sharding import get_shard_config, load_sharded_rows
 
     def all_type_resolver(
         self,
@@ -246,13 +450,30 @@ def create_all_type_resolver(type_: type):
 
         query = do_where(info, type_, query, where)
 
-        if non_scalar_field_columns:
-            for field_column in non_scalar_field_columns:
-                field, column = field_column
-                column_type = get_type_for_column(info, column)
-                query = do_nested_select(info, column_type, query, field, column, model)
+        query = do_row_policies(info, query)
+
+        query = do_order_by(info, type_, query, orderBy, where)
+
+        query = do_derived_fields(info, query, scalar_field_columns)
+
+        if get_shard_config(info, type_) is not None:
+            return load_sharded_rows(
+                info,
+                type_,
+                query,
+                where,
+                orderBy,
+                limit,
+                offset,
+                non_scalar_field_columns,
+            )
+
+        query = do_limit_offset(query, limit, offset)
+
+        with statement_timeout(info, type_):
+            rows = db.exec(query).all()
 
-        rows = db.exec(query).all()
+        load_relationships(info, db, type_, rows, non_scalar_field_columns)
 
         return rows
 
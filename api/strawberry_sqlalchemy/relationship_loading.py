@@ -0,0 +1,197 @@
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
+
+from api.strawberry_sqlalchemy.query_generation import (
+    do_derived_fields,
+    do_row_policies,
+    get_model_for_type,
+    get_schema_context,
+    get_selected_scalar_non_scalar_field_columns,
+    get_type_for_column,
+)
+from api.strawberry_sqlalchemy.statement_timeout import statement_timeout
+from sqlalchemy import and_, any_, bindparam, or_, tuple_
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlmodel import select
+
+# the number of parent keys sent in a single relationship query
+DEFAULT_CHUNK_SIZE = 500
+
+# the maximum number of bound parameters a single statement may contain. older
+# versions of sqlite are compiled with a limit of 999
+MAX_BOUND_PARAMETERS = {"sqlite": 999, "mssql": 2100}
+
+# dialects which do not support row value comparisons like (a, b) IN ((1, 2))
+NO_ROW_VALUE_DIALECTS = {"mssql"}
+
+
+def get_chunk_size(info, dialect, key_length: int):
+    """Return the number of parent keys per query. The chunk is limited so the
+    keys never exceed the bound parameter limit of the database.
+    """
+    schema_context = get_schema_context(info)
+    chunk_size = schema_context["relationship_chunk_size"] or DEFAULT_CHUNK_SIZE
+    max_bound_parameters = MAX_BOUND_PARAMETERS.get(dialect.name)
+    if max_bound_parameters is not None:
+        chunk_size = min(chunk_size, max_bound_parameters // key_length)
+    return max(chunk_size, 1)
+
+
+def get_chunks(values: t.List[t.Any], chunk_size: int):
+    return [values[i : i + chunk_size] for i in range(0, len(values), chunk_size)]
+
+
+def key_in(dialect, columns, keys: t.List[tuple]):
+    """Create a where clause matching rows whose key columns equal one of the
+    keys. Composite keys use a row value IN list where the database supports
+    it.
+    """
+    if len(columns) == 1:
+        column = columns[0]
+        values = [key[0] for key in keys]
+        if dialect.name == "postgresql":
+            # a single array parameter keeps the statement text the same for
+            # every chunk so postgres can reuse the plan
+            return column == any_(bindparam(None, values, type_=ARRAY(column.type)))
+        return column.in_(values)
+    if dialect.name in NO_ROW_VALUE_DIALECTS:
+        return or_(*[and_(*[c == v for c, v in zip(columns, key)]) for key in keys])
+    return tuple_(*columns).in_(keys)
+
+
+def get_relationship_key_columns(relationship):
+    """Return the parent columns of a relationship and the columns of the
+    child query which must match them.
+    """
+    if relationship.secondary is not None:
+        pairs = relationship.synchronize_pairs
+    else:
+        pairs = relationship.local_remote_pairs
+    return [p for p, _ in pairs], [c for _, c in pairs]
+
+
+def get_attribute_key(mapper, columns):
+    return [mapper.get_property_by_column(column).key for column in columns]
+
+
+def get_unique_children(rows):
+    # sqlmodel models are not hashable so we compare identities
+    return list({id(child): child for child, _ in rows}.values())
+
+
+def load_relationships(
+    info, db, type_, parents, non_scalar_field_columns, create_session=None
+):
+    """Load the selected relationships of already loaded parents.
+
+    Children are loaded with one query per chunk of parent keys instead of a
+    single IN list so huge parent sets never exceed the bound parameter limit.
+    The children are stored on the parents so resolving the relationship
+    fields does not query the database again.
+
+    create_session creates the sessions used to load chunks concurrently and
+    defaults to the create_session callable in the context.
+    """
+    if create_session is None:
+        create_session = info.context.get("create_session")
+    for field, column in non_scalar_field_columns:
+        column_type = get_type_for_column(info, column)
+        load_relationship(info, db, column_type, parents, field, column, create_session)
+
+
+def load_relationship(
+    info, db, type_, parents, selected_field, column, create_session=None
+):
+    relationship = column.property
+    model = get_model_for_type(info, type_)
+    selected_fields = [s for s in selected_field.selections]
+    (
+        scalar_field_columns,
+        non_scalar_field_columns,
+    ) = get_selected_scalar_non_scalar_field_columns(
+        info, type_, selected_fields, model
+    )
+
+    parent_columns, key_columns = get_relationship_key_columns(relationship)
+    parent_attributes = get_attribute_key(relationship.parent, parent_columns)
+
+    def get_parent_key(parent):
+        return tuple(getattr(parent, a) for a in parent_attributes)
+
+    parent_keys = list(
+        dict.fromkeys(
+            key
+            for key in (get_parent_key(p) for p in parents)
+            if all(v is not None for v in key)
+        )
+    )
+
+    if relationship.secondary is not None:
+        query = select(model, *key_columns).join(
+            relationship.secondary, relationship.secondaryjoin
+        )
+    else:
+        query = select(model)
+        key_attributes = get_attribute_key(relationship.mapper, key_columns)
+    if relationship.order_by:
+        query = query.order_by(*relationship.order_by)
+    query = do_derived_fields(info, query, scalar_field_columns)
+    query = do_row_policies(info, query)
+
+    dialect = db.get_bind().dialect
+
+    def load_chunk(db, keys, load_nested):
+        chunk_query = query.where(key_in(dialect, key_columns, keys))
+        with statement_timeout(info, type_, db):
+            if relationship.secondary is not None:
+                rows = [(row[0], tuple(row[1:])) for row in db.execute(chunk_query)]
+            else:
+                rows = [
+                    (child, tuple(getattr(child, a) for a in key_attributes))
+                    for child in db.execute(chunk_query).scalars()
+                ]
+        if load_nested:
+            children = get_unique_children(rows)
+            load_relationships(
+                info, db, type_, children, non_scalar_field_columns, create_session
+            )
+        return rows
+
+    chunks = get_chunks(parent_keys, get_chunk_size(info, dialect, len(key_columns)))
+    concurrency = get_schema_context(info)["relationship_chunk_concurrency"]
+    rows = []
+    if len(chunks) > 1 and concurrency > 1 and create_session is not None:
+        # every chunk and the relationships below it are loaded with their own
+        # session. the loaded objects stay usable after the session is closed
+        def load_chunk_in_session(keys):
+            chunk_db = create_session()
+            try:
+                return load_chunk(chunk_db, keys, True)
+            finally:
+                chunk_db.close()
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for chunk_rows in executor.map(load_chunk_in_session, chunks):
+                rows.extend(chunk_rows)
+    else:
+        for keys in chunks:
+            rows.extend(load_chunk(db, keys, False))
+        # loading the nested relationships once for all the children keeps
+        # the number of queries independent of the number of chunks
+        children = get_unique_children(rows)
+        load_relationships(
+            info, db, type_, children, non_scalar_field_columns, create_session
+        )
+
+    children_by_key: t.Dict[tuple, list] = {}
+    for child, key in rows:
+        children_by_key.setdefault(key, []).append(child)
+    for parent in parents:
+        children = children_by_key.get(get_parent_key(parent), [])
+        if relationship.uselist:
+            set_committed_value(parent, relationship.key, children)
+        else:
+            set_committed_value(
+                parent, relationship.key, children[0] if children else None
+            )
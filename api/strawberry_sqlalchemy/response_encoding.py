@@ -0,0 +1,194 @@
+import dataclasses
+import datetime
+import decimal
+import enum
+import json
+import typing as t
+import uuid
+import zlib
+
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response, StreamingResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# the size of the chunks a streamed response is written in
+CHUNK_SIZE = 256 * 1024
+
+# responses smaller than this are not compressed
+MIN_COMPRESS_SIZE = 1024
+
+# the depth of the objects of a response which are encoded value by value,
+# the response, data, root field and the object of a mutation response
+STREAM_DEPTH = 4
+
+# the number of items of a list which are encoded at once
+LIST_SLICE_SIZE = 1000
+
+
+def _default(value):
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, (decimal.Decimal, uuid.UUID)):
+        return str(value)
+    if isinstance(value, enum.Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def encode_json(value) -> bytes:
+    return json.dumps(
+        value, default=_default, ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def encode_orjson(value) -> bytes:
+    # orjson encodes datetimes, uuids and enums itself
+    return orjson.dumps(value, default=_default)
+
+
+# the fastest installed encoder
+DEFAULT_ENCODER = encode_json if orjson is None else encode_orjson
+
+
+@dataclasses.dataclass
+class ResponseEncoding:
+    """How json responses are encoded and compressed. The encoder turns a
+    json value into bytes and defaults to orjson if it is installed.
+    """
+
+    encoder: t.Callable[[t.Any], bytes] = DEFAULT_ENCODER
+    chunk_size: int = CHUNK_SIZE
+    min_compress_size: int = MIN_COMPRESS_SIZE
+    gzip_level: int = 6
+    brotli_quality: int = 4
+
+
+def get_accepted_encoding(request) -> t.Optional[str]:
+    """Return the compression the client accepts, brotli before gzip"""
+    accepted = set()
+    for item in request.headers.get("Accept-Encoding", "").split(","):
+        name, _, parameters = item.strip().partition(";")
+        quality = parameters.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip().lower())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+def iter_json_pieces(value, encoder, depth: int = STREAM_DEPTH):
+    """Encode a json value piece by piece. Objects down to depth are split
+    into their values and lists are encoded in slices so a large list is
+    never encoded at once.
+    """
+    if depth and isinstance(value, dict):
+        yield b"{"
+        for i, (key, item) in enumerate(value.items()):
+            yield (b"," if i else b"") + encoder(key) + b":"
+            yield from iter_json_pieces(item, encoder, depth - 1)
+        yield b"}"
+    elif depth and isinstance(value, list) and len(value) > LIST_SLICE_SIZE:
+        yield b"["
+        for i in range(0, len(value), LIST_SLICE_SIZE):
+            # the slice is encoded as a list so its brackets are dropped
+            encoded = encoder(value[i : i + LIST_SLICE_SIZE])
+            yield (b"," if i else b"") + encoded[1:-1]
+        yield b"]"
+    else:
+        yield encoder(value)
+
+
+def iter_json_chunks(value, encoder, chunk_size: int):
+    pieces: t.List[bytes] = []
+    size = 0
+    for piece in iter_json_pieces(value, encoder):
+        pieces.append(piece)
+        size += len(piece)
+        if size >= chunk_size:
+            yield b"".join(pieces)
+            pieces, size = [], 0
+    if pieces:
+        yield b"".join(pieces)
+
+
+def create_compressor(content_encoding: str, encoding: ResponseEncoding):
+    """Return functions which compress a chunk and finish the stream"""
+    if content_encoding == "br":
+        compressor = brotli.Compressor(quality=encoding.brotli_quality)
+        return compressor.process, compressor.finish
+    # a wbits of 31 writes the gzip header and trailer
+    compressor = zlib.compressobj(encoding.gzip_level, zlib.DEFLATED, 31)
+    return compressor.compress, compressor.flush
+
+
+def iter_compressed(chunks, content_encoding: str, encoding: ResponseEncoding):
+    compress, finish = create_compressor(content_encoding, encoding)
+    for chunk in chunks:
+        compressed = compress(chunk)
+        if compressed:
+            yield compressed
+    yield finish()
+
+
+def _take_first_chunks(chunks):
+    return next(chunks, b""), next(chunks, None)
+
+
+async def create_json_response(
+    request, data, encoding: ResponseEncoding, status_code: int = 200
+) -> Response:
+    """Create the response of a json value.
+
+    The value is encoded in chunks in a worker thread. A value which fits in
+    a single chunk is sent as one body, larger values are streamed chunk by
+    chunk so the whole body is never built. Bodies of at least the minimum
+    size are compressed with the best compression the client accepts.
+    """
+    chunks = iter_json_chunks(data, encoding.encoder, encoding.chunk_size)
+    first, second = await run_in_threadpool(_take_first_chunks, chunks)
+    content_encoding = get_accepted_encoding(request)
+    headers = {"Vary": "Accept-Encoding"}
+
+    if second is None:
+        body = first
+        if content_encoding is not None and len(body) >= encoding.min_compress_size:
+            body = b"".join(iter_compressed([body], content_encoding, encoding))
+            headers["Content-Encoding"] = content_encoding
+        return Response(
+            body,
+            status_code=status_code,
+            headers=headers,
+            media_type="application/json",
+        )
+
+    def iter_body():
+        yield first
+        yield second
+        yield from chunks
+
+    body_iterator = iter_body()
+    if content_encoding is not None:
+        body_iterator = iter_compressed(body_iterator, content_encoding, encoding)
+        headers["Content-Encoding"] = content_encoding
+    return StreamingResponse(
+        body_iterator,
+        status_code=status_code,
+        headers=headers,
+        media_type="application/json",
+    )
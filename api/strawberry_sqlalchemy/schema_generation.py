@@ -1,14 +1,39 @@
-import collections
+import collections.abc
 import dataclasses
 import enum
+import logging
 import typing as t
 from enum import Enum
 from types import SimpleNamespace
 
 import strawberry
+from api.strawberry_sqlalchemy.explain_capture import (
+    create_slow_statements_query_field,
+)
+from api.strawberry_sqlalchemy.full_text_search import (
+    get_searchable_columns,
+    is_searchable,
+)
+from api.strawberry_sqlalchemy.live_queries import create_live_type_resolver
+from api.strawberry_sqlalchemy.mutation_generation import (
+    create_delete_type_resolver,
+    create_insert_type_resolver,
+    create_update_type_resolver,
+)
 from api.strawberry_sqlalchemy.query_generation import create_all_type_resolver
+from api.strawberry_sqlalchemy.schema_snapshot import (
+    get_type_fingerprint,
+    mark_snapshot_stale,
+    read_snapshot_type,
+)
+from api.strawberry_sqlalchemy.sharding import ShardConfig
+from api.strawberry_sqlalchemy.total_count import create_count_type_resolver
+from sqlalchemy import inspect
+from sqlalchemy.orm import class_mapper, query_expression
 from strawberry.type import StrawberryContainer
 
+logger = logging.getLogger(__name__)
+
 
 class BoolOps(SimpleNamespace):
     eq = "eq"
@@ -26,6 +51,8 @@ class BoolOps(SimpleNamespace):
 
     is_null_ = "is_null"
 
+    search = "search"
+
 
 _BOOL_OP_COMPARISONS = {
     BoolOps.eq,
@@ -39,6 +66,7 @@ _BOOL_OP_COMPARISONS = {
 _SAME_TYPE_BOOL_OP = _BOOL_OP_COMPARISONS
 _INCLUSION_BOOL_OP = {BoolOps.in_, BoolOps.not_in}
 _CONTAINS_BOOL_OP = {BoolOps.contains, BoolOps.not_contains}
+_SEARCH_BOOL_OP = {BoolOps.search}
 
 _SCALAR_BOOL_OP_MAP: dict[type, set[str]] = {
     bool: {BoolOps.eq, BoolOps.neq},
@@ -60,14 +88,26 @@ class OrderByEnum(Enum):
     desc_nulls_last = "desc_nulls_last"
 
 
+@strawberry.enum
+class CountModeEnum(Enum):
+    exact = "exact"
+    cached = "cached"
+    estimated = "estimated"
+
+
 PRIMITIVES = {int, str, bool, float}
 
+# the name of the order by field which sorts by full text search relevance
+SEARCH_RELEVANCE_ORDER_BY = "search_relevance"
+
+NUMERIC_PRIMITIVES = {int, float}
+
 
 def is_sequence_container(type_):
     """Check if a type is a container. For example t.List[int] is a container,"""
     # TODO: this is hacky. see is_primitive for why we have it
-    origin = t.get_origin(type_)
-    return origin is t.List or origin is t.Set
+    # get_origin returns the builtin so t.List[int] has the origin list
+    return t.get_origin(type_) in {list, set}
 
 
 def is_optional(type_):
@@ -114,7 +154,18 @@ def is_primitive(type_):
     while is_optional(type_) or is_sequence_container(type_):
         type_ = unwrap_optional(type_)
         type_ = unwrap_sequence_container(type_)
-    return isinstance(type_, collections.Hashable) and type_ in PRIMITIVES
+    return isinstance(type_, collections.abc.Hashable) and type_ in PRIMITIVES
+
+
+def get_type_model(type_):
+    """Return the sqlalchemy model of a generated type. Types created with
+    create_mapped_type store the model directly, pydantic types store the
+    SQLModel they were created from.
+    """
+    model = getattr(type_, "_sqlalchemy_model", None)
+    if model is None:
+        model = getattr(type_, "_pydantic_type", None)
+    return model
 
 
 def create_comparison_expression_name(type_):
@@ -146,6 +197,39 @@ def create_all_type_query_name(type_):
     return f"all_{type_name}"
 
 
+def create_count_type_query_name(type_):
+    type_name = type_.__name__.capitalize()
+    if not type_name.endswith("s"):
+        type_name += "s"
+    return f"count_{type_name}"
+
+
+def create_mutation_type_name(type_, mutation):
+    type_name = type_.__name__.capitalize()
+    if not type_name.endswith("s"):
+        type_name += "s"
+    return f"{mutation}_{type_name}"
+
+
+def create_live_type_query_name(type_):
+    type_name = type_.__name__.capitalize()
+    if not type_name.endswith("s"):
+        type_name += "s"
+    return f"live_{type_name}"
+
+
+def create_live_patch_name(type_):
+    return type_.__name__.capitalize() + "LivePatch"
+
+
+def create_mutation_input_name(type_, suffix):
+    return type_.__name__.capitalize() + suffix
+
+
+def create_mutation_response_name(type_):
+    return type_.__name__.capitalize() + "MutationResponse"
+
+
 def create_select_column_enum_name(type_):
     type_name = type_.__name__.capitalize()
     if not type_name.endswith("s"):
@@ -165,12 +249,92 @@ class NonScalarComparison(ComparisonExpression):
     pass
 
 
-def create_scalar_comparison_expression(type_: type):
+# every resolver which takes a filter, order by or input asks for its types so
+# the filter, order by, select column and mutation input types are generated
+# once per process. regenerating them dominated the schema build. the types
+# generated from a model do not see later changes to the model so
+# make_searchable and add_derived_field have to come first.
+# the types are keyed by their name and the strawberry type they were
+# generated from, or None for the scalar comparisons which only depend on
+# their name. schemas built from different models may generate types of the
+# same name, like the DirectorFilter of the pydantic and the mapped examples,
+# so the generated types refer to each other directly and never by name
+generated_types: t.Dict[t.Tuple[str, t.Optional[type]], type] = {}
+
+# the models whose types were generated
+generated_models: t.Set[t.Any] = set()
+
+# the types of a loaded schema snapshot which were not asked for yet, by name
+_snapshot_types: t.Dict[str, t.List[dict]] = {}
+
+
+def load_snapshot_types(snapshot_types: t.List[dict]):
+    """Keep the types of a schema snapshot until they are asked for. A
+    snapshot type is used when the type it was generated from is unchanged.
+    """
+    for snapshot_type in snapshot_types:
+        _snapshot_types.setdefault(snapshot_type["name"], []).append(snapshot_type)
+
+
+def get_generated_type(name: str, type_: t.Optional[type] = None):
+    """Return the type with the name generated from type_ or None if it has to
+    be generated
+    """
+    generated_type = generated_types.get((name, type_))
+    if generated_type is not None or not _snapshot_types.get(name):
+        return generated_type
+    fingerprint = get_type_fingerprint(type_, get_type_model(type_))
+    for snapshot_type in _snapshot_types[name]:
+        if snapshot_type["fingerprint"] != fingerprint:
+            continue
+        _snapshot_types[name].remove(snapshot_type)
+        try:
+            generated_type = read_snapshot_type(snapshot_type, type_)
+        except ValueError:
+            logger.warning("Unable to read %s from the schema snapshot", name)
+            return None
+        return register_generated_type(name, generated_type, type_, from_snapshot=True)
+    return None
+
+
+def register_generated_type(
+    name: str,
+    generated_type: type,
+    type_: t.Optional[type] = None,
+    from_snapshot: bool = False,
+):
+    if not from_snapshot:
+        mark_snapshot_stale()
+    globals()[name] = generated_type
+    generated_types[(name, type_)] = generated_type
+    if type_ is not None:
+        generated_models.add(get_type_model(type_))
+    return generated_type
+
+
+def check_types_not_generated(model):
+    """Raise if types were already generated from the model"""
+    if model in generated_models:
+        raise ValueError(
+            f"The types of {model.__name__} were already generated. Configure "
+            + "the model before the schema is created."
+        )
+
+
+def create_scalar_comparison_expression(type_: type, searchable: bool = False):
     type_ = unwrap_optional(type_)
+    expression_name = create_comparison_expression_name(type_)
+    if searchable:
+        expression_name = "Searchable" + expression_name
+    generated_type = get_generated_type(expression_name)
+    if generated_type is not None:
+        return generated_type
     operations = _SCALAR_BOOL_OP_MAP[t.get_origin(type_) or type_]
+    if searchable:
+        operations = {*operations, *_SEARCH_BOOL_OP}
     fields = []
     for op in operations:
-        if op in _SAME_TYPE_BOOL_OP:
+        if op in _SAME_TYPE_BOOL_OP or op in _SEARCH_BOOL_OP:
             fields.append((op, t.Optional[type_], dataclasses.field(default=None)))
 
         elif op in _INCLUSION_BOOL_OP:
@@ -195,70 +359,95 @@ def create_scalar_comparison_expression(type_: type):
     # override prior classes
     fields.append((BoolOps.is_null_, t.Optional[bool], dataclasses.field(default=None)))
 
-    expression_name = create_comparison_expression_name(type_)
     globals()[expression_name] = dataclasses.make_dataclass(
         expression_name,
         fields=fields,
         namespace={"__module__": __name__},
         bases=(ScalarComparison,),
     )
-    return strawberry.input(globals()[expression_name])
+    return register_generated_type(
+        expression_name, strawberry.input(globals()[expression_name])
+    )
+
+
+def refer_to_itself(generated_type: type, field_names: t.List[str]):
+    """Point the list fields of a generated dataclass at the class itself.
+    The fields are declared with the name of the class, which would be looked
+    up on this module where a type of another schema may have the same name.
+    """
+    for field_name in field_names:
+        annotation = t.Optional[t.List[generated_type]]
+        generated_type.__annotations__[field_name] = annotation
+        generated_type.__dataclass_fields__[field_name].type = annotation
+
+
+@dataclasses.dataclass(frozen=True)
+class LazyComparisonExpression(strawberry.LazyType):
+    """Refers to the filter of a type which is only known by a LazyType. The
+    filter is generated once the schema resolves the reference, by then the
+    related type is defined.
+    """
+
+    related_type: strawberry.LazyType
+
+    def resolve_type(self):
+        return create_non_scalar_comparison_expression(self.related_type.resolve_type())
+
+
+def create_relationship_comparison_expression(field_type):
+    """Return the filter of the related type of a relationship field"""
+    # the base type is the underlying type of the field.
+    # we don't care if the field is optional or a list we just want
+    # to implement a filter for the underlying type
+    # TODO: not sure if StrawberryContainer is always the right choice
+    field_base_type = field_type
+    if isinstance(field_type, StrawberryContainer):
+        field_base_type = field_type.of_type
+    # types created with create_mapped_type use typing containers
+    field_base_type = unwrap_sequence_container(unwrap_optional(field_base_type))
+
+    if isinstance(field_base_type, strawberry.LazyType):
+        # we cannot generate the filter of the related type yet or we get a
+        # circular dependency error
+        return LazyComparisonExpression(
+            create_comparison_expression_name(field_base_type),
+            __name__,
+            None,
+            field_base_type,
+        )
+    # this code handles the case where the field is a single item
+    return create_non_scalar_comparison_expression(field_base_type)
 
 
 def create_non_scalar_comparison_expression(type_: type):
+    expression_name = create_comparison_expression_name(type_)
+    generated_type = get_generated_type(expression_name, type_)
+    if generated_type is not None:
+        return generated_type
 
     type_hints = t.get_type_hints(type_)
     fields = []
-    expression_name = create_comparison_expression_name(type_)
+    model = get_type_model(type_)
     for field_name, field_type in type_hints.items():
         if is_primitive(field_type):
+            searchable = is_searchable(model, field_name)
             fields.append(
                 (
                     field_name,
-                    t.Optional[create_scalar_comparison_expression(field_type)],
+                    t.Optional[
+                        create_scalar_comparison_expression(field_type, searchable)
+                    ],
                     dataclasses.field(default=None),
                 )
             )
         else:
-            # the base type is the underlying type of the field.
-            # we don't care if the field is optional or a list we just want
-            # to implement a filter for the underlying type
-            # TODO: not sure if StrawberryContainer is always the right choice
-            field_base_type = field_type
-            if isinstance(field_type, StrawberryContainer):
-                field_base_type = field_type.of_type
-
-            if isinstance(field_base_type, strawberry.LazyType):
-                fields.append(
-                    (
-                        field_name,
-                        t.Optional[
-                            strawberry.LazyType[
-                                # TODO: this is a hack. We cannot resolve the
-                                # type of the nested field or we get a circular
-                                # dependency error. Instead we rely on the fact
-                                # that the type underlying the LazyType will
-                                # be used in a non lazy way elsewhere and
-                                # registed on the module associated with __name__
-                                create_comparison_expression_name(field_type),
-                                __name__,
-                            ]
-                        ],
-                        dataclasses.field(default=None),
-                    )
-                )
-
-            else:
-                # this code handles the case where the field is a single item
-                fields.append(
-                    (
-                        field_name,
-                        t.Optional[
-                            create_non_scalar_comparison_expression(field_base_type)
-                        ],
-                        dataclasses.field(default=None),
-                    )
+            fields.append(
+                (
+                    field_name,
+                    t.Optional[create_relationship_comparison_expression(field_type)],
+                    dataclasses.field(default=None),
                 )
+            )
 
     fields.append(
         ("and_", t.Optional[t.List[expression_name]], dataclasses.field(default=None)),
@@ -272,14 +461,25 @@ def create_non_scalar_comparison_expression(type_: type):
         namespace={"__module__": __name__},
         bases=(NonScalarComparison,),
     )
-    return strawberry.input(globals()[expression_name])
+    refer_to_itself(globals()[expression_name], ["and_", "or_"])
+    return register_generated_type(
+        expression_name, strawberry.input(globals()[expression_name]), type_
+    )
 
 
 def create_non_scalar_order_by_expression(type_: type):
+    expression_name = create_order_by_expression_name(type_)
+    generated_type = get_generated_type(expression_name, type_)
+    if generated_type is not None:
+        return generated_type
+
     type_hints = t.get_type_hints(type_)
     fields = []
-    expression_name = create_order_by_expression_name(type_)
     for field_name, field_type in type_hints.items():
+        # TODO: relationships are left out until ordering through a join is
+        # implemented
+        if not is_primitive(field_type):
+            continue
         fields.append(
             (
                 field_name,
@@ -287,22 +487,245 @@ def create_non_scalar_order_by_expression(type_: type):
                 dataclasses.field(default=None),
             )
         )
+    model = get_type_model(type_)
+    if model is not None and get_searchable_columns(model):
+        # sorts by the relevance of the search filters in the where clause
+        fields.append(
+            (
+                SEARCH_RELEVANCE_ORDER_BY,
+                t.Optional[OrderByEnum],
+                dataclasses.field(default=None),
+            )
+        )
     globals()[expression_name] = dataclasses.make_dataclass(
         expression_name,
         fields=fields,
         namespace={"__module__": __name__},
     )
-    return strawberry.input(globals()[expression_name])
+    return register_generated_type(
+        expression_name, strawberry.input(globals()[expression_name]), type_
+    )
 
 
 def create_non_scalar_select_columns_enum(type_: type):
     enum_name = create_select_column_enum_name(type_)
+    generated_type = get_generated_type(enum_name, type_)
+    if generated_type is not None:
+        return generated_type
     type_hints = t.get_type_hints(type_)
 
     globals()[enum_name] = enum.Enum(
         enum_name, {field_name: field_name for field_name in type_hints.keys()}
     )
-    return strawberry.enum(globals()[enum_name])
+    return register_generated_type(
+        enum_name, strawberry.enum(globals()[enum_name]), type_
+    )
+
+
+def is_numeric(type_):
+    type_ = unwrap_optional(type_)
+    return isinstance(type_, collections.abc.Hashable) and type_ in NUMERIC_PRIMITIVES
+
+
+def create_mutation_input(type_: type, suffix: str, numeric_only: bool = False):
+    """Create an input with an optional field for every column of a type.
+    Fields which are left as None are not written.
+    """
+    input_name = create_mutation_input_name(type_, suffix)
+    generated_type = get_generated_type(input_name, type_)
+    if generated_type is not None:
+        return generated_type
+    type_hints = t.get_type_hints(type_)
+    fields = []
+    # derived fields are not backed by a column of the table so they can not
+    # be written
+    table_columns = get_type_model(type_).__table__.columns
+    for field_name, field_type in type_hints.items():
+        if not is_primitive(field_type) or field_name not in table_columns:
+            continue
+        if numeric_only and not is_numeric(field_type):
+            continue
+        fields.append(
+            (
+                field_name,
+                t.Optional[unwrap_optional(field_type)],
+                dataclasses.field(default=None),
+            )
+        )
+    globals()[input_name] = dataclasses.make_dataclass(
+        input_name,
+        fields=fields,
+        namespace={"__module__": __name__},
+    )
+    return register_generated_type(
+        input_name, strawberry.input(globals()[input_name]), type_
+    )
+
+
+def create_insert_input(type_: type):
+    return create_mutation_input(type_, "InsertInput")
+
+
+def create_set_input(type_: type):
+    return create_mutation_input(type_, "SetInput")
+
+
+def create_inc_input(type_: type):
+    return create_mutation_input(type_, "IncInput", numeric_only=True)
+
+
+def create_mutation_response(type_: type):
+    response_name = create_mutation_response_name(type_)
+    globals()[response_name] = dataclasses.make_dataclass(
+        response_name,
+        fields=[
+            ("affected_rows", int),
+            ("returning", t.List[type_], dataclasses.field(default_factory=list)),
+        ],
+        namespace={"__module__": __name__},
+    )
+    return strawberry.type(globals()[response_name])
+
+
+def create_live_patch_operation(type_: type):
+    operation_name = create_live_patch_name(type_) + "Operation"
+    globals()[operation_name] = dataclasses.make_dataclass(
+        operation_name,
+        fields=[
+            ("op", str),
+            ("path", str),
+            ("from_", t.Optional[str], dataclasses.field(default=None)),
+            ("value", t.Optional[type_], dataclasses.field(default=None)),
+        ],
+        namespace={"__module__": __name__},
+    )
+    # from is a python keyword so the field is renamed in the schema. the
+    # strawberry field is only typed once strawberry.type reads the
+    # annotations so it can not be the default passed to make_dataclass
+    globals()[operation_name].from_ = strawberry.field(name="from", default=None)
+    return strawberry.type(globals()[operation_name])
+
+
+def create_live_patch(type_: type, live_patch_operation: type):
+    patch_name = create_live_patch_name(type_)
+    globals()[patch_name] = dataclasses.make_dataclass(
+        patch_name,
+        fields=[
+            ("revision", int),
+            ("operations", t.List[live_patch_operation]),
+        ],
+        namespace={"__module__": __name__},
+    )
+    return strawberry.type(globals()[patch_name])
+
+
+def add_derived_field(model, name: str, expression):
+    """Map a sql expression to an attribute of a model so it can be exposed as
+    a derived field. The expression is only added to the select projection
+    when the field is selected. Derived fields are filtered and sorted on in
+    the database and are restricted by the row policies. The strawberry type
+    must declare an annotation for the field.
+
+    Hybrid properties and column properties declared on the model are picked
+    up without calling this function but they are not restricted by the row
+    policies.
+
+    Derived fields have to be added before the types of the model are
+    generated.
+    """
+    check_types_not_generated(model)
+    derived_field = query_expression()
+    derived_field.info["derived_expression"] = expression
+    class_mapper(model).add_property(name, derived_field)
+
+
+def get_mapped_column_type(column_property):
+    """Return the python type of a mapped column or None if the type is not
+    supported by the generated filters
+    """
+    expression = column_property.info.get("derived_expression")
+    if expression is None:
+        expression = column_property.columns[0]
+    try:
+        python_type = expression.type.python_type
+    except NotImplementedError:
+        return None
+    # TODO: support dates, decimals and other column types in the filters
+    if python_type not in PRIMITIVES:
+        return None
+    nullable = expression is not column_property.columns[0] or getattr(
+        expression, "nullable", True
+    )
+    return t.Optional[python_type] if nullable else python_type
+
+
+def create_mapped_type(
+    model,
+    name: t.Optional[str] = None,
+    exclude: t.Sequence[str] = (),
+    type_names: t.Optional[t.Dict[t.Any, str]] = None,
+):
+    """Create a strawberry type from the mapper of a sqlalchemy model without
+    going through pydantic. Fields are created for the columns, the derived
+    fields and the relationships of the model and are read straight from the
+    loaded orm objects or rows.
+
+    Relationships refer to the types of the related models by name.
+    type_names maps related models to the names of their types and defaults
+    to the name of the model class. The names have to be unique across the
+    mapped types.
+    """
+    type_names = {} if type_names is None else type_names
+    mapper = inspect(model)
+    type_name = model.__name__ if name is None else name
+    if type_name in globals():
+        # the relationships of the existing type would refer to this one
+        raise ValueError(
+            f"A type named {type_name} was already created. Pass another name "
+            + f"to create the type of {model.__name__}."
+        )
+    fields = []
+    for column_property in mapper.column_attrs:
+        if column_property.key in exclude:
+            continue
+        field_type = get_mapped_column_type(column_property)
+        if field_type is not None:
+            fields.append((column_property.key, field_type))
+
+    for relationship in mapper.relationships:
+        if relationship.key in exclude:
+            continue
+        related_model = relationship.mapper.class_
+        related_type = strawberry.LazyType[
+            type_names.get(related_model, related_model.__name__), __name__
+        ]
+        if relationship.uselist:
+            # TODO: nested array fields do not take arguments since nested
+            # filters are not implemented yet
+            field_type = t.List[related_type]
+        elif any(column.nullable for column in relationship.local_columns):
+            field_type = t.Optional[related_type]
+        else:
+            field_type = related_type
+        fields.append((relationship.key, field_type))
+
+    globals()[type_name] = dataclasses.make_dataclass(
+        type_name,
+        fields=fields,
+        namespace={"__module__": __name__, "_sqlalchemy_model": model},
+    )
+    return strawberry.type(globals()[type_name])
+
+
+def create_mapped_types(models: t.Dict[str, t.Any]):
+    """Create strawberry types for related sqlalchemy models. models maps the
+    name of each type to its model.
+    """
+    type_names = {model: name for name, model in models.items()}
+    return [
+        create_mapped_type(model, name, type_names=type_names)
+        for name, model in models.items()
+    ]
 
 
 def create_array_relationship_resolver(type_: type):
@@ -321,13 +744,99 @@ def create_all_type_query_field(type_: type):
     )
 
 
-def create_generation_context(types: t.List[type]):
-    type_to_model = {type_: type_._pydantic_type for type_ in types}
-    model_to_type = {type_._pydantic_type: type_ for type_ in types}
+def create_count_type_query_field(type_: type):
+    method_name = create_count_type_query_name(type_)
+
+    return (
+        method_name,
+        int,
+        dataclasses.field(default=strawberry.field(create_count_type_resolver(type_))),
+    )
+
+
+def create_live_type_subscription_field(type_: type):
+    method_name = create_live_type_query_name(type_)
+    live_patch_operation = create_live_patch_operation(type_)
+    live_patch = create_live_patch(type_, live_patch_operation)
+
+    return (
+        method_name,
+        live_patch,
+        dataclasses.field(
+            default=strawberry.subscription(
+                create_live_type_resolver(type_, live_patch, live_patch_operation)
+            )
+        ),
+    )
+
+
+def create_type_mutation_fields(type_: type):
+    mutation_response = create_mutation_response(type_)
+    resolvers = {
+        "insert": create_insert_type_resolver(type_, mutation_response),
+        "update": create_update_type_resolver(type_, mutation_response),
+        "delete": create_delete_type_resolver(type_, mutation_response),
+    }
+    return [
+        (
+            create_mutation_type_name(type_, mutation),
+            mutation_response,
+            dataclasses.field(default=strawberry.mutation(resolver)),
+        )
+        for mutation, resolver in resolvers.items()
+    ]
+
+
+def create_generation_context(
+    types: t.List[type],
+    row_policies: t.Optional[t.Dict[type, t.List[t.Callable]]] = None,
+    statement_timeouts: t.Optional[t.Dict[t.Union[type, str], float]] = None,
+    operation_timeout: t.Optional[float] = None,
+    relationship_chunk_size: t.Optional[int] = None,
+    relationship_chunk_concurrency: int = 1,
+    shard_configs: t.Optional[t.Dict[type, ShardConfig]] = None,
+    shard_engines: t.Optional[t.Dict[str, t.Any]] = None,
+    explain_sample_rate: float = 0.0,
+    explain_requests: bool = False,
+    is_admin: t.Optional[t.Callable[[t.Any], bool]] = None,
+):
+    """Create the context used by the generated resolvers.
+
+    row_policies maps a type to functions which take the request context and
+    return a sqlalchemy predicate, or None to leave the rows unrestricted.
+    The predicates are added to the where clause of every generated statement
+    which reads or writes the type.
+
+    statement_timeouts maps a type or the python name of a generated field,
+    such as all_Movies, to the seconds its statements may run.
+    operation_timeout is the budget in seconds of the whole operation.
+
+    relationship_chunk_size is the number of parent keys sent in each query
+    which loads a relationship, by default 500 limited by the bound parameter
+    limit of the database. relationship_chunk_concurrency is the number of
+    chunks loaded at the same time, each with its own session.
+
+    shard_configs maps a type to the ShardConfig which partitions its rows
+    across the engines in shard_engines, keyed by shard name. Queries of
+    sharded types run on every shard which may match and the results are
+    merged.
+
+    explain_sample_rate is the fraction of operations whose statements are
+    explained and offered to the store of the slowest statements. If
+    explain_requests is true admins can ask for the plans of the statements
+    of an operation with the explain header. Both need the ExplainCapture
+    extension.
+
+    is_admin takes the request context and returns whether the client may
+    see sql, parameters and plans, through the explain header or the slow
+    statements query. Without it nobody is an admin.
+    """
+    type_to_model = {type_: get_type_model(type_) for type_ in types}
+    model_to_type = {get_type_model(type_): type_ for type_ in types}
     type_to_type_definition = {type_: type_._type_definition for type_ in types}
     type_definition_to_type = {type_._type_definition: type_ for type_ in types}
-    type_to_mapper = {type_: type_._pydantic_type.__mapper__ for type_ in types}
-    mapper_to_type = {type_._pydantic_type.__mapper__: type_ for type_ in types}
+    type_to_mapper = {type_: inspect(type_to_model[type_]) for type_ in types}
+    mapper_to_type = {mapper: type_ for type_, mapper in type_to_mapper.items()}
     context = {
         "type_to_model": type_to_model,
         "model_to_type": model_to_type,
@@ -335,22 +844,74 @@ def create_generation_context(types: t.List[type]):
         "type_definition_to_type": type_definition_to_type,
         "type_to_mapper": type_to_mapper,
         "mapper_to_type": mapper_to_type,
+        "type_to_row_policies": dict(row_policies or {}),
+        "statement_timeouts": dict(statement_timeouts or {}),
+        "operation_timeout": operation_timeout,
+        "relationship_chunk_size": relationship_chunk_size,
+        "relationship_chunk_concurrency": relationship_chunk_concurrency,
+        "type_to_shard_config": dict(shard_configs or {}),
+        "shard_engines": dict(shard_engines or {}),
+        "explain_sample_rate": explain_sample_rate,
+        "explain_requests": explain_requests,
+        "is_admin": is_admin,
     }
     return context
 
 
-def create_query_root(types: t.List[type]):
+def create_query_root(types: t.List[type], slow_statements_query: bool = False):
+    """Create the query root of the types. If slow_statements_query is true the
+    root gets an admin field listing the slowest sampled statements, see the
+    is_admin check of create_generation_context.
+    """
     create_generation_context(types)
 
     all_type_queries = [create_all_type_query_field(type_) for type_ in types]
+    count_type_queries = [create_count_type_query_field(type_) for type_ in types]
+    admin_queries = []
+    if slow_statements_query:
+        admin_queries.append(create_slow_statements_query_field())
 
     query_root_name = "query_root"
     globals()[query_root_name] = dataclasses.make_dataclass(
         query_root_name,
-        fields=[*all_type_queries],
+        fields=[*all_type_queries, *count_type_queries, *admin_queries],
         namespace={
             **{"__module__": __name__},
         },
     )
 
     return strawberry.type(globals()[query_root_name])
+
+
+def create_mutation_root(types: t.List[type]):
+    type_mutations = [
+        field for type_ in types for field in create_type_mutation_fields(type_)
+    ]
+
+    mutation_root_name = "mutation_root"
+    globals()[mutation_root_name] = dataclasses.make_dataclass(
+        mutation_root_name,
+        fields=[*type_mutations],
+        namespace={
+            **{"__module__": __name__},
+        },
+    )
+
+    return strawberry.type(globals()[mutation_root_name])
+
+
+def create_subscription_root(types: t.List[type]):
+    live_type_subscriptions = [
+        create_live_type_subscription_field(type_) for type_ in types
+    ]
+
+    subscription_root_name = "subscription_root"
+    globals()[subscription_root_name] = dataclasses.make_dataclass(
+        subscription_root_name,
+        fields=[*live_type_subscriptions],
+        namespace={
+            **{"__module__": __name__},
+        },
+    )
+
+    return strawberry.type(globals()[subscription_root_name])
@@ -0,0 +1,343 @@
+"""Snapshots of the generated filter, order by, select column and mutation
+input types.
+
+A snapshot is a json file which describes the fields of the generated types.
+It holds a hash of the SQLModel metadata and of the generator, and every type
+in it carries a fingerprint of the strawberry type it was generated from. A
+snapshot type is rebuilt from its fields instead of being generated when the
+fingerprint still matches, otherwise the type is generated and the snapshot
+is written again when the schema is built. The snapshot only holds data, the
+fields may only use the scalars and types listed below.
+"""
+import dataclasses
+import enum
+import hashlib
+import json
+import logging
+import os
+import typing as t
+from pathlib import Path
+
+import strawberry
+from strawberry.type import StrawberryContainer
+
+logger = logging.getLogger(__name__)
+
+# the module the generated types are registered on
+SCHEMA_GENERATION_MODULE = "api.strawberry_sqlalchemy.schema_generation"
+
+# the modules whose changes change the generated types
+GENERATOR_SOURCES = [
+    Path(__file__).with_name("schema_generation.py"),
+    Path(__file__),
+]
+
+NONE_TYPE = type(None)
+
+# the scalars the fields of a snapshot type may have
+SNAPSHOT_SCALARS = {
+    "int": int,
+    "str": str,
+    "bool": bool,
+    "float": float,
+    "list": list,
+    "set": set,
+}
+
+# the containers the fields of a snapshot type may be wrapped in
+SNAPSHOT_CONTAINERS = {"optional": t.Optional, "list": t.List, "set": t.Set}
+
+# the types of the generator a snapshot type may extend or refer to
+SNAPSHOT_BASES = {"ScalarComparison", "NonScalarComparison"}
+SNAPSHOT_ENUMS = {"OrderByEnum"}
+
+# the and_ and or_ fields of the filters
+SELF_ANNOTATION = {"optional": {"list": {"self": None}}}
+
+# whether types were generated which are not in the loaded snapshot, true
+# until a snapshot is loaded or saved
+_snapshot_stale = True
+
+
+def _describe_annotation(annotation):
+    if isinstance(annotation, StrawberryContainer):
+        of_type = _describe_annotation(annotation.of_type)
+        return f"{type(annotation).__name__}[{of_type}]"
+    if isinstance(annotation, strawberry.LazyType):
+        return f"LazyType[{annotation.type_name}, {annotation.module}]"
+    if t.get_args(annotation):
+        args = ", ".join(_describe_annotation(arg) for arg in t.get_args(annotation))
+        return f"{t.get_origin(annotation)}[{args}]"
+    if isinstance(annotation, type):
+        return f"{annotation.__module__}.{annotation.__qualname__}"
+    return repr(annotation)
+
+
+def _describe_table(table):
+    columns = [
+        (
+            column.name,
+            repr(column.type),
+            column.nullable,
+            column.primary_key,
+            sorted((key, repr(value)) for key, value in column.info.items()),
+        )
+        for column in table.columns
+    ]
+    return repr((table.name, columns))
+
+
+def get_metadata_hash(metadata):
+    """Return the hash of the tables of the metadata and of the generator"""
+    metadata_hash = hashlib.sha256()
+    for source in GENERATOR_SOURCES:
+        metadata_hash.update(source.read_bytes())
+    for table in sorted(metadata.tables.values(), key=lambda table: table.name):
+        metadata_hash.update(_describe_table(table).encode("utf-8"))
+    return metadata_hash.hexdigest()
+
+
+def get_type_fingerprint(type_, model) -> str:
+    """Return the fingerprint of the strawberry type and the model a type was
+    generated from
+    """
+    if type_ is None:
+        return ""
+    hints = [
+        (name, _describe_annotation(annotation))
+        for name, annotation in t.get_type_hints(type_).items()
+    ]
+    table = "" if model is None else _describe_table(model.__table__)
+    description = repr((type_.__name__, hints, table))
+    return hashlib.sha256(description.encode("utf-8")).hexdigest()
+
+
+def _write_annotation(annotation, generated_type, generated_sources) -> dict:
+    if annotation == t.Optional[t.List[generated_type]]:
+        return SELF_ANNOTATION
+    if isinstance(annotation, strawberry.LazyType):
+        # the filter of a related type which is only known by a LazyType
+        return {"relationship": None}
+    origin = t.get_origin(annotation)
+    args = t.get_args(annotation)
+    if origin is t.Union and len(args) == 2 and NONE_TYPE in args:
+        (arg,) = [arg for arg in args if arg is not NONE_TYPE]
+        return {"optional": _write_annotation(arg, generated_type, generated_sources)}
+    if origin in {list, set} and len(args) == 1:
+        container = "list" if origin is list else "set"
+        return {
+            container: _write_annotation(args[0], generated_type, generated_sources)
+        }
+    if annotation in SNAPSHOT_SCALARS.values():
+        return {"scalar": annotation.__name__}
+    if annotation in generated_sources:
+        name, type_ = generated_sources[annotation]
+        if type_ is None:
+            return {"comparison": name}
+        return {"relationship": None}
+    if (
+        isinstance(annotation, type)
+        and annotation.__module__ == SCHEMA_GENERATION_MODULE
+        and annotation.__name__ in SNAPSHOT_ENUMS
+    ):
+        return {"enum": annotation.__name__}
+    raise ValueError(f"Unable to write the annotation {annotation} to a snapshot")
+
+
+def _write_type(name: str, type_, generated_type, generated_sources) -> dict:
+    from api.strawberry_sqlalchemy.schema_generation import get_type_model
+
+    snapshot_type = {
+        "name": name,
+        "fingerprint": get_type_fingerprint(type_, get_type_model(type_)),
+    }
+    if issubclass(generated_type, enum.Enum):
+        snapshot_type["kind"] = "enum"
+        snapshot_type["members"] = {
+            member.name: member.value for member in generated_type
+        }
+        return snapshot_type
+    bases = [
+        base.__name__
+        for base in generated_type.__bases__
+        if base.__name__ in SNAPSHOT_BASES
+    ]
+    snapshot_type["kind"] = "input"
+    snapshot_type["base"] = bases[0] if bases else None
+    snapshot_type["fields"] = {
+        field_name: _write_annotation(annotation, generated_type, generated_sources)
+        for field_name, annotation in generated_type.__annotations__.items()
+    }
+    return snapshot_type
+
+
+def _check_annotation(annotation):
+    if not isinstance(annotation, dict) or len(annotation) != 1:
+        raise ValueError(f"Invalid snapshot annotation {annotation!r}")
+    ((kind, value),) = annotation.items()
+    if kind in SNAPSHOT_CONTAINERS:
+        _check_annotation(value)
+    elif kind == "scalar" and value in SNAPSHOT_SCALARS:
+        pass
+    elif kind == "enum" and value in SNAPSHOT_ENUMS:
+        pass
+    elif kind == "comparison" and isinstance(value, str) and value.isidentifier():
+        pass
+    elif kind != "relationship" or value is not None:
+        raise ValueError(f"Invalid snapshot annotation {annotation!r}")
+
+
+def _check_type(snapshot_type):
+    """Raise if a type of a snapshot is not made of the allowed parts"""
+    if not isinstance(snapshot_type, dict):
+        raise ValueError(f"Invalid snapshot type {snapshot_type!r}")
+    name = snapshot_type.get("name")
+    if not isinstance(name, str) or not name.isidentifier():
+        raise ValueError(f"Invalid snapshot type name {name!r}")
+    if not isinstance(snapshot_type.get("fingerprint"), str):
+        raise ValueError(f"Invalid fingerprint of the snapshot type {name}")
+    kind = snapshot_type.get("kind")
+    if kind == "enum":
+        members = snapshot_type.get("members")
+        if not isinstance(members, dict) or not all(
+            key.isidentifier() and isinstance(value, str)
+            for key, value in members.items()
+        ):
+            raise ValueError(f"Invalid members of the snapshot type {name}")
+        return
+    if kind != "input" or snapshot_type.get("base") not in {*SNAPSHOT_BASES, None}:
+        raise ValueError(f"Invalid kind of the snapshot type {name}")
+    fields = snapshot_type.get("fields")
+    if not isinstance(fields, dict):
+        raise ValueError(f"Invalid fields of the snapshot type {name}")
+    for field_name, annotation in fields.items():
+        if not field_name.isidentifier():
+            raise ValueError(f"Invalid field name {field_name!r} of {name}")
+        # the type only refers to itself from the and_ and or_ lists
+        if annotation != SELF_ANNOTATION:
+            _check_annotation(annotation)
+
+
+def _read_annotation(annotation, field_name, type_):
+    from api.strawberry_sqlalchemy import schema_generation
+
+    ((kind, value),) = annotation.items()
+    if kind in SNAPSHOT_CONTAINERS:
+        return SNAPSHOT_CONTAINERS[kind][_read_annotation(value, field_name, type_)]
+    if kind == "scalar":
+        return SNAPSHOT_SCALARS[value]
+    if kind == "enum":
+        return getattr(schema_generation, value)
+    if kind == "comparison":
+        comparison = schema_generation.get_generated_type(value)
+        if comparison is None:
+            raise ValueError(f"The snapshot does not contain the type {value}")
+        return comparison
+    # the fingerprint of type_ matched so it still has the relationship the
+    # filter was generated from
+    field_type = t.get_type_hints(type_).get(field_name)
+    if field_type is None:
+        raise ValueError(f"The relationship {field_name} does not exist")
+    return schema_generation.create_relationship_comparison_expression(field_type)
+
+
+def read_snapshot_type(snapshot_type, type_):
+    """Rebuild a type of a loaded snapshot. type_ is the strawberry type the
+    snapshot type was generated from. Raises ValueError if the type refers to
+    a type which can not be rebuilt.
+    """
+    from api.strawberry_sqlalchemy import schema_generation
+
+    name = snapshot_type["name"]
+    if snapshot_type["kind"] == "enum":
+        return strawberry.enum(
+            enum.Enum(name, snapshot_type["members"], module=SCHEMA_GENERATION_MODULE)
+        )
+    fields = []
+    self_fields = []
+    for field_name, annotation in snapshot_type["fields"].items():
+        if annotation == SELF_ANNOTATION:
+            self_fields.append(field_name)
+            field_type = t.Optional[t.List[name]]
+        else:
+            field_type = _read_annotation(annotation, field_name, type_)
+        fields.append((field_name, field_type, dataclasses.field(default=None)))
+    base = snapshot_type["base"]
+    generated_type = dataclasses.make_dataclass(
+        name,
+        fields=fields,
+        namespace={"__module__": SCHEMA_GENERATION_MODULE},
+        bases=() if base is None else (getattr(schema_generation, base),),
+    )
+    schema_generation.refer_to_itself(generated_type, self_fields)
+    return strawberry.input(generated_type)
+
+
+def load_schema_snapshot(path, metadata) -> bool:
+    """Load the snapshot at path if it was written for the same metadata.
+    Returns whether the snapshot was loaded. The snapshot has to be loaded
+    after the models are configured and before their types are generated.
+    """
+    from api.strawberry_sqlalchemy.schema_generation import load_snapshot_types
+
+    global _snapshot_stale
+    try:
+        snapshot = json.loads(Path(path).read_text())
+    except OSError:
+        return False
+    except ValueError:
+        logger.warning("Ignoring the invalid schema snapshot %s", path)
+        return False
+    if not isinstance(snapshot, dict) or snapshot.get("hash") != get_metadata_hash(
+        metadata
+    ):
+        return False
+    try:
+        if not isinstance(snapshot.get("types"), list):
+            raise ValueError("The snapshot has no types")
+        for snapshot_type in snapshot["types"]:
+            _check_type(snapshot_type)
+    except ValueError:
+        logger.warning("Ignoring the invalid schema snapshot %s", path, exc_info=True)
+        return False
+    load_snapshot_types(snapshot["types"])
+    _snapshot_stale = False
+    return True
+
+
+def mark_snapshot_stale():
+    """Mark the loaded snapshot as outdated because a type was generated"""
+    global _snapshot_stale
+    _snapshot_stale = True
+
+
+def save_schema_snapshot(path, metadata):
+    """Write the generated types to a snapshot at path unless the loaded
+    snapshot already holds them. Failing to write the snapshot is logged and
+    the schema is used as it is.
+    """
+    from api.strawberry_sqlalchemy.schema_generation import generated_types
+
+    global _snapshot_stale
+    if not _snapshot_stale:
+        return
+    generated_sources = {
+        generated_type: key for key, generated_type in generated_types.items()
+    }
+    snapshot = {
+        "hash": get_metadata_hash(metadata),
+        "types": [
+            _write_type(name, type_, generated_type, generated_sources)
+            for (name, type_), generated_type in generated_types.items()
+        ],
+    }
+    path = Path(path)
+    # written next to the snapshot and renamed so readers never see half of it
+    temporary_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    try:
+        temporary_path.write_text(json.dumps(snapshot, indent=2))
+        os.replace(temporary_path, path)
+    except OSError:
+        logger.warning("Unable to write the schema snapshot %s", path, exc_info=True)
+        return
+    _snapshot_stale = False
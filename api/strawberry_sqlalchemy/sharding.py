@@ -0,0 +1,181 @@
+import dataclasses
+import functools
+import heapq
+import itertools
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
+
+from api.strawberry_sqlalchemy.query_generation import (
+    do_derived_fields,
+    get_model_for_type,
+    get_schema_context,
+)
+from api.strawberry_sqlalchemy.relationship_loading import load_relationships
+from api.strawberry_sqlalchemy.statement_timeout import statement_timeout
+from graphql import GraphQLError
+from sqlmodel import Session
+
+# dialects which sort nulls before every other value in ascending order
+NULLS_FIRST_DIALECTS = {"sqlite", "mysql", "mssql"}
+
+
+@dataclasses.dataclass
+class ShardConfig:
+    """Describes how the rows of a type are partitioned across shards.
+
+    shard_key is the python name of the field which decides the shard of a
+    row and shard_resolver maps a value of the field to the name of a shard in
+    the shard engines.
+    """
+
+    shard_key: str
+    shard_resolver: t.Callable[[t.Any], str]
+
+
+def get_shard_config(info, type_) -> t.Optional[ShardConfig]:
+    return get_schema_context(info)["type_to_shard_config"].get(type_)
+
+
+def create_shard_session(engine):
+    return Session(autocommit=False, autoflush=False, bind=engine, future=True)
+
+
+def get_shard_names(info, type_, where_clause):
+    """Return the shards which may contain rows matching the where clause.
+    Equality and inclusion filters on the shard key prune the other shards.
+    """
+    shard_config = get_shard_config(info, type_)
+    shard_names = list(get_schema_context(info)["shard_engines"])
+    filter_ = getattr(where_clause, shard_config.shard_key, None)
+    if filter_ is None:
+        return shard_names
+
+    values = None
+    if getattr(filter_, "eq", None) is not None:
+        values = [filter_.eq]
+    if getattr(filter_, "in_", None) is not None:
+        values = [v for v in filter_.in_ if values is None or v in values]
+    if values is None:
+        return shard_names
+    pruned = {shard_config.shard_resolver(v) for v in values}
+    return [name for name in shard_names if name in pruned]
+
+
+def get_order_by_fields(order_by):
+    """Return the python names and directions of the order by input in
+    priority order
+    """
+    from api.strawberry_sqlalchemy.schema_generation import (
+        SEARCH_RELEVANCE_ORDER_BY,
+    )
+
+    if order_by is None:
+        return []
+    order_by_fields = []
+    for name in order_by.__dict__.keys():
+        direction = getattr(order_by, name)
+        if direction is not None:
+            if name == SEARCH_RELEVANCE_ORDER_BY:
+                # TODO: the rank is not loaded so rows cannot be merged in order
+                raise GraphQLError(
+                    "Ordering by search relevance is not supported for sharded "
+                    + "types and live queries."
+                )
+            order_by_fields.append((name, direction.value))
+    return order_by_fields
+
+
+def create_row_comparator(order_by_fields, dialect):
+    """Create a comparison function which orders rows the same way the
+    shards ordered them
+    """
+    nulls_first_by_default = dialect.name in NULLS_FIRST_DIALECTS
+
+    def compare(a, b):
+        for name, direction in order_by_fields:
+            descending = direction.startswith("desc")
+            if direction.endswith("nulls_first"):
+                nulls_first = True
+            elif direction.endswith("nulls_last"):
+                nulls_first = False
+            else:
+                nulls_first = nulls_first_by_default != descending
+
+            a_value, b_value = getattr(a, name), getattr(b, name)
+            if a_value is None or b_value is None:
+                if a_value is None and b_value is None:
+                    continue
+                return -1 if (a_value is None) == nulls_first else 1
+            if a_value == b_value:
+                continue
+            result = -1 if a_value < b_value else 1
+            return -result if descending else result
+        return 0
+
+    return compare
+
+
+def load_sharded_rows(
+    info,
+    type_,
+    query,
+    where_clause,
+    order_by,
+    limit,
+    offset,
+    non_scalar_field_columns,
+):
+    """Run a query on every shard which may match the where clause and merge
+    the results.
+
+    The shards are queried concurrently, each with its own session, and the
+    relationships of the rows are loaded from the shard the rows came from.
+    Every shard returns at most limit + offset rows in order, so a k-way merge
+    of the shard results yields the first rows of the whole result.
+    """
+    shard_engines = get_schema_context(info)["shard_engines"]
+    shard_names = get_shard_names(info, type_, where_clause)
+    if not shard_names:
+        return []
+
+    order_by_fields = get_order_by_fields(order_by)
+    # the merge compares the ordered fields so derived fields must be loaded
+    # even if they are not selected
+    model = get_model_for_type(info, type_)
+    query = do_derived_fields(
+        info, query, [(None, getattr(model, name)) for name, _ in order_by_fields]
+    )
+    offset = offset or 0
+    if limit is not None:
+        query = query.limit(limit + offset)
+
+    def load_shard(shard_name):
+        engine = shard_engines[shard_name]
+        db = create_shard_session(engine)
+        try:
+            with statement_timeout(info, type_, db):
+                rows = db.exec(query).all()
+            load_relationships(
+                info,
+                db,
+                type_,
+                rows,
+                non_scalar_field_columns,
+                create_session=functools.partial(create_shard_session, engine),
+            )
+            return rows
+        finally:
+            # the loaded rows stay usable once the session is closed
+            db.close()
+
+    with ThreadPoolExecutor(max_workers=len(shard_names)) as executor:
+        shard_rows = list(executor.map(load_shard, shard_names))
+
+    if order_by_fields:
+        dialect = shard_engines[shard_names[0]].dialect
+        compare = create_row_comparator(order_by_fields, dialect)
+        rows = heapq.merge(*shard_rows, key=functools.cmp_to_key(compare))
+    else:
+        rows = itertools.chain(*shard_rows)
+    stop = None if limit is None else offset + limit
+    return list(itertools.islice(rows, offset, stop))
@@ -0,0 +1,174 @@
+import contextlib
+import threading
+import time
+import typing as t
+
+from api.strawberry_sqlalchemy.explain_capture import capture_statements
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+# the number of sqlite virtual machine instructions between deadline checks
+SQLITE_PROGRESS_HANDLER_STEPS = 1000
+
+
+class StatementDeadline:
+    """Tracks the deadline of a graphql operation and cancels the statements
+    which are running when the operation is cancelled, for example because the
+    client disconnected. Root fields executed in parallel run their statements
+    at the same time.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._cancel_statements: t.List[t.Callable[[], None]] = []
+
+    def remaining(self, timeout: t.Optional[float]):
+        """Return the seconds left of a timeout measured from the start of
+        the operation
+        """
+        if timeout is None:
+            return None
+        return timeout - (time.monotonic() - self.started)
+
+    def cancel(self):
+        """Cancel the operation and interrupt the running statements. This may
+        be called from any thread.
+        """
+        self.cancelled.set()
+        with self._lock:
+            for cancel_statement in self._cancel_statements:
+                cancel_statement()
+
+    @contextlib.contextmanager
+    def running(self, cancel_statement: t.Callable[[], None]):
+        with self._lock:
+            self._cancel_statements.append(cancel_statement)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._cancel_statements.remove(cancel_statement)
+
+
+def get_statement_deadline(info):
+    """Return the deadline of the operation. The asgi app creates the deadline
+    before execution so it can cancel the operation, otherwise the deadline
+    starts when the first statement is executed.
+    """
+    return info.context.setdefault("statement_deadline", StatementDeadline())
+
+
+def get_statement_timeout(info, type_):
+    """Return the seconds a statement for a type may run. The timeout of the
+    field takes precedence over the timeout of the type and both are limited
+    by what remains of the operation timeout.
+    """
+    schema_context = info.context["auto_schema"]
+    statement_timeouts = schema_context["statement_timeouts"]
+    timeout = statement_timeouts.get(info.python_name, statement_timeouts.get(type_))
+
+    deadline = get_statement_deadline(info)
+    remaining = deadline.remaining(schema_context["operation_timeout"])
+    if remaining is not None and (timeout is None or remaining < timeout):
+        timeout = remaining
+    return timeout
+
+
+def _sqlite_statement_timeout(connection, deadline, expires):
+    dbapi_connection = connection.connection
+
+    def progress_handler():
+        # returning a truthy value aborts the running statement
+        return deadline.cancelled.is_set() or (
+            expires is not None and time.monotonic() > expires
+        )
+
+    def reset(failed):
+        dbapi_connection.set_progress_handler(None, 0)
+
+    dbapi_connection.set_progress_handler(
+        progress_handler, SQLITE_PROGRESS_HANDLER_STEPS
+    )
+    return dbapi_connection.interrupt, reset
+
+
+def _postgresql_statement_timeout(connection, timeout):
+    if timeout is not None:
+        # SET LOCAL only lasts until the end of the session's transaction
+        connection.exec_driver_sql(
+            f"SET LOCAL statement_timeout = {max(int(timeout * 1000), 1)}"
+        )
+    if "backend_pid" not in connection.info:
+        connection.info["backend_pid"] = connection.exec_driver_sql(
+            "SELECT pg_backend_pid()"
+        ).scalar()
+    backend_pid = connection.info["backend_pid"]
+
+    def cancel_statement():
+        # the cancel has to be sent over a different connection since the
+        # statement's connection is busy
+        with connection.engine.connect() as cancel_connection:
+            cancel_connection.execute(
+                text("SELECT pg_cancel_backend(:pid)"), {"pid": backend_pid}
+            )
+
+    def reset(failed):
+        # a failed statement aborts the transaction so there is nothing to reset
+        if timeout is not None and not failed:
+            connection.exec_driver_sql("SET LOCAL statement_timeout TO DEFAULT")
+
+    return cancel_statement, reset
+
+
+@contextlib.contextmanager
+def statement_timeout(info, type_, db=None):
+    """Enforce the statement timeout of a type on the statements executed by
+    the session inside the block and let the operation cancel them. The
+    session defaults to the request session.
+
+    Raises TimeoutError if the statements exceed the timeout and
+    ConnectionAbortedError if the operation was cancelled.
+    """
+    deadline = get_statement_deadline(info)
+    if deadline.cancelled.is_set():
+        raise ConnectionAbortedError("The operation was cancelled.")
+
+    timeout = get_statement_timeout(info, type_)
+    if timeout is not None and timeout <= 0:
+        raise TimeoutError("The operation exceeded its deadline.")
+
+    db = info.context["db"] if db is None else db
+    connection = db.connection()
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        expires = None if timeout is None else time.monotonic() + timeout
+        cancel_statement, reset = _sqlite_statement_timeout(
+            connection, deadline, expires
+        )
+    elif dialect == "postgresql":
+        cancel_statement, reset = _postgresql_statement_timeout(connection, timeout)
+    else:
+        # TODO: other dialects only check the deadline between statements
+        def cancel_statement():
+            pass
+
+        def reset(failed):
+            pass
+
+    started = time.monotonic()
+    failed = True
+    try:
+        with deadline.running(cancel_statement):
+            with capture_statements(info, type_, connection):
+                yield
+        failed = False
+    except DBAPIError as e:
+        if deadline.cancelled.is_set():
+            raise ConnectionAbortedError("The operation was cancelled.") from e
+        if timeout is not None and time.monotonic() - started >= timeout:
+            raise TimeoutError("The operation exceeded its deadline.") from e
+        raise
+    finally:
+        reset(failed)
@@ -0,0 +1,240 @@
+import collections
+import json
+import threading
+import time
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
+
+from api.strawberry_sqlalchemy.query_generation import (
+    do_row_policy_expression,
+    do_where,
+    get_model_for_type,
+    get_row_policy_criteria,
+)
+from api.strawberry_sqlalchemy.sharding import (
+    create_shard_session,
+    get_shard_config,
+    get_shard_names,
+)
+from api.strawberry_sqlalchemy.statement_timeout import statement_timeout
+from sqlalchemy import event, func, literal_column, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql import Delete, Insert, Update
+from sqlalchemy.sql.util import find_tables
+
+# seconds a cached count is used for. writes through this process invalidate
+# cached counts immediately but writes from other processes only show up
+# once the count expires
+COUNT_CACHE_TTL = 60
+
+# the maximum number of cached counts. the keys contain the filters of the
+# client so the least recently used counts are evicted past this size
+COUNT_CACHE_SIZE = 1000
+
+
+class CountCache:
+    """Caches counts by statement and invalidates them when a table the
+    statement reads from is written to.
+    """
+
+    def __init__(self, ttl: float = COUNT_CACHE_TTL, max_size: int = COUNT_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        # ordered from the least to the most recently used count
+        self._counts: t.OrderedDict[
+            t.Any, t.Tuple[int, float, t.Tuple[str, ...]]
+        ] = collections.OrderedDict()
+        self._keys_by_table: t.Dict[str, t.Set[t.Any]] = {}
+        self._lock = threading.Lock()
+
+    def _remove(self, key):
+        _, _, table_names = self._counts.pop(key)
+        for table_name in table_names:
+            keys = self._keys_by_table.get(table_name)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_table[table_name]
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._counts:
+                return None
+            count, expires, _ = self._counts[key]
+            if expires <= time.monotonic():
+                self._remove(key)
+                return None
+            self._counts.move_to_end(key)
+            return count
+
+    def set(self, key, table_names: t.Iterable[str], count: int):
+        now = time.monotonic()
+        with self._lock:
+            for expired_key in [k for k, v in self._counts.items() if v[1] <= now]:
+                self._remove(expired_key)
+            if key in self._counts:
+                self._remove(key)
+            table_names = tuple(table_names)
+            self._counts[key] = (count, now + self.ttl, table_names)
+            for table_name in table_names:
+                self._keys_by_table.setdefault(table_name, set()).add(key)
+            while len(self._counts) > self.max_size:
+                self._remove(next(iter(self._counts)))
+
+    def invalidate(self, table_name: str):
+        with self._lock:
+            for key in list(self._keys_by_table.get(table_name, ())):
+                self._remove(key)
+
+
+count_cache = CountCache()
+
+
+@event.listens_for(Engine, "after_execute")
+def _invalidate_written_table(conn, clauseelement, multiparams, params, *args):
+    # TODO: writes executed as text are not detected
+    if isinstance(clauseelement, (Insert, Update, Delete)):
+        table_name = clauseelement.table.name
+        count_cache.invalidate(table_name)
+        # a count cached by another session before the commit would still
+        # see the old rows so we invalidate again once the write is committed
+        conn.info.setdefault("written_tables", set()).add(table_name)
+
+
+@event.listens_for(Engine, "commit")
+def _invalidate_committed_tables(conn):
+    for table_name in conn.info.pop("written_tables", set()):
+        count_cache.invalidate(table_name)
+
+
+@event.listens_for(Engine, "rollback")
+def _forget_rolled_back_tables(conn):
+    conn.info.pop("written_tables", None)
+
+
+def create_count_statement(info, type_, where_clause):
+    """Count the rows matching the where clause using the same filters and
+    row policies as the all type resolver
+    """
+    model = get_model_for_type(info, type_)
+    statement = select(func.count()).select_from(model)
+    statement = do_where(info, type_, statement, where_clause)
+    return do_row_policy_expression(info, statement)
+
+
+def get_exact_count(info, type_, db, statement):
+    with statement_timeout(info, type_, db):
+        return db.execute(statement).scalar()
+
+
+def get_cached_count(info, type_, db, statement):
+    compiled = statement.compile(db.get_bind())
+    key = (
+        str(db.get_bind().url),
+        str(compiled),
+        json.dumps(compiled.params, sort_keys=True, default=str),
+    )
+    count = count_cache.get(key)
+    if count is None:
+        count = get_exact_count(info, type_, db, statement)
+        table_names = [table.name for table in find_tables(statement)]
+        count_cache.set(key, table_names, count)
+    return count
+
+
+def _get_sqlite_estimated_count(db, table_name):
+    # the statistics table only exists once ANALYZE has run
+    analyzed = db.execute(
+        text("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+    ).scalar()
+    if not analyzed:
+        return None
+    # the first number of the stat of an index is the number of rows in the
+    # table when ANALYZE last ran
+    stat = db.execute(
+        text("SELECT stat FROM sqlite_stat1 WHERE tbl = :table_name LIMIT 1"),
+        {"table_name": table_name},
+    ).scalar()
+    return None if stat is None else int(stat.split()[0])
+
+
+def _get_postgresql_estimated_count(db, statement):
+    # the planner estimate of the rows the where clause matches
+    rows = statement.with_only_columns([literal_column("1")])
+    compiled = rows.compile(db.get_bind(), compile_kwargs={"render_postcompile": True})
+    plan = (
+        db.connection()
+        .exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params)
+        .scalar()
+    )
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def get_estimated_count(info, type_, db, statement, where_clause):
+    """Estimate the count using the statistics of the database planner.
+    Databases without usable statistics fall back to the cached count.
+    """
+    model = get_model_for_type(info, type_)
+    dialect = db.get_bind().dialect.name
+    unfiltered = where_clause is None and not get_row_policy_criteria(info, type_)
+    count = None
+    with statement_timeout(info, type_, db):
+        if dialect == "postgresql":
+            count = _get_postgresql_estimated_count(db, statement)
+        elif dialect == "sqlite" and unfiltered:
+            count = _get_sqlite_estimated_count(db, model.__table__.name)
+    if count is None:
+        return get_cached_count(info, type_, db, statement)
+    return count
+
+
+def get_count(info, type_, db, statement, where_clause, mode: str):
+    if mode == "exact":
+        return get_exact_count(info, type_, db, statement)
+    if mode == "cached":
+        return get_cached_count(info, type_, db, statement)
+    if mode == "estimated":
+        return get_estimated_count(info, type_, db, statement, where_clause)
+    raise ValueError(f"Unknown count mode {mode}")
+
+
+def create_count_type_resolver(type_: type):
+    """create a resolver which counts the instances of a type matching a where
+    clause. The count is exact, cached until the table is written to or
+    estimated from the database statistics.
+    """
+    from api.strawberry_sqlalchemy.schema_generation import (
+        CountModeEnum,
+        create_non_scalar_comparison_expression,
+    )
+
+    def count_type_resolver(
+        self,
+        info,
+        where: t.Optional[create_non_scalar_comparison_expression(type_)] = None,
+        mode: CountModeEnum = CountModeEnum.cached,
+    ) -> int:
+        statement = create_count_statement(info, type_, where)
+
+        if get_shard_config(info, type_) is None:
+            db = info.context["db"]
+            return get_count(info, type_, db, statement, where, mode.value)
+
+        shard_engines = info.context["auto_schema"]["shard_engines"]
+        shard_names = get_shard_names(info, type_, where)
+        if not shard_names:
+            return 0
+
+        def count_shard(shard_name):
+            db = create_shard_session(shard_engines[shard_name])
+            try:
+                return get_count(info, type_, db, statement, where, mode.value)
+            finally:
+                db.close()
+
+        with ThreadPoolExecutor(max_workers=len(shard_names)) as executor:
+            return sum(executor.map(count_shard, shard_names))
+
+    return count_type_resolver
@@ -0,0 +1,93 @@
+"""Measure how long encoding and compressing a large response takes.
+
+The baseline renders the response like the json response of starlette. The
+other runs encode the response in chunks with every available encoder, with
+and without compression. orjson and brotli are only measured if installed.
+
+    poetry run python benchmarks/response_encoding.py [megabytes]
+"""
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from api.strawberry_sqlalchemy import response_encoding  # noqa: E402
+from api.strawberry_sqlalchemy.response_encoding import (  # noqa: E402
+    ResponseEncoding,
+    encode_json,
+    encode_orjson,
+    iter_compressed,
+    iter_json_chunks,
+)
+
+
+def create_response(megabytes):
+    # a movie row with its director encodes to about 250 bytes
+    rows = int(megabytes * 1024 * 1024 / 250)
+    return {
+        "data": {
+            "allMovies": [
+                {
+                    "id": i,
+                    "title": f"Movie {i} " + random.choice(["Returns", "Rises", ""]),
+                    "imdbId": i * 7,
+                    "year": random.randrange(1950, 2022),
+                    "imageUrl": f"https://example.com/images/{i}.jpg",
+                    "imdbRating": round(random.uniform(1, 10), 1),
+                    "imdbRatingCount": random.randrange(100_000),
+                    "directorId": i % 1000,
+                    "director": {"id": i % 1000, "name": f"Director {i % 1000}"},
+                }
+                for i in range(rows)
+            ]
+        }
+    }
+
+
+def render_baseline(data):
+    return json.dumps(
+        data, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def render(data, encoding, content_encoding):
+    chunks = iter_json_chunks(data, encoding.encoder, encoding.chunk_size)
+    if content_encoding is not None:
+        chunks = iter_compressed(chunks, content_encoding, encoding)
+    return sum(len(chunk) for chunk in chunks)
+
+
+def measure(name, func):
+    started = time.perf_counter()
+    size = func()
+    duration = time.perf_counter() - started
+    print(f"{name:<24} {duration * 1000:8.1f} ms {size / 1024 / 1024:8.2f} MB")
+
+
+def main():
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 20
+    data = create_response(megabytes)
+    measure("baseline", lambda: len(render_baseline(data)))
+
+    encoders = {"json": encode_json}
+    if response_encoding.orjson is not None:
+        encoders["orjson"] = encode_orjson
+    content_encodings = [None, "gzip"]
+    if response_encoding.brotli is not None:
+        content_encodings.append("br")
+
+    for encoder_name, encoder in encoders.items():
+        encoding = ResponseEncoding(encoder=encoder)
+        for content_encoding in content_encodings:
+            measure(
+                f"{encoder_name} {content_encoding or 'identity'}",
+                lambda: render(data, encoding, content_encoding),
+            )
+
+
+if __name__ == "__main__":
+    main()
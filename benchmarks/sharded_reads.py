@@ -0,0 +1,160 @@
+"""Compare queries of movies sharded across two sqlite files with the same
+queries on the example database.
+
+This is a local stand in for a sharded deployment. The movies of the example
+database are split by the parity of their director id across two shard
+files which both hold every director, so relationships load from the shard a
+movie came from. Every query runs against both setups, the results are
+compared and the time per query is printed.
+
+    poetry run python benchmarks/sharded_reads.py [repetitions]
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import strawberry
+from sqlalchemy import select
+from strawberry.extensions import Extension
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+# the example database url is relative to the root of the repository
+os.chdir(ROOT)
+
+# the example schema has to be imported through the app to avoid a circular import
+from main import app  # noqa: E402,F401
+from api.strawberry_sqlalchemy.engine_registry import (  # noqa: E402
+    create_pooled_engine,
+)
+from api.strawberry_sqlalchemy.movie_model_example import (  # noqa: E402
+    DirectorModel,
+    MovieModel,
+)
+from api.strawberry_sqlalchemy.movie_schema_example import (  # noqa: E402
+    Movie,
+    Query,
+    SQLAlchemySession,
+    auto_types,
+    schema,
+)
+from api.strawberry_sqlalchemy.schema_generation import (  # noqa: E402
+    create_generation_context,
+)
+from api.strawberry_sqlalchemy.sharding import ShardConfig  # noqa: E402
+from main.database import engines  # noqa: E402
+
+SHARD_NAMES = ["even", "odd"]
+
+QUERIES = {
+    "fan out, ordered page": """{
+        allMovies(orderBy: {title: asc}, limit: 20, offset: 10) {
+            title director { name }
+        }
+    }""",
+    "fan out, filtered": """{
+        allMovies(where: {year: {gt: 2000}}, orderBy: {title: desc}) {
+            title year
+        }
+    }""",
+    "pruned to one shard": """{
+        allMovies(where: {directorId: {eq: 1}}, orderBy: {title: asc}) {
+            title director { name }
+        }
+    }""",
+    "pruned to both shards": """{
+        allMovies(where: {directorId: {in_: [1, 2]}}, orderBy: {title: asc}) {
+            title
+        }
+    }""",
+    "relevance order": """{
+        allMovies(where: {title: {search: "the"}}, orderBy: {searchRelevance: desc}) {
+            title
+        }
+    }""",
+}
+
+
+def get_shard_name(director_id):
+    return SHARD_NAMES[(director_id or 0) % 2]
+
+
+def create_shards(directory):
+    shard_engines = {
+        name: create_pooled_engine(f"sqlite:///{Path(directory) / name}.sqlite3")
+        for name in SHARD_NAMES
+    }
+    tables = [DirectorModel.__table__, MovieModel.__table__]
+    with engines.primary.connect() as connection:
+        directors = connection.execute(select(DirectorModel.__table__)).all()
+        movies = connection.execute(select(MovieModel.__table__)).all()
+    for name, engine in shard_engines.items():
+        DirectorModel.metadata.create_all(engine, tables=tables)
+        with engine.begin() as connection:
+            connection.execute(
+                DirectorModel.__table__.insert(), [dict(d._mapping) for d in directors]
+            )
+            connection.execute(
+                MovieModel.__table__.insert(),
+                [
+                    dict(m._mapping)
+                    for m in movies
+                    if get_shard_name(m.director_id) == name
+                ],
+            )
+    return shard_engines
+
+
+def create_sharded_schema(shard_engines):
+    sharded_context = create_generation_context(
+        auto_types,
+        shard_configs={Movie: ShardConfig("director_id", get_shard_name)},
+        shard_engines=shard_engines,
+    )
+
+    class ShardedSchemaContext(Extension):
+        def on_request_start(self):
+            self.execution_context.context["auto_schema"] = sharded_context
+
+    return strawberry.Schema(
+        query=Query, extensions=[SQLAlchemySession, ShardedSchemaContext]
+    )
+
+
+def run(schema_, query, repetitions):
+    started = time.perf_counter()
+    for _ in range(repetitions):
+        result = schema_.execute_sync(query, context_value={})
+    duration = (time.perf_counter() - started) / repetitions
+    if result.errors:
+        return duration, result.errors[0].message
+    return duration, result.data
+
+
+def main():
+    # the expected errors of unsupported queries are printed with the results
+    logging.getLogger("strawberry.execution").setLevel(logging.CRITICAL)
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    with tempfile.TemporaryDirectory() as directory:
+        shard_engines = create_shards(directory)
+        sharded_schema = create_sharded_schema(shard_engines)
+        for name, query in QUERIES.items():
+            single_duration, single = run(schema, query, repetitions)
+            sharded_duration, sharded = run(sharded_schema, query, repetitions)
+            if isinstance(sharded, str):
+                outcome = f"error: {sharded}"
+            else:
+                outcome = "same rows" if single == sharded else "different rows"
+            print(
+                f"{name:<24} single {single_duration * 1000:7.2f} ms"
+                + f"  sharded {sharded_duration * 1000:7.2f} ms  {outcome}"
+            )
+        for engine in shard_engines.values():
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Measure how sqlite read throughput scales with concurrent readers.
+
+The default profile is the pooled engine used for other databases. The tuned
+profile reads from the read only engine of the sqlite profile. Every run uses
+a fresh database file, and a writer thread commits small updates while the
+readers run so the effect of the journal mode shows.
+
+    poetry run python benchmarks/sqlite_reads.py [seconds] [max threads]
+"""
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from sqlalchemy import text
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from api.strawberry_sqlalchemy.engine_registry import (  # noqa: E402
+    create_pooled_engine,
+    create_sqlite_engine,
+)
+
+ROWS = 200_000
+
+# every read aggregates about 2% of the rows
+READ = text(
+    "SELECT count(*), avg(value) FROM items WHERE category BETWEEN :low AND :high"
+)
+
+WRITE = text("UPDATE items SET value = value + 1 WHERE id = :id")
+
+# seconds between two writes
+WRITE_INTERVAL = 0.01
+
+
+def create_database(path):
+    engine = create_pooled_engine(f"sqlite:///{path}")
+    with engine.begin() as connection:
+        connection.execute(
+            text("CREATE TABLE items (id INTEGER PRIMARY KEY, category INT, value INT)")
+        )
+        connection.execute(text("CREATE INDEX ix_items_category ON items (category)"))
+        connection.execute(
+            text("INSERT INTO items (category, value) VALUES (:category, :value)"),
+            [
+                {"category": random.randrange(1000), "value": random.randrange(100)}
+                for _ in range(ROWS)
+            ],
+        )
+    engine.dispose()
+
+
+def create_engines(profile, path):
+    url = f"sqlite:///{path}"
+    if profile == "default":
+        engine = create_pooled_engine(url)
+        return engine, engine
+    return create_sqlite_engine(url, read_only=True), create_sqlite_engine(url)
+
+
+def run(profile, threads, seconds):
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "bench.sqlite3"
+        create_database(path)
+        reader, writer = create_engines(profile, path)
+        stop = threading.Event()
+        reads = [0] * threads
+
+        def read(index):
+            while not stop.is_set():
+                low = random.randrange(980)
+                with reader.connect() as connection:
+                    connection.execute(READ, {"low": low, "high": low + 20}).one()
+                reads[index] += 1
+
+        def write():
+            while not stop.is_set():
+                with writer.begin() as connection:
+                    connection.execute(WRITE, {"id": random.randrange(1, ROWS)})
+                time.sleep(WRITE_INTERVAL)
+
+        workers = [threading.Thread(target=read, args=(i,)) for i in range(threads)]
+        workers.append(threading.Thread(target=write))
+        for worker in workers:
+            worker.start()
+        time.sleep(seconds)
+        stop.set()
+        for worker in workers:
+            worker.join()
+        reader.dispose()
+        writer.dispose()
+    return sum(reads) / seconds
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5
+    max_threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    thread_counts = [1]
+    while thread_counts[-1] * 2 <= max_threads:
+        thread_counts.append(thread_counts[-1] * 2)
+
+    for profile in ["default", "tuned"]:
+        single = None
+        for threads in thread_counts:
+            throughput = run(profile, threads, seconds)
+            single = single or throughput
+            print(
+                f"{profile:<8} {threads:>2} threads {throughput:9.1f} reads/s"
+                + f"  {throughput / single:5.2f}x"
+            )
+
+
+if __name__ == "__main__":
+    main()
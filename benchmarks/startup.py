@@ -0,0 +1,63 @@
+"""Measure the cold start time of the app.
+
+Every run starts a fresh interpreter which imports the libraries and then
+creates the app, which builds the generated schema. The runs are repeated
+with the schema snapshot turned off and with a snapshot written beforehand.
+
+    poetry run python benchmarks/startup.py [runs]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+RUN = """
+import json, time
+start = time.perf_counter()
+import fastapi, sqlalchemy, sqlmodel, strawberry
+libraries = time.perf_counter()
+import main
+end = time.perf_counter()
+print(json.dumps({"libraries": libraries - start, "app": end - libraries}))
+"""
+
+
+def run_once(snapshot_path: str):
+    output = subprocess.run(
+        [sys.executable, "-c", RUN],
+        cwd=ROOT,
+        env={**os.environ, "SCHEMA_SNAPSHOT_PATH": snapshot_path},
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def report(title: str, timings):
+    print(title)
+    for name in ["libraries", "app"]:
+        values = [timing[name] * 1000 for timing in timings]
+        print(
+            f"  {name:<10} median {statistics.median(values):7.1f} ms"
+            + f"  min {min(values):7.1f} ms  max {max(values):7.1f} ms"
+        )
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    report("no snapshot", [run_once("") for _ in range(runs)])
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot_path = str(Path(directory) / "schema_snapshot.json")
+        # the first run writes the snapshot
+        run_once(snapshot_path)
+        report("snapshot", [run_once(snapshot_path) for _ in range(runs)])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,14 @@
+from api.strawberry_sqlalchemy.asgi import GraphQL
 from fastapi import FastAPI
-from strawberry.asgi import GraphQL
 
 
 def create_app():
-    from api.strawberry_sqlalchemy.movie_schema_example import schema
+    from api.strawberry_sqlalchemy.movie_schema_example import (
+        get_subscription_context,
+        schema,
+    )
 
-    graphql_app = GraphQL(schema)
+    graphql_app = GraphQL(schema, subscription_context=get_subscription_context)
     app = FastAPI()
     app.mount("/graphql", graphql_app)
     return app
@@ -1,13 +1,81 @@
-from sqlalchemy import create_engine
+import os
+
+from api.strawberry_sqlalchemy.engine_registry import (
+    EngineRegistry,
+    PoolSettings,
+    SQLiteSettings,
+    create_pooled_engine,
+    create_sqlite_engine,
+    is_sqlite_file_url,
+)
 from sqlalchemy.ext.declarative import declarative_base
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./db.sqlite3"
+SQLALCHEMY_DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./db.sqlite3")
+
+# comma separated urls of read replicas of the primary database
+SQLALCHEMY_REPLICA_URLS = [
+    url for url in os.environ.get("DATABASE_REPLICA_URLS", "").split(",") if url
+]
+
+SQLALCHEMY_ECHO = os.environ.get("DATABASE_ECHO", "false").lower() == "true"
+
+pool_settings = PoolSettings(
+    pool_size=int(os.environ.get("DATABASE_POOL_SIZE", 5)),
+    max_overflow=int(os.environ.get("DATABASE_MAX_OVERFLOW", 10)),
+    pool_recycle=int(os.environ.get("DATABASE_POOL_RECYCLE", 1800)),
+)
+
+# sqlite file databases use a tuned profile with a single writer connection
+# and a pool of concurrent read only connections unless this is false
+SQLALCHEMY_SQLITE_TUNED = os.environ.get("DATABASE_SQLITE_TUNED", "true").lower()
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False},
-    future=True,
-    echo=True,
+sqlite_settings = SQLiteSettings(
+    reader_pool_size=int(os.environ.get("DATABASE_SQLITE_READER_POOL_SIZE", 16)),
+    mmap_size=int(os.environ.get("DATABASE_SQLITE_MMAP_SIZE", 256 * 1024 * 1024)),
 )
 
+if SQLALCHEMY_SQLITE_TUNED == "true" and is_sqlite_file_url(SQLALCHEMY_DATABASE_URL):
+    primary = create_sqlite_engine(
+        SQLALCHEMY_DATABASE_URL, sqlite_settings, echo=SQLALCHEMY_ECHO
+    )
+    # the readers of the same file see the writes as soon as they commit
+    readers = [
+        create_sqlite_engine(
+            SQLALCHEMY_DATABASE_URL,
+            sqlite_settings,
+            read_only=True,
+            echo=SQLALCHEMY_ECHO,
+        )
+    ]
+else:
+    primary = create_pooled_engine(
+        SQLALCHEMY_DATABASE_URL, pool_settings, echo=SQLALCHEMY_ECHO
+    )
+    readers = []
+
+engines = EngineRegistry(
+    primary=primary,
+    replicas=[
+        *readers,
+        *[
+            create_pooled_engine(url, pool_settings, echo=SQLALCHEMY_ECHO)
+            for url in SQLALCHEMY_REPLICA_URLS
+        ],
+    ],
+)
+
+engine = engines.primary
+
+# comma separated name=url pairs of the shards of sharded types
+SQLALCHEMY_SHARD_URLS = dict(
+    pair.split("=", 1)
+    for pair in os.environ.get("DATABASE_SHARD_URLS", "").split(",")
+    if pair
+)
+
+shard_engines = {
+    name: create_pooled_engine(url, pool_settings, echo=SQLALCHEMY_ECHO)
+    for name, url in SQLALCHEMY_SHARD_URLS.items()
+}
+
 Base = declarative_base()
@@ -0,0 +1,105 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+DATABASE_DIR = Path(tempfile.mkdtemp(prefix="strawberry-sqlalchemy-tests-"))
+DATABASE_PATH = DATABASE_DIR / "db.sqlite3"
+TEMPLATE_PATH = DATABASE_DIR / "template.sqlite3"
+
+# main.database connects when it is imported so the url is set before any
+# test imports the app
+os.environ["DATABASE_URL"] = f"sqlite:///{DATABASE_PATH}"
+os.environ["SCHEMA_SNAPSHOT_PATH"] = ""
+
+
+def pytest_sessionstart(session):
+    # the template is migrated once and copied before every test which writes
+    migration = subprocess.run(
+        [sys.executable, "-m", "alembic", "upgrade", "head"],
+        cwd=ROOT,
+        env={**os.environ, "DATABASE_URL": f"sqlite:///{TEMPLATE_PATH}"},
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+    )
+    if migration.returncode:
+        pytest.exit(f"Unable to migrate the test database\n{migration.stdout}")
+
+
+def pytest_sessionfinish(session):
+    shutil.rmtree(DATABASE_DIR, ignore_errors=True)
+
+
+@pytest.fixture
+def database(monkeypatch):
+    """Restore the migrated database and forget the counts cached for it"""
+    from api.strawberry_sqlalchemy import total_count
+    from main.database import engines
+
+    engines.dispose()
+    for suffix in ["-wal", "-shm"]:
+        Path(f"{DATABASE_PATH}{suffix}").unlink(missing_ok=True)
+    shutil.copyfile(TEMPLATE_PATH, DATABASE_PATH)
+    monkeypatch.setattr(total_count, "count_cache", total_count.CountCache())
+    yield engines
+    engines.dispose()
+
+
+@pytest.fixture
+def client(database):
+    from main import app
+    from starlette.testclient import TestClient
+
+    return TestClient(app)
+
+
+@pytest.fixture
+def graphql(client):
+    """Post a query to the app and return the decoded response"""
+
+    def execute(query, variables=None, headers=None):
+        response = client.post(
+            "/graphql/",
+            json={"query": query, "variables": variables},
+            headers=headers or {},
+        )
+        return response.json()
+
+    return execute
+
+
+@pytest.fixture
+def create_schema(database):
+    """Return a function which creates a schema of the example movie types
+    whose generation context is created with the given options
+    """
+    import strawberry
+    from api.strawberry_sqlalchemy import movie_schema_example as example
+    from api.strawberry_sqlalchemy.parallel_execution import (
+        create_parallel_execution_context,
+    )
+    from api.strawberry_sqlalchemy.schema_generation import create_generation_context
+    from strawberry.extensions import Extension
+
+    def create(**options):
+        auto_schema_context = create_generation_context(example.auto_types, **options)
+
+        class AutoSchemaContext(Extension):
+            def on_request_start(self):
+                self.execution_context.context["auto_schema"] = auto_schema_context
+
+        return strawberry.Schema(
+            query=example.Query,
+            mutation=example.Mutation,
+            extensions=[example.SQLAlchemySession, AutoSchemaContext],
+            execution_context_class=create_parallel_execution_context(),
+        )
+
+    return create
@@ -0,0 +1,69 @@
+import pytest
+from api.strawberry_sqlalchemy.full_text_search import to_fts5_query
+
+
+@pytest.mark.parametrize(
+    "value, query",
+    [
+        ("godfather", '(("godfather"))'),
+        ("dark knight", '(("dark" AND "knight"))'),
+        ('"dark knight" rises', '(("dark knight" AND "rises"))'),
+        # an unterminated phrase runs to the end of the value
+        ('the "dark knight', '(("the" AND "dark knight"))'),
+        ("godfather or matrix", '(("godfather") OR ("matrix"))'),
+        ("godfather -ii", '(("godfather")) NOT "ii"'),
+        # a dangling or is ignored
+        ("or godfather", '(("godfather"))'),
+        ("godfather OR", '(("godfather"))'),
+    ],
+)
+def test_to_fts5_query(value, query):
+    assert to_fts5_query(value) == query
+
+
+@pytest.mark.parametrize(
+    "value, query",
+    [
+        ("Spider-Man", '(("Spider-Man"))'),
+        ("Dr. Strangelove", '(("Dr." AND "Strangelove"))'),
+        ("AND", '(("AND"))'),
+        ("NOT", '(("NOT"))'),
+        ("NEAR(a b)", '(("NEAR(a" AND "b)"))'),
+        ("title:godfather", '(("title:godfather"))'),
+        ("star*", '(("star*"))'),
+        ("^start", '(("^start"))'),
+        ('a"b', '(("a" AND "b"))'),
+    ],
+)
+def test_to_fts5_query_escapes_syntax(value, query):
+    assert to_fts5_query(value) == query
+
+
+@pytest.mark.parametrize("value", ["", "   ", "!!!", '""', "-excluded"])
+def test_to_fts5_query_without_terms_matches_nothing(value):
+    assert to_fts5_query(value) == '""'
+
+
+def search_titles(graphql, value):
+    response = graphql(
+        "query ($value: String!) {"
+        " allMovies(where: {title: {search: $value}}, orderBy: {id: asc})"
+        " { title } }",
+        {"value": value},
+    )
+    assert "errors" not in response, response["errors"]
+    return [movie["title"] for movie in response["data"]["allMovies"]]
+
+
+def test_search_matches_syntax_characters_literally(graphql):
+    assert search_titles(graphql, "Spider-Man") == ["Spider-Man: Into the Spider-Verse"]
+    assert search_titles(graphql, "Dr. Strangelove") == [
+        "Dr. Strangelove or: How I Learned to Stop Worrying and Love the Bomb"
+    ]
+    assert search_titles(graphql, '"dark knight" -rises') == ["The Dark Knight"]
+    for value in ["NEAR(a b)", "title:godfather", '"unterminated', "!!!"]:
+        assert search_titles(graphql, value) == []
+    # operators are searched for as words
+    titles = search_titles(graphql, "AND")
+    assert titles
+    assert all(" and " in title.lower() for title in titles)
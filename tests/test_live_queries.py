@@ -0,0 +1,199 @@
+import asyncio
+import json
+import threading
+
+import pytest
+from api.strawberry_sqlalchemy.live_queries import (
+    change_log,
+    diff_rows,
+    get_longest_increasing_subsequence,
+)
+from api.strawberry_sqlalchemy.movie_model_example import MovieModel
+from api.strawberry_sqlalchemy.mutation_generation import CHANGED_PRIMARY_KEYS
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+
+def entries(keys, snapshot=0):
+    return [((key,), snapshot, f"{key}@{snapshot}") for key in keys]
+
+
+def apply(rows, operations):
+    rows = list(rows)
+    for op, path, from_, value in operations:
+        index = int(path[1:])
+        if op == "remove":
+            del rows[index]
+        elif op == "add":
+            rows.insert(index, value)
+        elif op == "replace":
+            rows[index] = value
+        else:
+            rows.insert(index, rows.pop(int(from_[1:])))
+    return rows
+
+
+@pytest.mark.parametrize(
+    "values, expected",
+    [
+        ([], []),
+        ([3, 1, 2], [1, 2]),
+        ([0, 8, 4, 12, 2, 10, 6, 14, 1, 9], [0, 2, 6, 9]),
+        ([2, 2, 2], [0]),
+    ],
+)
+def test_longest_increasing_subsequence(values, expected):
+    indices = get_longest_increasing_subsequence(values)
+    assert len(indices) == len(expected)
+    subsequence = [values[i] for i in indices]
+    assert subsequence == sorted(set(subsequence))
+
+
+@pytest.mark.parametrize(
+    "old, new, operations",
+    [
+        ([1, 2, 3], [1, 2, 3], []),
+        ([], [1, 2], [("add", "/0", None, "1@0"), ("add", "/1", None, "2@0")]),
+        ([1, 2, 3], [1, 3], [("remove", "/1", None, None)]),
+        ([1, 2, 3, 4], [4, 1, 2, 3], [("move", "/0", "/3", None)]),
+        ([1, 2, 3, 4], [2, 3, 4, 1], [("move", "/3", "/0", None)]),
+        (
+            [1, 2, 3, 4],
+            [4, 3, 2, 1],
+            [
+                ("move", "/3", "/2", None),
+                ("move", "/3", "/1", None),
+                ("move", "/3", "/0", None),
+            ],
+        ),
+        (
+            [1, 2, 3],
+            [3, 5, 1],
+            [
+                ("remove", "/1", None, None),
+                ("add", "/2", None, "5@0"),
+                ("move", "/2", "/0", None),
+            ],
+        ),
+    ],
+)
+def test_diff_rows(old, new, operations):
+    old_entries, new_entries = entries(old), entries(new)
+    assert diff_rows(old_entries, new_entries) == operations
+    rows = apply([row for _, _, row in old_entries], operations)
+    assert rows == [row for _, _, row in new_entries]
+
+
+def test_diff_rows_replaces_changed_rows_after_moving_them():
+    old = entries([1, 2, 3])
+    new = [*entries([3], snapshot=1), *entries([1, 2])]
+
+    operations = diff_rows(old, new)
+
+    assert operations == [
+        ("move", "/0", "/2", None),
+        ("replace", "/0", None, "3@1"),
+    ]
+    assert apply([row for _, _, row in old], operations) == ["3@1", "1@0", "2@0"]
+
+
+@pytest.fixture
+def example(database):
+    from api.strawberry_sqlalchemy import movie_schema_example
+
+    return movie_schema_example
+
+
+def get_logged_changes(database):
+    with database.primary.connect() as connection:
+        rows = connection.execute(select(change_log)).all()
+    return [(row.table_name, json.loads(row.primary_key)) for row in rows]
+
+
+def test_committed_changes_are_logged(example, database):
+    with example.SessionLocal() as db:
+        db.execute(
+            update(MovieModel)
+            .where(MovieModel.id == 1)
+            .values(title="Changed")
+            .execution_options(**{CHANGED_PRIMARY_KEYS: [(1,)]})
+        )
+        movie = db.get(MovieModel, 2)
+        movie.title = "Flushed by the commit"
+        db.commit()
+
+    assert get_logged_changes(database) == [("movies", [1]), ("movies", [2])]
+
+
+def test_rolled_back_changes_are_not_logged(example, database):
+    with example.SessionLocal() as db:
+        movie = db.get(MovieModel, 2)
+        movie.title = "Rolled back"
+        db.flush()
+        db.rollback()
+
+    assert get_logged_changes(database) == []
+
+
+def test_only_the_changes_of_the_logged_sessions_are_logged(example, database):
+    with Session(database.primary, future=True) as db:
+        movie = db.get(MovieModel, 2)
+        movie.title = "Not logged"
+        db.commit()
+
+    assert get_logged_changes(database) == []
+
+
+def update_title(example, movie_id, title):
+    with example.SessionLocal() as db:
+        db.execute(
+            update(MovieModel)
+            .where(MovieModel.id == movie_id)
+            .values(title=title)
+            .execution_options(**{CHANGED_PRIMARY_KEYS: [(movie_id,)]})
+        )
+        db.commit()
+
+
+def test_live_query_sends_moves_from_their_old_index(example):
+    query = """
+    subscription {
+      liveMovies(where: {id: {lte: 3}}, orderBy: {title: asc}) {
+        revision
+        operations { op path from value { id title } }
+      }
+    }
+    """
+
+    async def subscribe():
+        patches = []
+        subscription = await example.schema.subscribe(
+            query, context_value=example.get_subscription_context()
+        )
+        async for result in subscription:
+            assert result.errors is None, result.errors
+            patches.append(result.data["liveMovies"])
+            if len(patches) == 1:
+                writer = threading.Thread(
+                    target=update_title, args=(example, 1, "A Shawshank Redemption")
+                )
+                writer.start()
+            else:
+                writer.join()
+                return patches
+
+    first, second = asyncio.run(asyncio.wait_for(subscribe(), timeout=10))
+
+    assert [o["value"]["id"] for o in first["operations"]] == [2, 3, 1]
+    assert second == {
+        "revision": 1,
+        "operations": [
+            {"op": "move", "path": "/0", "from": "/2", "value": None},
+            {
+                "op": "replace",
+                "path": "/0",
+                "from": None,
+                "value": {"id": 1, "title": "A Shawshank Redemption"},
+            },
+        ],
+    }
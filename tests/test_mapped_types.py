@@ -0,0 +1,57 @@
+import pytest
+from api.strawberry_sqlalchemy.schema_generation import (
+    create_comparison_expression_name,
+    create_mutation_input_name,
+    create_order_by_expression_name,
+    create_select_column_enum_name,
+    get_generated_type,
+)
+from sqlalchemy import inspect
+
+
+@pytest.fixture
+def example(database):
+    from api.strawberry_sqlalchemy import declarative_schema_example
+
+    return declarative_schema_example
+
+
+def get_fields(example, type_name, name):
+    type_ = getattr(example, type_name)
+    generated_type = get_generated_type(name(type_), type_)
+    assert generated_type is not None, name(type_)
+    if hasattr(generated_type, "__members__"):
+        return set(generated_type.__members__)
+    return set(generated_type.__annotations__)
+
+
+@pytest.mark.parametrize(
+    "type_name, model_name",
+    [("Movie", "MovieRecord"), ("Director", "DirectorRecord")],
+)
+def test_generated_inputs_only_have_the_fields_of_the_mapper(
+    example, type_name, model_name
+):
+    mapper = inspect(getattr(example, model_name))
+    columns = {column.key for column in mapper.column_attrs}
+    relationships = {relationship.key for relationship in mapper.relationships}
+
+    assert get_fields(example, type_name, create_comparison_expression_name) == {
+        *columns,
+        *relationships,
+        "and_",
+        "or_",
+    }
+    assert get_fields(example, type_name, create_order_by_expression_name) == columns
+    assert get_fields(example, type_name, create_select_column_enum_name) == {
+        *columns,
+        *relationships,
+    }
+    inputs = {
+        suffix: get_fields(
+            example, type_name, lambda type_: create_mutation_input_name(type_, suffix)
+        )
+        for suffix in ["InsertInput", "SetInput", "IncInput"]
+    }
+    assert inputs["InsertInput"] == inputs["SetInput"] == columns
+    assert inputs["IncInput"] <= columns
@@ -0,0 +1,142 @@
+import pytest
+from sqlalchemy import event
+
+MOVIE = {
+    "title": "Untitled",
+    "imdbId": "tt0",
+    "year": 2021,
+    "imageUrl": "",
+    "imdbRating": 0.0,
+    "imdbRatingCount": "0",
+}
+
+INSERT_MOVIES = """
+mutation ($objects: [MovieInsertInput!]!) {
+  insertMovies(objects: $objects) { affectedRows }
+}
+"""
+
+INSERT_MOVIES_RETURNING = """
+mutation ($objects: [MovieInsertInput!]!) {
+  insertMovies(objects: $objects) {
+    affectedRows
+    returning { id title director { name } }
+  }
+}
+"""
+
+
+@pytest.fixture
+def movie_inserts(database):
+    """Collect the INSERT statements executed against the movies table"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        if statement.startswith("INSERT INTO movies"):
+            statements.append(statement)
+
+    event.listen(database.primary, "before_cursor_execute", before_cursor_execute)
+    yield statements
+    event.remove(database.primary, "before_cursor_execute", before_cursor_execute)
+
+
+def test_insert_groups_rows_by_provided_columns(graphql, movie_inserts):
+    objects = [
+        {**MOVIE, "id": 1001, "directorId": 1},
+        {**MOVIE, "directorId": 1},
+        {**MOVIE, "id": 1002, "directorId": 2},
+        {**MOVIE, "directorId": 2},
+    ]
+    response = graphql(INSERT_MOVIES, {"objects": objects})
+
+    assert response["data"]["insertMovies"]["affectedRows"] == 4
+    # one multi row statement per distinct set of provided columns
+    assert len(movie_inserts) == 2
+    count = graphql("{ countMovies(mode: exact) }")
+    assert count["data"]["countMovies"] == 254
+
+
+def test_insert_returning_without_primary_keys(graphql, movie_inserts):
+    objects = [{**MOVIE, "directorId": 3}, {**MOVIE, "directorId": 1, "year": 1}]
+    response = graphql(INSERT_MOVIES_RETURNING, {"objects": objects})
+
+    insert_movies = response["data"]["insertMovies"]
+    assert insert_movies["affectedRows"] == 2
+    # sqlite has no RETURNING so the generated keys come from single row inserts
+    assert len(movie_inserts) == 2
+    returning = sorted(insert_movies["returning"], key=lambda movie: movie["id"])
+    assert [movie["id"] for movie in returning] == [251, 252]
+    assert returning[0] == {
+        "id": 251,
+        "title": "Untitled",
+        "director": {"name": "Christopher Nolan"},
+    }
+    assert returning[1]["director"] == {"name": "Frank Darabont"}
+
+
+def test_insert_returning_with_primary_keys(graphql, movie_inserts):
+    objects = [
+        {**MOVIE, "id": 1001, "directorId": 1},
+        {**MOVIE, "id": 1002, "directorId": 1},
+    ]
+    response = graphql(INSERT_MOVIES_RETURNING, {"objects": objects})
+
+    returning = response["data"]["insertMovies"]["returning"]
+    assert sorted(movie["id"] for movie in returning) == [1001, 1002]
+    assert len(movie_inserts) == 1
+
+
+@pytest.mark.parametrize(
+    "where",
+    ["{}", "{id: {}}", "{or_: []}", "{and_: [{}]}"],
+)
+def test_changing_every_row_requires_all_rows(graphql, where):
+    for mutation in [
+        f"mutation {{ updateMovies(where: {where}, inc_: {{year: 1}})"
+        " { affectedRows } }",
+        f"mutation {{ deleteMovies(where: {where}) {{ affectedRows }} }}",
+    ]:
+        response = graphql(mutation)
+        assert "Pass allRows: true" in response["errors"][0]["message"]
+
+    count = graphql("{ countMovies(mode: exact) }")
+    assert count["data"]["countMovies"] == 250
+
+
+def test_all_rows_changes_every_row(graphql):
+    response = graphql(
+        "mutation { updateMovies(where: {}, allRows: true, inc_: {year: 1})"
+        " { affectedRows } }"
+    )
+    assert response["data"]["updateMovies"]["affectedRows"] == 250
+
+    response = graphql(
+        "mutation { deleteMovies(where: {}, allRows: true) { affectedRows } }"
+    )
+    assert response["data"]["deleteMovies"]["affectedRows"] == 250
+
+
+def test_update_returning_rows_matched_before_the_update(graphql):
+    response = graphql(
+        "mutation { updateMovies(where: {year: {lt: 1930}}, inc_: {year: 1000})"
+        " { affectedRows returning { year } } }"
+    )
+    update_movies = response["data"]["updateMovies"]
+    assert update_movies["affectedRows"] == len(update_movies["returning"]) > 0
+    assert all(movie["year"] > 2900 for movie in update_movies["returning"])
+
+
+def test_delete_returning_rows(graphql):
+    response = graphql(
+        "mutation { deleteMovies(where: {id: {in_: [1, 2]}})"
+        " { affectedRows returning { id director { name } } } }"
+    )
+    delete_movies = response["data"]["deleteMovies"]
+    assert delete_movies["affectedRows"] == 2
+    assert sorted(movie["id"] for movie in delete_movies["returning"]) == [1, 2]
+    assert movie_exists(graphql, 1) is False
+
+
+def movie_exists(graphql, id_):
+    response = graphql(f"{{ allMovies(where: {{id: {{eq: {id_}}}}}) {{ id }} }}")
+    return bool(response["data"]["allMovies"])
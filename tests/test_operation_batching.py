@@ -0,0 +1,107 @@
+import pytest
+from api.strawberry_sqlalchemy.operation_batching import MAX_BATCH_SIZE
+from sqlalchemy import event
+
+COUNT = {"query": "{ countMovies(mode: exact) }"}
+
+INSERT_MOVIE = """
+mutation ($id: Int!) {
+  insertMovies(objects: [{id: $id, title: "Untitled", imdbId: "tt0",
+    year: 2021, imageUrl: "", imdbRating: 0, imdbRatingCount: "0",
+    directorId: 1}]) { affectedRows }
+}
+"""
+
+
+@pytest.fixture
+def selects(database):
+    """Collect the SELECT statements executed against the database"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        if statement.startswith("SELECT"):
+            statements.append(statement)
+
+    engines = [database.primary, *database.replicas]
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    yield statements
+    for engine in engines:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def test_batch_returns_a_result_per_operation(client, selects):
+    query = {"query": "{ allMovies(where: {id: {lte: 2}}) { title } }"}
+    response = client.post("/graphql/", json=[query, query, query])
+
+    assert response.status_code == 200
+    titles = {
+        "allMovies": [{"title": "The Shawshank Redemption"}, {"title": "The Godfather"}]
+    }
+    assert response.json() == [{"data": titles}] * 3
+    # identical selects of the batch are executed once
+    assert len(selects) == 1
+
+
+def test_batch_reads_its_own_writes(client):
+    response = client.post(
+        "/graphql/",
+        json=[COUNT, {"query": INSERT_MOVIE, "variables": {"id": 1001}}, COUNT],
+    )
+
+    results = response.json()
+    assert results[0]["data"]["countMovies"] == 250
+    assert results[1]["data"]["insertMovies"]["affectedRows"] == 1
+    assert results[2]["data"]["countMovies"] == 251
+
+
+def test_failed_operation_is_rolled_back(client):
+    response = client.post(
+        "/graphql/",
+        json=[
+            {"query": INSERT_MOVIE, "variables": {"id": 1001}},
+            # the primary key already exists
+            {"query": INSERT_MOVIE, "variables": {"id": 1}},
+            COUNT,
+            {"query": INSERT_MOVIE, "variables": {"id": 1002}},
+        ],
+    )
+
+    results = response.json()
+    assert response.status_code == 200
+    assert results[0]["data"]["insertMovies"]["affectedRows"] == 1
+    assert results[1]["data"] is None
+    assert "UNIQUE constraint failed" in results[1]["errors"][0]["message"]
+    # the operations after the failure use a working transaction
+    assert results[2]["data"]["countMovies"] == 251
+    assert results[3]["data"]["insertMovies"]["affectedRows"] == 1
+    count = client.post("/graphql/", json=COUNT).json()
+    assert count["data"]["countMovies"] == 252
+
+
+@pytest.mark.parametrize(
+    "body, message",
+    [
+        ([], "A batch must contain between 1 and"),
+        ([COUNT] * (MAX_BATCH_SIZE + 1), "A batch must contain between 1 and"),
+        ([COUNT, {"variables": {}}], "No GraphQL query found in an operation"),
+        ([COUNT, "{ countMovies }"], "No GraphQL query found in an operation"),
+        ({"variables": {}}, "No GraphQL query found in the request"),
+    ],
+)
+def test_invalid_requests_are_rejected(client, body, message):
+    response = client.post("/graphql/", json=body)
+
+    assert response.status_code == 400
+    assert message in response.text
+
+
+def test_invalid_json_is_rejected(client):
+    response = client.post(
+        "/graphql/",
+        data="{ countMovies",
+        headers={"Content-Type": "application/json"},
+    )
+
+    assert response.status_code == 400
+    assert response.text == "Unable to parse request body as JSON"
@@ -0,0 +1,64 @@
+from api.strawberry_sqlalchemy.movie_model_example import MovieModel
+from api.strawberry_sqlalchemy.query_generation import filter_map
+
+
+def movie_ids(graphql, where):
+    response = graphql(
+        "query ($where: MovieFilter) {"
+        " allMovies(where: $where, orderBy: {id: asc}) { id } }",
+        {"where": where},
+    )
+    assert "errors" not in response, response["errors"]
+    return [movie["id"] for movie in response["data"]["allMovies"]]
+
+
+def test_scalar_filters(graphql):
+    assert movie_ids(graphql, {"id": {"lt": 4}}) == [1, 2, 3]
+    assert movie_ids(graphql, {"id": {"gte": 248}}) == [248, 249, 250]
+    assert movie_ids(graphql, {"id": {"in_": [5, 1, 9]}}) == [1, 5, 9]
+    assert 1 not in movie_ids(graphql, {"id": {"notIn": [1]}})
+    assert movie_ids(graphql, {"title": {"eq": "The Godfather"}}) == [2]
+
+
+def test_contains_filters(graphql):
+    godfathers = movie_ids(graphql, {"title": {"contains": "Godfather"}})
+    assert godfathers == [2, 3]
+    others = movie_ids(graphql, {"title": {"notContains": "Godfather"}})
+    assert len(others) == 248
+    assert not set(godfathers) & set(others)
+
+
+def test_is_null_filter(graphql):
+    assert movie_ids(graphql, {"directorId": {"isNull": True}}) == []
+    assert len(movie_ids(graphql, {"directorId": {"isNull": False}})) == 250
+
+    director_id = MovieModel.director_id
+    assert str(filter_map["is_null"](director_id, True)) == "movies.director_id IS NULL"
+    assert (
+        str(filter_map["is_null"](director_id, False))
+        == "movies.director_id IS NOT NULL"
+    )
+
+
+def test_logical_operators(graphql):
+    where = {"or_": [{"id": {"eq": 1}}, {"id": {"eq": 2}}]}
+    assert movie_ids(graphql, where) == [1, 2]
+    where = {"and_": [{"id": {"lt": 5}}, {"id": {"gt": 2}}]}
+    assert movie_ids(graphql, where) == [3, 4]
+    # the fields of a where clause and its and_ all have to hold
+    where = {"id": {"lt": 5}, "and_": [{"id": {"gt": 2}}], "or_": [{"id": {"eq": 4}}]}
+    assert movie_ids(graphql, where) == [4]
+
+
+def test_empty_filters_match_every_row(graphql):
+    assert len(movie_ids(graphql, {})) == 250
+    assert len(movie_ids(graphql, {"id": {}})) == 250
+    # an alternative without filters matches every row
+    assert len(movie_ids(graphql, {"or_": [{"id": {"eq": 1}}, {}]})) == 250
+
+
+def test_relationship_filters(graphql):
+    response = graphql(
+        '{ allDirectors(where: {movies: {title: {eq: "Inception"}}}) { name } }'
+    )
+    assert response["data"]["allDirectors"] == [{"name": "Christopher Nolan"}]
@@ -0,0 +1,105 @@
+from types import SimpleNamespace
+
+import pytest
+from api.strawberry_sqlalchemy.movie_model_example import MovieModel
+from api.strawberry_sqlalchemy.relationship_loading import (
+    DEFAULT_CHUNK_SIZE,
+    get_chunk_size,
+    get_chunks,
+    key_in,
+)
+from sqlalchemy import event
+from sqlalchemy.dialects import mssql, postgresql, sqlite
+
+
+def create_info(relationship_chunk_size=None):
+    auto_schema = {"relationship_chunk_size": relationship_chunk_size}
+    return SimpleNamespace(context={"auto_schema": auto_schema})
+
+
+@pytest.mark.parametrize(
+    "dialect, chunk_size, key_length, expected",
+    [
+        (sqlite.dialect(), None, 1, DEFAULT_CHUNK_SIZE),
+        (sqlite.dialect(), 10, 1, 10),
+        (sqlite.dialect(), 5000, 1, 999),
+        (sqlite.dialect(), 5000, 2, 499),
+        (sqlite.dialect(), 5000, 1000, 1),
+        (mssql.dialect(), 5000, 1, 2100),
+        (mssql.dialect(), 5000, 3, 700),
+        (postgresql.dialect(), 5000, 3, 5000),
+    ],
+)
+def test_chunk_size_is_limited_by_the_bound_parameters(
+    dialect, chunk_size, key_length, expected
+):
+    info = create_info(chunk_size)
+    assert get_chunk_size(info, dialect, key_length) == expected
+
+
+def test_chunks():
+    assert get_chunks(list(range(7)), 3) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert get_chunks([], 3) == []
+
+
+def test_key_in_compiles_for_each_dialect():
+    columns = [MovieModel.id, MovieModel.director_id]
+    keys = [(1, 2), (3, 4)]
+
+    composite = key_in(mssql.dialect(), columns, keys)
+    assert str(composite.compile(dialect=mssql.dialect())) == (
+        "movies.id = :id_1 AND movies.director_id = :director_id_1"
+        " OR movies.id = :id_2 AND movies.director_id = :director_id_2"
+    )
+    composite = key_in(sqlite.dialect(), columns, keys)
+    assert "(movies.id, movies.director_id) IN" in str(
+        composite.compile(dialect=sqlite.dialect())
+    )
+    single = key_in(postgresql.dialect(), columns[:1], keys)
+    assert str(single.compile(dialect=postgresql.dialect())) == (
+        "movies.id = ANY (%(param_1)s::INTEGER[])"
+    )
+
+
+@pytest.fixture
+def movie_selects(database):
+    """Collect the statements which load movies"""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, *args):
+        if statement.startswith("SELECT") and "FROM movies" in statement:
+            statements.append(parameters)
+
+    engines = [database.primary, *database.replicas]
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    yield statements
+    for engine in engines:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+@pytest.mark.parametrize(
+    "options, chunks",
+    [
+        ({"relationship_chunk_size": 10}, 16),
+        ({"relationship_chunk_size": 10, "relationship_chunk_concurrency": 4}, 16),
+        # sqlite limits the chunk to 999 keys which fits every director
+        ({"relationship_chunk_size": 5000}, 1),
+    ],
+)
+def test_relationships_are_loaded_in_chunks(
+    create_schema, movie_selects, options, chunks
+):
+    schema = create_schema(**options)
+    result = schema.execute_sync(
+        "{ allDirectors { id movies { directorId } } }", context_value={}
+    )
+
+    assert result.errors is None
+    directors = result.data["allDirectors"]
+    assert len(directors) == 156
+    assert sum(len(director["movies"]) for director in directors) == 250
+    for director in directors:
+        assert all(m["directorId"] == director["id"] for m in director["movies"])
+    assert len(movie_selects) == chunks
+    assert max(len(parameters) for parameters in movie_selects) <= 999
@@ -0,0 +1,103 @@
+import pytest
+from api.strawberry_sqlalchemy.movie_model_example import MovieModel
+
+
+def recent_movies(context):
+    if "min_year" not in context:
+        return None
+    return MovieModel.year >= context["min_year"]
+
+
+@pytest.fixture
+def schema(create_schema):
+    from api.strawberry_sqlalchemy.movie_schema_example import Movie
+
+    return create_schema(row_policies={Movie: [recent_movies]})
+
+
+def execute(schema, query, min_year=2000):
+    result = schema.execute_sync(query, context_value={"min_year": min_year})
+    assert result.errors is None, result.errors
+    return result.data
+
+
+def test_list_only_returns_allowed_rows(schema):
+    data = execute(schema, "{ allMovies { year } }")
+    assert data["allMovies"]
+    assert all(movie["year"] >= 2000 for movie in data["allMovies"])
+
+    # a policy returning None leaves the rows unrestricted
+    result = schema.execute_sync("{ allMovies { id } }", context_value={})
+    assert len(result.data["allMovies"]) == 250
+
+
+def test_relationships_and_derived_fields_only_see_allowed_rows(schema):
+    data = execute(
+        schema,
+        '{ allDirectors(where: {name: {eq: "Christopher Nolan"}})'
+        " { moviesCount movies { year } } }",
+        min_year=2006,
+    )
+    (director,) = data["allDirectors"]
+    assert sorted(movie["year"] for movie in director["movies"]) == [
+        2006,
+        2008,
+        2010,
+        2012,
+        2014,
+    ]
+    assert director["moviesCount"] == 5
+
+
+def test_relationship_filters_only_match_allowed_rows(schema):
+    query = '{ allDirectors(where: {movies: {title: {eq: "The Prestige"}}}) { name } }'
+    assert execute(schema, query)["allDirectors"] == [{"name": "Christopher Nolan"}]
+    assert execute(schema, query, min_year=2010)["allDirectors"] == []
+
+
+def test_count_only_counts_allowed_rows(schema):
+    data = execute(
+        schema,
+        "{ exact: countMovies(mode: exact) cached: countMovies(mode: cached)"
+        " list: allMovies { id } }",
+    )
+    assert data["exact"] == data["cached"] == len(data["list"]) < 250
+
+    # a count cached for one policy is not used for another
+    data = execute(schema, "{ countMovies(mode: cached) }", min_year=2010)
+    assert data["countMovies"] < len(
+        execute(schema, "{ allMovies { id } }")["allMovies"]
+    )
+
+
+def test_update_only_changes_allowed_rows(schema):
+    update = (
+        "mutation { updateMovies(where: {id: {lte: 10}}, inc_: {imdbRating: 1})"
+        " { affectedRows %s } }"
+    )
+    data = execute(schema, update % "")
+    assert data["updateMovies"]["affectedRows"] == 3
+
+    data = execute(schema, update % "returning { id }")
+    update_movies = data["updateMovies"]
+    assert update_movies["affectedRows"] == 3
+    assert sorted(movie["id"] for movie in update_movies["returning"]) == [4, 7, 10]
+
+    # the rows hidden by the policy keep their rating
+    result = schema.execute_sync(
+        "{ allMovies(where: {id: {lte: 10}, imdbRating: {gt: 9.5}}) { id } }",
+        context_value={},
+    )
+    assert sorted(movie["id"] for movie in result.data["allMovies"]) == [4, 7, 10]
+
+
+def test_delete_only_removes_allowed_rows(schema):
+    data = execute(
+        schema,
+        "mutation { deleteMovies(where: {}, allRows: true) { affectedRows } }",
+    )
+    assert 0 < data["deleteMovies"]["affectedRows"] < 250
+
+    result = schema.execute_sync("{ allMovies { year } }", context_value={})
+    assert result.data["allMovies"]
+    assert all(movie["year"] < 2000 for movie in result.data["allMovies"])
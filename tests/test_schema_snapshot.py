@@ -0,0 +1,158 @@
+import json
+
+import pytest
+import strawberry
+from api.strawberry_sqlalchemy import schema_generation, schema_snapshot
+from api.strawberry_sqlalchemy.movie_model_example import DirectorModel
+from api.strawberry_sqlalchemy.schema_generation import (
+    create_mapped_type,
+    create_mutation_root,
+    create_query_root,
+    get_generated_type,
+)
+from api.strawberry_sqlalchemy.schema_snapshot import (
+    get_metadata_hash,
+    load_schema_snapshot,
+    save_schema_snapshot,
+)
+
+METADATA = DirectorModel.metadata
+
+
+@pytest.fixture
+def registry(database, monkeypatch):
+    """Generate the types in an empty registry and restore the module
+    afterwards
+    """
+    from api.strawberry_sqlalchemy import movie_schema_example  # noqa: F401
+
+    module = vars(schema_generation)
+    saved = dict(module)
+    monkeypatch.setattr(schema_generation, "generated_types", {})
+    monkeypatch.setattr(schema_generation, "_snapshot_types", {})
+    monkeypatch.setattr(schema_snapshot, "_snapshot_stale", True)
+    yield schema_generation
+    module.clear()
+    module.update(saved)
+
+
+def clear(registry):
+    registry.generated_types.clear()
+    registry._snapshot_types.clear()
+
+
+def create_sdl():
+    from api.strawberry_sqlalchemy.movie_schema_example import Director, Movie
+
+    types = [Movie, Director]
+    schema = strawberry.Schema(
+        query=create_query_root(types), mutation=create_mutation_root(types)
+    )
+    return str(schema)
+
+
+def write_snapshot(path, types):
+    path.write_text(json.dumps({"hash": get_metadata_hash(METADATA), "types": types}))
+
+
+def test_snapshot_rebuilds_the_generated_types(registry, tmp_path):
+    path = tmp_path / "snapshot.json"
+    sdl = create_sdl()
+    save_schema_snapshot(path, METADATA)
+    snapshot = json.loads(path.read_text())
+    assert {t["name"] for t in snapshot["types"]} >= {"MovieFilter", "IntFilter"}
+
+    clear(registry)
+    assert load_schema_snapshot(path, METADATA)
+    assert create_sdl() == sdl
+    # every type was rebuilt from the snapshot instead of being generated
+    assert not schema_snapshot._snapshot_stale
+    assert not any(registry._snapshot_types.values())
+
+
+def test_changed_types_are_generated_again(registry, tmp_path):
+    path = tmp_path / "snapshot.json"
+    sdl = create_sdl()
+    save_schema_snapshot(path, METADATA)
+    snapshot = json.loads(path.read_text())
+    for snapshot_type in snapshot["types"]:
+        if snapshot_type["name"] == "MovieFilter":
+            snapshot_type["fingerprint"] = "changed"
+    write_snapshot(path, snapshot["types"])
+
+    clear(registry)
+    assert load_schema_snapshot(path, METADATA)
+    assert create_sdl() == sdl
+    assert schema_snapshot._snapshot_stale
+
+
+INPUT = {"name": "IntFilter", "fingerprint": "", "kind": "input", "base": None}
+
+
+@pytest.mark.parametrize(
+    "snapshot_type",
+    [
+        {**INPUT, "fields": {"eq": {"scalar": "os.system"}}},
+        {**INPUT, "fields": {"eq": {"optional": {"scalar": "int"}, "list": None}}},
+        {**INPUT, "fields": {"eq": {"enum": "CountModeEnum"}}},
+        {**INPUT, "fields": {"eq": {"self": None}}},
+        {**INPUT, "fields": {"eq = 1; import os; x": {"scalar": "int"}}},
+        {**INPUT, "fields": {"eq": {"comparison": "os.path"}}},
+        {**INPUT, "base": "object", "fields": {}},
+        {**INPUT, "name": "IntFilter(object)", "fields": {}},
+        {**INPUT, "kind": "type", "fields": {}},
+        {**INPUT, "kind": "enum", "members": {"asc": 1}},
+        "IntFilter",
+    ],
+)
+def test_invalid_snapshots_are_ignored(registry, tmp_path, snapshot_type):
+    path = tmp_path / "snapshot.json"
+    write_snapshot(path, [snapshot_type])
+
+    assert not load_schema_snapshot(path, METADATA)
+    assert registry._snapshot_types == {}
+
+
+def test_snapshots_of_other_models_are_ignored(registry, tmp_path):
+    path = tmp_path / "snapshot.json"
+    path.write_text(json.dumps({"hash": "other", "types": []}))
+    assert not load_schema_snapshot(path, METADATA)
+
+    path.write_text("{")
+    assert not load_schema_snapshot(path, METADATA)
+    assert not load_schema_snapshot(tmp_path / "missing.json", METADATA)
+
+
+def test_types_of_the_same_name_are_kept_apart(database):
+    from api.strawberry_sqlalchemy import (
+        declarative_schema_example,
+        movie_schema_example,
+    )
+
+    director_order_by = get_generated_type(
+        "DirectorOrderBy", movie_schema_example.Director
+    )
+    mapped_director_order_by = get_generated_type(
+        "DirectorOrderBy", declarative_schema_example.Director
+    )
+    assert "movies_count" in director_order_by.__annotations__
+    assert "movies_count" not in mapped_director_order_by.__annotations__
+
+    result = declarative_schema_example.schema.execute_sync(
+        "{ allDirectors(orderBy: {name: desc}, limit: 1) { name } }",
+        context_value={},
+    )
+    assert result.errors is None
+    assert result.data == {"allDirectors": [{"name": "Yavuz Turgul"}]}
+    result = declarative_schema_example.schema.execute_sync(
+        "{ allDirectors(orderBy: {moviesCount: desc}) { name } }",
+        context_value={},
+    )
+    assert "moviesCount" in result.errors[0].message
+
+
+def test_mapped_types_need_unique_names(database):
+    from api.strawberry_sqlalchemy.declarative_schema_example import DirectorRecord
+
+    with pytest.raises(ValueError, match="A type named Director was already"):
+        create_mapped_type(DirectorRecord, "Director")
@@ -0,0 +1,193 @@
+import functools
+from types import SimpleNamespace
+
+import pytest
+from api.strawberry_sqlalchemy.engine_registry import create_pooled_engine
+from api.strawberry_sqlalchemy.movie_model_example import DirectorModel, MovieModel
+from api.strawberry_sqlalchemy.sharding import (
+    ShardConfig,
+    create_row_comparator,
+    get_shard_names,
+)
+from sqlalchemy import event, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+SHARD_NAMES = ["even", "odd"]
+
+
+def get_shard_name(director_id):
+    return SHARD_NAMES[(director_id or 0) % 2]
+
+
+@pytest.fixture
+def shard_engines(database, tmp_path):
+    """Split the movies by the parity of their director across two files
+    which both hold every director
+    """
+    shard_engines = {
+        name: create_pooled_engine(f"sqlite:///{tmp_path / name}.sqlite3")
+        for name in SHARD_NAMES
+    }
+    tables = [DirectorModel.__table__, MovieModel.__table__]
+    with database.primary.connect() as connection:
+        directors = connection.execute(select(DirectorModel.__table__)).all()
+        movies = connection.execute(select(MovieModel.__table__)).all()
+    for name, engine in shard_engines.items():
+        DirectorModel.metadata.create_all(engine, tables=tables)
+        with engine.begin() as connection:
+            connection.execute(
+                DirectorModel.__table__.insert(), [dict(d._mapping) for d in directors]
+            )
+            connection.execute(
+                MovieModel.__table__.insert(),
+                [
+                    dict(m._mapping)
+                    for m in movies
+                    if get_shard_name(m.director_id) == name
+                ],
+            )
+    yield shard_engines
+    for engine in shard_engines.values():
+        engine.dispose()
+
+
+@pytest.fixture
+def sharded_schema(create_schema, shard_engines):
+    from api.strawberry_sqlalchemy.movie_schema_example import Movie
+
+    return create_schema(
+        shard_configs={Movie: ShardConfig("director_id", get_shard_name)},
+        shard_engines=shard_engines,
+    )
+
+
+@pytest.fixture
+def single_schema(create_schema):
+    return create_schema()
+
+
+@pytest.fixture
+def queried_shards(shard_engines):
+    """Collect the names of the shards which executed a statement"""
+    names = []
+
+    def before_cursor_execute(name, *args):
+        names.append(name)
+
+    listeners = {
+        engine: functools.partial(before_cursor_execute, name)
+        for name, engine in shard_engines.items()
+    }
+    for engine, listener in listeners.items():
+        event.listen(engine, "before_cursor_execute", listener)
+    yield names
+    for engine, listener in listeners.items():
+        event.remove(engine, "before_cursor_execute", listener)
+
+
+def execute(schema, query):
+    result = schema.execute_sync(query, context_value={})
+    assert result.errors is None, result.errors
+    return result.data
+
+
+def create_info(shard_config):
+    auto_schema = {
+        "type_to_shard_config": {"Movie": shard_config},
+        "shard_engines": dict.fromkeys(SHARD_NAMES),
+    }
+    return SimpleNamespace(context={"auto_schema": auto_schema})
+
+
+def where(**filters):
+    return SimpleNamespace(
+        director_id=SimpleNamespace(**{"eq": None, "in_": None, **filters})
+    )
+
+
+@pytest.mark.parametrize(
+    "where_clause, shard_names",
+    [
+        (None, ["even", "odd"]),
+        (SimpleNamespace(director_id=None), ["even", "odd"]),
+        (where(gt=3), ["even", "odd"]),
+        (where(eq=3), ["odd"]),
+        (where(in_=[2, 4]), ["even"]),
+        (where(in_=[1, 2]), ["even", "odd"]),
+        (where(in_=[]), []),
+        # both filters have to hold
+        (where(eq=3, in_=[2, 3]), ["odd"]),
+        (where(eq=3, in_=[2]), []),
+    ],
+)
+def test_shard_pruning(where_clause, shard_names):
+    info = create_info(ShardConfig("director_id", get_shard_name))
+    assert get_shard_names(info, "Movie", where_clause) == shard_names
+
+
+def test_pruned_shards_are_not_queried(sharded_schema, queried_shards):
+    data = execute(
+        sharded_schema,
+        "{ allMovies(where: {directorId: {eq: 1}}) { title director { name } } }",
+    )
+
+    assert data["allMovies"]
+    assert all(m["director"]["name"] == "Frank Darabont" for m in data["allMovies"])
+    assert set(queried_shards) == {"odd"}
+
+
+@pytest.mark.parametrize(
+    "arguments",
+    [
+        "orderBy: {title: asc}",
+        "orderBy: {title: desc}, limit: 20, offset: 10",
+        "orderBy: {year: desc, title: asc}, limit: 25",
+        "where: {year: {gt: 2000}}, orderBy: {imdbRating: asc, id: desc}",
+        "where: {directorId: {in_: [1, 2, 3]}}, orderBy: {title: asc}, offset: 3",
+    ],
+)
+def test_shard_results_are_merged_in_order(sharded_schema, single_schema, arguments):
+    query = f"{{ allMovies({arguments}) {{ id title year director {{ name }} }} }}"
+    assert execute(sharded_schema, query) == execute(single_schema, query)
+
+
+def test_counts_are_summed_across_shards(sharded_schema, queried_shards):
+    assert execute(sharded_schema, "{ countMovies(mode: exact) }") == {
+        "countMovies": 250
+    }
+    assert set(queried_shards) == {"even", "odd"}
+
+    queried_shards.clear()
+    data = execute(
+        sharded_schema,
+        "{ countMovies(mode: exact, where: {directorId: {in_: [2, 4]}}) }",
+    )
+    assert data == {"countMovies": 5}
+    assert set(queried_shards) == {"even"}
+
+
+def test_mutations_of_sharded_types_are_rejected(sharded_schema):
+    result = sharded_schema.execute_sync(
+        "mutation { deleteMovies(where: {id: {eq: 1}}) { affectedRows } }",
+        context_value={},
+    )
+
+    assert "sharded type Movie are not supported" in result.errors[0].message
+
+
+@pytest.mark.parametrize(
+    "dialect, direction, expected",
+    [
+        (sqlite.dialect(), "asc", [None, 1, 2]),
+        (sqlite.dialect(), "desc", [2, 1, None]),
+        (postgresql.dialect(), "asc", [1, 2, None]),
+        (postgresql.dialect(), "desc", [None, 2, 1]),
+        (sqlite.dialect(), "asc_nulls_last", [1, 2, None]),
+        (postgresql.dialect(), "desc_nulls_last", [2, 1, None]),
+    ],
+)
+def test_merge_orders_nulls_like_the_dialect(dialect, direction, expected):
+    compare = create_row_comparator([("year", direction)], dialect)
+    rows = [SimpleNamespace(year=year) for year in [2, None, 1]]
+    rows.sort(key=functools.cmp_to_key(compare))
+    assert [row.year for row in rows] == expected
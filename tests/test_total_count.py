@@ -0,0 +1,99 @@
+import pytest
+from api.strawberry_sqlalchemy import total_count
+from api.strawberry_sqlalchemy.movie_model_example import MovieModel
+from api.strawberry_sqlalchemy.total_count import CountCache
+from sqlalchemy import update
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replace the monotonic clock of the count cache"""
+    now = [0.0]
+    monkeypatch.setattr(total_count.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_cache_returns_counts_until_they_expire(clock):
+    cache = CountCache(ttl=10)
+    cache.set("movies", ["movies"], 250)
+
+    clock[0] = 9.9
+    assert cache.get("movies") == 250
+    clock[0] = 10
+    assert cache.get("movies") is None
+
+
+def test_cache_evicts_the_least_recently_used_count(clock):
+    cache = CountCache(max_size=2)
+    cache.set("a", ["movies"], 1)
+    cache.set("b", ["movies"], 2)
+    assert cache.get("a") == 1
+    cache.set("c", ["directors"], 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_cache_invalidates_the_counts_of_a_table(clock):
+    cache = CountCache()
+    cache.set("movies", ["movies"], 250)
+    cache.set("joined", ["movies", "directors"], 10)
+    cache.set("directors", ["directors"], 156)
+
+    cache.invalidate("movies")
+
+    assert cache.get("movies") is None
+    assert cache.get("joined") is None
+    assert cache.get("directors") == 156
+    # invalidated counts no longer refer to their tables
+    cache.invalidate("directors")
+    assert cache._keys_by_table == {}
+
+
+def test_writes_invalidate_when_executed_and_when_committed(database):
+    cache = total_count.count_cache
+    with database.primary.connect() as connection:
+        cache.set("movies", ["movies"], 250)
+        connection.execute(update(MovieModel).values(year=MovieModel.year + 1))
+        assert cache.get("movies") is None
+
+        # a count cached by another session before the commit still sees the
+        # old rows
+        cache.set("movies", ["movies"], 250)
+        connection.commit()
+        assert cache.get("movies") is None
+
+        cache.set("movies", ["movies"], 250)
+        connection.commit()
+        assert cache.get("movies") == 250
+
+
+def test_rolled_back_writes_are_forgotten(database):
+    cache = total_count.count_cache
+    with database.primary.connect() as connection:
+        connection.execute(update(MovieModel).values(year=MovieModel.year + 1))
+        connection.rollback()
+        cache.set("movies", ["movies"], 250)
+        connection.commit()
+        assert cache.get("movies") == 250
+
+
+def test_cached_count_sees_mutations(graphql):
+    count = "{ countMovies(where: {year: {gt: 2000}}) }"
+    before = graphql(count)["data"]["countMovies"]
+    assert graphql(count)["data"]["countMovies"] == before
+
+    response = graphql(
+        'mutation { insertMovies(objects: [{title: "Untitled", imdbId: "tt0",'
+        ' year: 2021, imageUrl: "", imdbRating: 0, imdbRatingCount: "0",'
+        " directorId: 1}]) { affectedRows } }"
+    )
+    assert response["data"]["insertMovies"]["affectedRows"] == 1
+    assert graphql(count)["data"]["countMovies"] == before + 1
+
+    response = graphql(
+        "mutation { deleteMovies(where: {year: {gt: 2000}}) { affectedRows } }"
+    )
+    assert response["data"]["deleteMovies"]["affectedRows"] == before + 1
+    assert graphql(count)["data"]["countMovies"] == 0